@@ -1,17 +1,37 @@
 import os
 import uuid
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
+import asyncio
+import zipfile
+from pathlib import Path
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Header, Request, Response, status
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models.user import User, UserRole
 from app.models.document import Document
 from app.schemas.user import User as UserSchema, UserUpdate
-from app.schemas.document import Document as DocumentSchema, DocumentResponse, DocumentStatus
+from app.schemas.document import Document as DocumentSchema, DocumentResponse, DocumentStatus, UploadCreate, UploadStatus
 from app.core.dependencies import get_admin_user
-from app.services.document_store import DocumentStore
+from app.services.store_registry import (
+    get_document_store,
+    get_answer_cache,
+    get_compaction_scheduler,
+    get_loop_monitor,
+    get_upload_store,
+    get_bulk_importer,
+    get_ingestion_pipeline
+)
+from app.services.upload_writer import (
+    save_upload,
+    save_multipart_upload,
+    store_by_hash,
+    MalformedUpload,
+    UploadTooLarge,
+    MULTIPART_OVERHEAD
+)
+from app.services.resumable_uploads import UploadConflict
 from app.services.document_processor import queue_document_processing, get_document_processing_status
-from app.utils.helpers import validate_file_extension, validate_file_size, get_file_type
+from app.utils.helpers import validate_file_extension, get_file_type
 from app.config import settings
 import logging
 
@@ -19,9 +39,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-# Initialize document store
-document_store = DocumentStore(settings.OUTPUT_FOLDER)
-
 @router.get("/users", response_model=List[UserSchema])
 def get_all_users(
     admin_user: User = Depends(get_admin_user),
@@ -77,56 +94,103 @@ def delete_user(
     db.commit()
     return {"message": "User deleted successfully"}
 
-@router.post("/documents/upload", response_model=DocumentResponse)
+# The upload endpoint parses its body itself, so the form is described for the API docs here
+UPLOAD_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}}
+                }
+            }
+        }
+    }
+}
+
+@router.post("/documents/upload", response_model=DocumentResponse, openapi_extra=UPLOAD_FORM)
 async def upload_document(
-    file: UploadFile = File(...),
+    request: Request,
     admin_user: User = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
     """
     Upload and queue document for processing (admin only)
-    This endpoint is now non-blocking and processes documents in background
+    This endpoint is now non-blocking and processes documents in background.
+    The multipart body is parsed while it streams in, so an upload past MAX_FILE_SIZE
+    is rejected as soon as it crosses the limit rather than after it was received.
     """
-    logger.info(f"Admin {admin_user.username} uploading document: {file.filename}")
+    too_large = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"File size too large. Maximum size: {settings.MAX_FILE_SIZE} bytes"
+    )
     
-    # Validate file
-    if not validate_file_extension(file.filename, settings.ALLOWED_EXTENSIONS_LIST):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type not allowed. Allowed types: {', '.join(settings.ALLOWED_EXTENSIONS_LIST)}"
+    # A declared length over the limit is rejected before any of the body is read
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+        raise too_large
+    
+    # Generate unique document ID
+    document_id = str(uuid.uuid4())
+    
+    # Save file immediately; it is stored under its content hash once registered
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    temp_file_path = os.path.join(settings.UPLOAD_DIR, f"temp_{document_id}")
+    
+    try:
+        filename, file_size, content_hash = await save_multipart_upload(
+            request.stream(), request.headers.get("content-type", ""), "file", Path(temp_file_path), settings.MAX_FILE_SIZE
         )
+    except UploadTooLarge:
+        raise too_large
+    except MalformedUpload as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    file_content = await file.read()
-    if not validate_file_size(len(file_content), settings.MAX_FILE_SIZE):
+    logger.info(f"Admin {admin_user.username} uploading document: {filename}")
+    
+    # Validate file
+    if not validate_file_extension(filename, settings.ALLOWED_EXTENSIONS_LIST):
+        await asyncio.to_thread(os.remove, temp_file_path)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File size too large. Maximum size: {settings.MAX_FILE_SIZE} bytes"
+            detail=f"File type not allowed. Allowed types: {', '.join(settings.ALLOWED_EXTENSIONS_LIST)}"
         )
     
-    # Generate unique document ID
-    document_id = str(uuid.uuid4())
-    
     # Get actual file type from filename
-    file_type = get_file_type(file.filename)
-    
-    # Save file immediately
-    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-    temp_file_path = os.path.join(settings.UPLOAD_DIR, f"temp_{document_id}.{file_type}")
+    file_type = get_file_type(filename)
     
+    logger.info(f"File saved to: {temp_file_path}")
+    return await _register_document(
+        document_id, filename, file_type, temp_file_path, file_size, content_hash, admin_user, db
+    )
+
+async def _register_document(document_id: str, original_filename: str, file_type: str, file_path: str,
+                             file_size: int, content_hash: str, admin_user: User, db: Session) -> dict:
+    """
+    Record a saved upload and queue it for background processing. Uploads are stored by
+    content hash; a byte-identical file that was already processed is linked to the
+    existing chunks and vectors instead of being parsed and embedded again.
+    """
     try:
-        with open(temp_file_path, "wb") as f:
-            f.write(file_content)
-        
-        logger.info(f"File saved to: {temp_file_path}")
+        file_path = str(await asyncio.to_thread(
+            store_by_hash, Path(file_path), Path(settings.UPLOAD_DIR), content_hash, file_type
+        ))
+        duplicate_of = db.query(Document).filter(
+            Document.content_hash == content_hash,
+            Document.status == "completed"
+        ).first()
         
         # Create database record immediately
         document = Document(
             document_id=document_id,
             filename=f"{document_id}.{file_type}",
-            original_filename=file.filename,
-            file_path=temp_file_path,
-            file_size=len(file_content),
+            original_filename=original_filename,
+            file_path=file_path,
+            file_size=file_size,
             file_type=file_type,
+            content_hash=content_hash,
             uploaded_by=admin_user.id,
             status="processing" 
         )
@@ -137,35 +201,228 @@ async def upload_document(
         
         logger.info(f"Document record created in database: {document_id}")
         
+        if duplicate_of and get_document_store().link_document(document_id, duplicate_of.document_id, original_filename):
+            document.status = "completed"
+            document.chunks_count = duplicate_of.chunks_count
+            db.commit()
+            logger.info(f"Document {document_id} is identical to {duplicate_of.document_id}, reusing its chunks")
+            return {
+                "document_id": document_id,
+                "sha256": content_hash,
+                "message": "Identical document already processed. Linked to its existing content, no processing needed."
+            }
+        
         # Add to document store metadata (non-blocking)
-        await document_store.add_document(document_id, file.filename)
+        await get_document_store().add_document(document_id, original_filename)
         
-        queue_document_processing(document_id, temp_file_path, priority=1)
+        queue_document_processing(document_id, file_path, priority=1)
         
         logger.info(f"Document {document_id} queued for processing")
         
         return {
             "document_id": document_id,
+            "sha256": content_hash,
             "message": "Document uploaded successfully and queued for processing. Processing will continue in background."
         }
     
     except Exception as e:
         logger.error(f"Error uploading document: {str(e)}")
-        # Cleanup on error
-        if os.path.exists(temp_file_path):
-            try:
-                os.remove(temp_file_path)
-            except:
-                pass
-        
         # Rollback database changes
         db.rollback()
         
+        # Cleanup on error, unless other documents use the same stored file
+        _release_file(file_path, db)
+        
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error uploading document: {str(e)}"
         )
 
+def _release_file(file_path: str, db: Session):
+    """Remove a stored upload once no document references it"""
+    if db.query(Document).filter(Document.file_path == file_path).count():
+        return
+    try:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    except OSError as e:
+        logger.error(f"Error removing file {file_path}: {str(e)}")
+
+@router.post("/documents/uploads", response_model=UploadStatus, status_code=status.HTTP_201_CREATED)
+def create_resumable_upload(
+    upload: UploadCreate,
+    admin_user: User = Depends(get_admin_user)
+):
+    """Start a resumable upload of a large document (admin only); send its bytes with PATCH"""
+    if not validate_file_extension(upload.filename, settings.ALLOWED_EXTENSIONS_LIST):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File type not allowed. Allowed types: {', '.join(settings.ALLOWED_EXTENSIONS_LIST)}"
+        )
+    if upload.size <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload size must be positive")
+    
+    try:
+        return get_upload_store().create(upload.filename, get_file_type(upload.filename), upload.size, admin_user.id)
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File size too large. Maximum size: {settings.RESUMABLE_MAX_FILE_SIZE} bytes"
+        )
+
+@router.get("/documents/uploads", response_model=List[UploadStatus])
+def list_resumable_uploads(
+    admin_user: User = Depends(get_admin_user)
+):
+    """Unfinished resumable uploads (admin only)"""
+    return get_upload_store().list_uploads()
+
+@router.get("/documents/uploads/{upload_id}", response_model=UploadStatus)
+def get_resumable_upload(
+    upload_id: str,
+    response: Response,
+    admin_user: User = Depends(get_admin_user)
+):
+    """Offset to resume a resumable upload from (admin only)"""
+    state = get_upload_store().get(upload_id)
+    if state is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+    response.headers["Upload-Offset"] = str(state['offset'])
+    return get_upload_store().describe(state)
+
+@router.patch("/documents/uploads/{upload_id}", response_model=UploadStatus)
+async def append_resumable_upload(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    admin_user: User = Depends(get_admin_user)
+):
+    """
+    Append the raw request body at Upload-Offset, which must equal the upload's current offset (admin only).
+    After a failed request, GET the upload and resume from the offset it reports.
+    """
+    try:
+        upload = await get_upload_store().append(upload_id, upload_offset, request.stream())
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+    except UploadConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    response.headers["Upload-Offset"] = str(upload['offset'])
+    return upload
+
+@router.post("/documents/uploads/{upload_id}/finalize", response_model=DocumentResponse)
+async def finalize_resumable_upload(
+    upload_id: str,
+    admin_user: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Queue a completely uploaded document for processing, like a regular upload (admin only)"""
+    upload_store = get_upload_store()
+    state = upload_store.get(upload_id)
+    if state is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+    
+    document_id = str(uuid.uuid4())
+    file_path = os.path.join(settings.UPLOAD_DIR, f"temp_{document_id}.{state['file_type']}")
+    try:
+        state, content_hash = await upload_store.finalize(upload_id, Path(file_path))
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+    except UploadConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    
+    logger.info(f"Admin {admin_user.username} finalized resumable upload {upload_id} as {file_path}")
+    return await _register_document(
+        document_id, state['filename'], state['file_type'], file_path, state['size'], content_hash, admin_user, db
+    )
+
+@router.delete("/documents/uploads/{upload_id}")
+def abort_resumable_upload(
+    upload_id: str,
+    admin_user: User = Depends(get_admin_user)
+):
+    """Discard an unfinished resumable upload (admin only)"""
+    try:
+        aborted = get_upload_store().abort(upload_id)
+    except UploadConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    if not aborted:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    return {"message": "Upload discarded"}
+
+@router.post("/documents/bulk-import", status_code=status.HTTP_202_ACCEPTED)
+async def bulk_import_documents(
+    path: Optional[str] = Form(None),
+    archive: Optional[UploadFile] = File(None),
+    admin_user: User = Depends(get_admin_user)
+):
+    """
+    Import every supported file of a directory under BULK_IMPORT_ROOT on the server, or of
+    an uploaded zip archive, in the background (admin only). Poll the returned job for
+    progress and the files/sec and chunks/sec reached.
+    """
+    if (path is None) == (archive is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either a server path or a zip archive"
+        )
+    
+    importer = get_bulk_importer()
+    if archive is not None:
+        if not archive.filename or not archive.filename.lower().endswith(".zip"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Archive must be a zip file"
+            )
+        name = f"bulk_{uuid.uuid4().hex}"
+        archive_path = importer.status_dir / f"{name}.zip"
+        try:
+            await save_upload(archive, archive_path, settings.BULK_IMPORT_MAX_ARCHIVE_SIZE, settings.UPLOAD_CHUNK_SIZE)
+        except UploadTooLarge:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Archive too large. Maximum size: {settings.BULK_IMPORT_MAX_ARCHIVE_SIZE} bytes"
+            )
+        if not await asyncio.to_thread(zipfile.is_zipfile, archive_path):
+            archive_path.unlink(missing_ok=True)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Archive is not a valid zip file"
+            )
+        job = importer.start(
+            importer.status_dir / name, admin_user.id,
+            archive=archive_path, max_extracted_size=settings.BULK_IMPORT_MAX_EXTRACTED_SIZE
+        )
+    else:
+        root = Path(settings.BULK_IMPORT_ROOT).resolve()
+        directory = (root / path).resolve()
+        if not directory.is_relative_to(root) or not directory.is_dir():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Path must be a directory under {settings.BULK_IMPORT_ROOT}"
+            )
+        job = importer.start(directory, admin_user.id)
+    
+    logger.info(f"Bulk import {job['job_id']} of {job['source']} started by admin {admin_user.username}")
+    return job
+
+@router.get("/documents/bulk-import/{job_id}")
+def get_bulk_import_status(
+    job_id: str,
+    admin_user: User = Depends(get_admin_user)
+):
+    """Progress and throughput of a bulk import job (admin only)"""
+    job = get_bulk_importer().get_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bulk import job not found"
+        )
+    return job
+
 @router.get("/documents", response_model=List[DocumentSchema])
 def get_all_documents(
     admin_user: User = Depends(get_admin_user),
@@ -243,15 +500,13 @@ def delete_document(
     
     try:
         # Delete from FAISS store
-        document_store.delete_document(document_id)
-        
-        # Delete file from filesystem
-        if os.path.exists(document.file_path):
-            os.remove(document.file_path)
+        get_document_store().delete_document(document_id)
         
-        # Delete from database
+        # Delete from database, then the file unless identical documents still use it
+        file_path = document.file_path
         db.delete(document)
         db.commit()
+        _release_file(file_path, db)
         
         logger.info(f"Document {document_id} deleted successfully by admin {admin_user.username}")
         
@@ -265,6 +520,41 @@ def delete_document(
             detail=f"Error deleting document: {str(e)}"
         )
 
+@router.post("/index/compact")
+def compact_index(
+    index_type: Optional[str] = None,
+    admin_user: User = Depends(get_admin_user)
+):
+    """
+    Rebuild the vector index from stored vectors in the background, dropping deleted ones.
+    Pass index_type to migrate to another index type (admin only).
+    """
+    try:
+        compaction = get_document_store().start_compaction(index_type)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    logger.info(f"Index compaction requested by admin {admin_user.username}")
+    return compaction
+
+@router.get("/index/compact")
+def get_compaction_status(
+    admin_user: User = Depends(get_admin_user)
+):
+    """Progress of the latest index compaction (admin only)"""
+    return get_document_store().get_compaction_status()
+
+@router.delete("/answer-cache")
+def purge_answer_cache(
+    admin_user: User = Depends(get_admin_user)
+):
+    """Drop every cached chat answer in all worker processes (admin only)"""
+    purged = get_answer_cache().purge()
+    logger.info(f"Answer cache purged by admin {admin_user.username}")
+    return {"message": "Answer cache purged", "purged": purged}
+
 @router.get("/system/status")
 def get_system_status(
     admin_user: User = Depends(get_admin_user)
@@ -288,6 +578,16 @@ def get_system_status(
             "memory_available_gb": memory.available / (1024**3),
             "memory_total_gb": memory.total / (1024**3)
         },
+        "worker_memory": get_document_store().get_memory_usage(),
+        "embedding_cache": get_document_store().query_cache.stats(),
+        "embedding_batcher": get_document_store().query_batcher.stats(),
+        "retrieval_executor": get_document_store().retrieval.stats(),
+        "event_loop_lag": get_loop_monitor().stats(),
+        "search_latency": get_document_store().search_latency.stats(),
+        "search_cache": get_document_store().search_cache.stats(),
+        "answer_cache": get_answer_cache().stats(),
+        "compaction": get_compaction_scheduler().stats(),
+        "ingestion_pipeline": get_ingestion_pipeline().stats(),
         "configuration": {
             "web_workers": settings.WORKERS,
             "doc_processing_workers": settings.DOC_PROCESSING_WORKERS,
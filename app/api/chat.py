@@ -4,6 +4,7 @@ import asyncio
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
+from pydantic import ValidationError
 from app.database import get_db
 from app.models.user import User
 from app.models.chat import ChatSession
@@ -13,9 +14,21 @@ from app.schemas.chat import (
     ChatMessage as ChatMessageSchema,
     ChatSessionCreate
 )
+from app.schemas.search import (
+    SearchFilters,
+    SearchTuning,
+    SearchRequest,
+    SearchResponse,
+    BatchSearchRequest,
+    BatchSearchResponse
+)
 from app.core.dependencies import get_current_active_user
 from app.services.chat_service import ChatService
-from app.services.document_store import DocumentStore
+from app.services.store_registry import get_document_store, get_answer_cache, get_context_assembler
+from app.services.context_assembler import count_tokens
+from app.services.chat_prompt import build_messages
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.retrieval_executor import RetrievalTimeout
 from app.core.security import verify_token
 from app.utils.helpers import Timer
 from app.config import settings
@@ -25,10 +38,14 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-document_store = DocumentStore(settings.OUTPUT_FOLDER)
 llm_model = LLMModel()
 active_connections = {}
 
+# Upper bound on chunks returned by one search request
+MAX_SEARCH_K = 50
+# Upper bound on queries in one batch search request
+MAX_BATCH_QUERIES = 256
+
 @router.post("/sessions", response_model=ChatSessionSchema)
 def create_chat_session(
     session_data: ChatSessionCreate,
@@ -36,7 +53,7 @@ def create_chat_session(
     db: Session = Depends(get_db)
 ):
     """Create a new chat session for unified knowledge base"""
-    chat_service = ChatService(db, document_store)
+    chat_service = ChatService(db, get_document_store())
     session = chat_service.create_session(
         current_user.id, 
         "unified_kb",
@@ -50,7 +67,7 @@ def get_user_sessions(
     db: Session = Depends(get_db)
 ):
     """Get all chat sessions for current user"""
-    chat_service = ChatService(db, document_store)
+    chat_service = ChatService(db, get_document_store())
     sessions = chat_service.get_user_sessions(current_user.id)
     return [ChatSessionSchema.from_orm(session) for session in sessions]
 
@@ -61,7 +78,7 @@ def get_session_messages(
     db: Session = Depends(get_db)
 ):
     """Get all messages for a chat session"""
-    chat_service = ChatService(db, document_store)
+    chat_service = ChatService(db, get_document_store())
     messages = chat_service.get_session_messages(session_id, current_user.id)
     return [ChatMessageSchema.from_orm(message) for message in messages]
 
@@ -90,7 +107,64 @@ def delete_session(
 @router.get("/knowledge-base/status")
 def get_knowledge_base_status():
     """Get unified knowledge base status"""
-    return document_store.get_knowledge_base_status()
+    return get_document_store().get_knowledge_base_status()
+
+@router.post("/search", response_model=SearchResponse)
+async def search_knowledge_base(
+    request: SearchRequest,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Retrieve knowledge base chunks, optionally only from documents matching the filters"""
+    k = request.k or settings.SIMILAR_DOCS_COUNT
+    if not request.query.strip() or not 1 <= k <= MAX_SEARCH_K:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Query must not be empty and k must be between 1 and {MAX_SEARCH_K}"
+        )
+    
+    filters = request.filters.model_dump(exclude_none=True) if request.filters else None
+    try:
+        chunks = await get_document_store().search(
+            request.query, k=k, nprobe=request.nprobe, ef_search=request.ef_search, filters=filters
+        )
+    except RetrievalTimeout as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return SearchResponse(query=request.query, chunks=chunks)
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def batch_search_knowledge_base(
+    request: BatchSearchRequest,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Retrieve chunks with scores for many queries in one embedding batch and one index search"""
+    k = request.k or settings.SIMILAR_DOCS_COUNT
+    if not 1 <= len(request.queries) <= MAX_BATCH_QUERIES or not 1 <= k <= MAX_SEARCH_K:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Send between 1 and {MAX_BATCH_QUERIES} queries with k between 1 and {MAX_SEARCH_K}"
+        )
+    if any(not query.strip() for query in request.queries):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Queries must not be empty"
+        )
+    
+    filters = request.filters.model_dump(exclude_none=True) if request.filters else None
+    try:
+        results = await get_document_store().search_batch(
+            request.queries, k=k, nprobe=request.nprobe, ef_search=request.ef_search, filters=filters
+        )
+    except RetrievalTimeout as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in batch search: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching knowledge base: {str(e)}"
+        )
+    return BatchSearchResponse(results=[
+        {"query": query, "hits": hits} for query, hits in zip(request.queries, results)
+    ])
 
 @router.websocket("/ws/{token}")
 async def websocket_endpoint(websocket: WebSocket, token: str):
@@ -121,7 +195,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
         chat_history = []
         client_id = str(uuid.uuid4())
         
-        chat_service = ChatService(db, document_store)
+        chat_service = ChatService(db, get_document_store())
         
         try:
             logger.info("Waiting for initialization message...")
@@ -156,13 +230,35 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
             
             session_id = init_message.get("session_id")
             
+            # Optional filters limit every answer in this connection to the matching documents
+            search_filters = None
+            if init_message.get("filters"):
+                try:
+                    search_filters = SearchFilters(**init_message["filters"]).model_dump(exclude_none=True)
+                except (ValidationError, TypeError) as e:
+                    await websocket.send_text(json.dumps({
+                        "status": "error",
+                        "error": f"Invalid search filters in initialization message: {str(e)}"
+                    }))
+                    return
+            
+            # Optional nprobe / ef_search trade recall for latency on every search of this connection
+            try:
+                search_tuning = SearchTuning(nprobe=init_message.get("nprobe"), ef_search=init_message.get("ef_search"))
+            except ValidationError as e:
+                await websocket.send_text(json.dumps({
+                    "status": "error",
+                    "error": f"Invalid search parameters in initialization message: {str(e)}"
+                }))
+                return
+            
             logger.info(f"Initializing unified knowledge base chat, session_id: {session_id}")
             
             if "unified_kb" not in active_connections:
                 active_connections["unified_kb"] = {}
             active_connections["unified_kb"][client_id] = websocket
             
-            kb_status = document_store.get_knowledge_base_status()
+            kb_status = get_document_store().get_knowledge_base_status()
             if kb_status['total_chunks'] == 0:
                 await websocket.send_text(json.dumps({
                     "status": "error",
@@ -185,6 +281,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                 "status": "initialized",
                 "session_id": session_id,
                 "knowledge_base_status": kb_status,
+                "filters": init_message.get("filters") if search_filters else None,
                 "message": "Sage Assistant connected successfully. I'm ready to help you with questions about our knowledge base."
             }))
             is_initialized = True
@@ -221,92 +318,50 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                     logger.info(f"Processing question: {question}")
                     
                     with Timer() as timer:
-                        context_chunks = await document_store.search(
+                        answer_scope = None
+                        cached_answer = None
+                        if settings.ANSWER_CACHE_ENABLED and not chat_history:
+                            # Follow-up questions depend on the conversation, only standalone ones are cached
+                            document_store = get_document_store()
+                            answer_scope = SemanticAnswerCache.scope(
+                                document_store.metadata['generation'],
+                                llm_model.model_name,
+                                search_filters,
+                                nprobe=search_tuning.nprobe,
+                                ef_search=search_tuning.ef_search
+                            )
+                            question_vector = await document_store.embed_query(question)
+                            cached_answer = get_answer_cache().lookup(question_vector, answer_scope)
+                        
+                        context_chunks = [] if cached_answer is not None else await get_document_store().search_chunks(
                             question,
-                            k=settings.SIMILAR_DOCS_COUNT
+                            k=settings.SIMILAR_DOCS_COUNT,
+                            nprobe=search_tuning.nprobe,
+                            ef_search=search_tuning.ef_search,
+                            filters=search_filters
                         )
                         
-                        formatted_chat_history = ""
-                        for entry in chat_history:
-                            formatted_chat_history += f"User: {entry['question']}\nSage: {entry['answer']}\n\n"
+                        # Stitches neighbouring chunks and trims chunks and history to the token budget
+                        assembled = await asyncio.to_thread(get_context_assembler().assemble, context_chunks, chat_history)
+                        formatted_chat_history = assembled['history']
+                        context_text = assembled['context'] or "(No relevant content found in the knowledge base for your question)"
                         
-                        context_text = "\n\n".join(context_chunks) if context_chunks else "(No relevant content found in the knowledge base for your question)"
+                        messages = build_messages(question, context_text, formatted_chat_history)
                         
-                        system_prompt ="""
-                        "You are VaultMind Expert Assistant, developed by AFNEXIS - a leading software development company "
-                        "registered in the United States. You are specialized AI designed exclusively to provide information "
-                        "about VaultMind by AFNEXIS and about AFNEXIS company itself.\n\n"
+                        prompt_tokens = None
+                        if cached_answer is None:
+                            prompt_tokens = await asyncio.to_thread(
+                                lambda: sum(count_tokens(message["content"]) for message in messages)
+                            )
+                            logger.info(f"Prompt tokens: {prompt_tokens} (context {assembled['context_tokens']} "
+                                        f"from {assembled['chunks_used']} chunks in {assembled['passages']} passages, "
+                                        f"{assembled['chunks_dropped']} dropped; history {assembled['history_tokens']} "
+                                        f"from {assembled['history_turns']} turns)")
                         
-                        "ABOUT YOUR DEVELOPMENT:\n"
-                        "- You were developed by the expert team at AFNEXIS\n"
-                        "- AFNEXIS is led by CEO and Head of AI: Muhammad Aashir Tariq\n"
-                        "- AFNEXIS is a US-registered software company providing enterprise solutions worldwide\n"
-                        "- The company has a well-experienced team of developers specializing in AI and enterprise applications\n"
-                        "- AFNEXIS has developed numerous enterprise-level applications that are working perfectly for clients globally\n\n"
-                        
-                        "YOUR RESPONSE SCOPE:\n"
-                        "- VaultMind product features, pricing, installation, usage, and technical details\n"
-                        "- AFNEXIS company information, leadership, services, and expertise\n"
-                        "- How AFNEXIS developed VaultMind and the company's AI capabilities\n"
-                        "- AFNEXIS's other enterprise solutions and global software services\n\n"
-                        
-                        "ABSOLUTE RESTRICTIONS:\n"
-                        "- ONLY provide information about VaultMind and AFNEXIS from the provided documentation\n"
-                        "- NEVER provide information about other AI systems, products, or companies\n"
-                        "- NEVER answer questions unrelated to VaultMind or AFNEXIS\n"
-                        "- NEVER make assumptions about features or company details not documented\n"
-                        "- NEVER provide general AI or technology advice outside VaultMind/AFNEXIS context\n\n"
-                        
-                        "WHEN INFORMATION IS NOT AVAILABLE:\n"
-                        "If the requested information about VaultMind or AFNEXIS is not found in the documentation, respond with:\n"
-                        "'I cannot find this specific information in the VaultMind and AFNEXIS documentation. Please contact "
-                        "AFNEXIS directly at info@afnexis.com or contact@afnexis.com for detailed assistance.'\n\n"
-                        
-                        "RESPONSE REQUIREMENTS:\n"
-                        "- Reference VaultMind features and AFNEXIS company information from documentation\n"
-                        "- Use phrases like: 'VaultMind, developed by AFNEXIS...', 'According to AFNEXIS documentation...'\n"
-                        "- When asked about your development, mention AFNEXIS team and Muhammad Aashir Tariq's leadership\n"
-                        "- Emphasize AFNEXIS's expertise in enterprise software and AI solutions\n"
-                        "- Maintain professional tone representing both VaultMind product and AFNEXIS company\n\n"
-                        
-                        "KEY POINTS TO EMPHASIZE:\n"
-                        "VAULTMIND FEATURES:\n"
-                        "- 100% offline operation (no cloud dependency)\n"
-                        "- Complete data privacy and security\n"
-                        "- Page-based pricing model starting from $0.50/month\n"
-                        "- Multi-user plans (Basic: 1 user, Team: 5 users, Business: 25 users, Enterprise: unlimited)\n"
-                        "- Admin panel for team management (except Basic plan)\n"
-                        "- GDPR, HIPAA, SOX compliance ready\n\n"
-                        
-                        "AFNEXIS COMPANY:\n"
-                        "- US-registered software development company\n"
-                        "- Led by CEO and Head of AI: Muhammad Aashir Tariq\n"
-                        "- Well-experienced team of developers\n"
-                        "- Provides software solutions worldwide\n"
-                        "- Specializes in enterprise-level applications\n"
-                        "- Has developed numerous successful applications for global clients\n"
-                        "- Expert in AI, machine learning, and privacy-first solutions\n\n"
-                        
-                        "DOCUMENTATION CONTEXT:\n"
-                        f"{context_text}\n\n"
-                        
-                        "CHAT HISTORY:\n"
-                        f"{formatted_chat_history}\n\n"
-                        
-                        "CRITICAL REMINDER:\n"
-                        "You represent both VaultMind product and AFNEXIS company. When users ask 'who developed you' or "
-                        "'who created you', explain that you were developed by the expert AFNEXIS team led by CEO and Head of AI "
-                        "Muhammad Aashir Tariq. Always stay focused on VaultMind features and AFNEXIS company information. "
-                        "For any questions outside this scope, politely redirect to VaultMind-related topics or suggest "
-                        "contacting AFNEXIS directly at info@afnexis.com or contact@afnexis.com."
-                        """
-
-                        messages = [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": f"User's Question: {question}"}
-                        ]
+                        stream_interrupted = False
                         
                         async def token_callback(token):
+                            nonlocal stream_interrupted
                             try:
                                 if websocket.client_state.name == 'CONNECTED':
                                     await websocket.send_text(json.dumps({
@@ -315,10 +370,17 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                                     }))
                             except Exception as e:
                                 logger.error(f"Error sending token: {e}")
+                                stream_interrupted = True
                                 return False
                             return True
                         
-                        final_response = await llm_model.stream_chat(messages, token_callback)
+                        if cached_answer is not None:
+                            final_response = cached_answer
+                            await token_callback(final_response)
+                        else:
+                            final_response = await llm_model.stream_chat(messages, token_callback)
+                            if answer_scope is not None and final_response and not stream_interrupted:
+                                get_answer_cache().store(question_vector, answer_scope, final_response)
                         
                         chat_history.append({
                             "question": question,
@@ -333,7 +395,8 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                             question, 
                             final_response, 
                             timer.interval * 1000,
-                            False
+                            False,
+                            cached=cached_answer is not None
                         )
                     
                     if websocket.client_state.name == 'CONNECTED':
@@ -341,7 +404,9 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                             "status": "complete",
                             "answer": final_response,
                             "time": timer.interval,
-                            "session_id": session_id
+                            "session_id": session_id,
+                            "cached": cached_answer is not None,
+                            "prompt_tokens": prompt_tokens
                         }))
                     
                     logger.info("Question processed successfully")
@@ -26,18 +26,109 @@ class Settings(BaseSettings):
     TEMPERATURE: float = 0.0
     TOP_P: float = 0.95
     REPETITION_PENALTY: float = 1.15
+    # Prompt token budget for documentation plus chat history, counted with the chat model's tokenizer
+    LLM_TOKENIZER: str = "Qwen/Qwen2.5-7B-Instruct"
+    CONTEXT_TOKEN_BUDGET: int = 2000
+    CONTEXT_HISTORY_SHARE: float = 0.3
     
     # Data settings
     SPLIT_CHUNK_SIZE: int = 500
     SPLIT_OVERLAP: int = 50
     EMBEDDINGS_MODEL: str = "BAAI/bge-base-en-v1.5"
+    # Embedding runtime (torch or onnx); export the ONNX model with scripts/export_onnx_embeddings.py
+    EMBEDDING_BACKEND: str = "torch"
+    ONNX_MODEL_DIR: str = "./onnx-models/bge-base-en-v1.5"
+    ONNX_QUANTIZED: bool = True
+    ONNX_NUM_THREADS: int = 0
     SIMILAR_DOCS_COUNT: int = 6
     OUTPUT_FOLDER: str = "./rag-vectordb"
     
+    # Vector index settings (flat, hnsw, ivf_flat, ivf_pq or auto)
+    INDEX_TYPE: str = "auto"
+    INDEX_AUTO_THRESHOLD: int = 200000
+    INDEX_AUTO_TYPE: str = "ivf_flat"
+    IVF_NLIST: int = 1024
+    IVF_NPROBE: int = 16
+    PQ_M: int = 64
+    PQ_NBITS: int = 8
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64
+    # Vector encoding inside the index (float32, fp16 or sq8), see scripts/benchmark_vector_storage.py.
+    # Flat and HNSW checkpoints cannot be memory-mapped, so with fp16/sq8 every worker process holds
+    # its own copy, while float32 flat search shares one mapped copy of the segments across workers;
+    # the float32 segments also stay on disk next to the checkpoint. Flat fp16/sq8 only saves memory
+    # while WORKERS x the quantized size stays below the float32 size (below 2 workers for fp16).
+    VECTOR_STORAGE: str = "float32"
+    
+    # Hybrid retrieval: BM25 keyword results fused with vector results by reciprocal rank
+    HYBRID_SEARCH: bool = True
+    HYBRID_CANDIDATES: int = 20
+    RRF_K: int = 60
+    # Search results kept per index generation, uploads and deletes start a new generation
+    SEARCH_CACHE_SIZE: int = 512
+    
+    # Semantic answer cache for standalone questions (opt-in)
+    ANSWER_CACHE_ENABLED: bool = False
+    ANSWER_CACHE_SIZE: int = 256
+    ANSWER_CACHE_TTL: int = 3600
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    
+    # Segment persistence
+    SEGMENT_MERGE_MAX_CHUNKS: int = 5000
+    SEGMENT_MERGE_MIN_COUNT: int = 8
+    CHECKPOINT_MIN_CHUNKS: int = 20000
+    INDEX_MMAP: bool = True
+    MANIFEST_POLL_INTERVAL: float = 1.0
+    
+    # Background compaction of deleted vectors
+    COMPACTION_ENABLED: bool = True
+    COMPACTION_DEAD_RATIO: float = 0.2
+    COMPACTION_MIN_DEAD: int = 1000
+    COMPACTION_MAX_SEGMENTS: int = 64
+    COMPACTION_SEGMENT_CHUNKS: int = 50000
+    COMPACTION_CHECK_INTERVAL: float = 300.0
+    # Only compact while searches stay below this rate, optionally within local hours like "1-5"
+    COMPACTION_IDLE_SEARCHES_PER_MINUTE: float = 5.0
+    COMPACTION_HOURS: str = ""
+    # Share of CPU time and FAISS threads a scheduled compaction may use
+    COMPACTION_CPU_BUDGET: float = 0.5
+    
+    # Query embedding batching across concurrent requests
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BATCH_WAIT_MS: float = 5.0
+    
+    # Retrieval (embedding, index search, chunk reads) runs on a bounded thread pool off the event loop
+    RETRIEVAL_CONCURRENCY: int = 4
+    RETRIEVAL_TIMEOUT: float = 30.0
+    # Event loop lag sampling, lags above the warning threshold are logged
+    LOOP_LAG_INTERVAL: float = 0.1
+    LOOP_LAG_WARN_MS: float = 100.0
+    
     # File Upload
     MAX_FILE_SIZE: int = 10485760
     ALLOWED_EXTENSIONS: str = "pdf,docx,txt,xlsx"
     UPLOAD_DIR: str = "uploads"
+    # Uploads are copied to disk and hashed in pieces of this many bytes
+    UPLOAD_CHUNK_SIZE: int = 1048576
+    # Resumable uploads are staged under UPLOAD_DIR/staging and expire after this many idle seconds
+    RESUMABLE_MAX_FILE_SIZE: int = 1073741824
+    RESUMABLE_UPLOAD_TTL: int = 86400
+    # Bulk imports: admin server paths must lie under BULK_IMPORT_ROOT, zip archives are size limited
+    BULK_IMPORT_ROOT: str = "imports"
+    BULK_IMPORT_MAX_ARCHIVE_SIZE: int = 1073741824
+    BULK_IMPORT_MAX_EXTRACTED_SIZE: int = 4294967296
+    # Staged ingestion: DOC_PROCESSING_WORKERS parse processes, splitter threads, one embedding
+    # thread and one index writer, connected by queues holding at most INGEST_QUEUE_SIZE documents
+    INGEST_SPLIT_WORKERS: int = 1
+    INGEST_QUEUE_SIZE: int = 32
+    # Chunks per embedding batch, filled across documents; a partial batch waits this long for more
+    INGEST_EMBED_BATCH: int = 256
+    INGEST_EMBED_WAIT_MS: float = 50.0
+    # Chunks per model call for ingestion and re-embedding; queries waiting for the model go in between
+    INGEST_EMBED_SLICE: int = 32
+    # Seconds a document may take to parse before its worker process is replaced and the document fails
+    INGEST_PARSE_TIMEOUT: float = 300.0
     
     # Server settings
     HOST: str = "0.0.0.0"
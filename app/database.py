@@ -64,6 +64,16 @@ def check_db_connection():
         print(f"Database connection failed: {str(e)}")
         return False
 
+def apply_schema_updates():
+    """
+    Add columns introduced after the tables were first created,
+    create_all only creates missing tables and never alters existing ones
+    """
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS cached BOOLEAN DEFAULT FALSE"))
+        conn.execute(text("ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)"))
+
 # Connection pool status monitoring
 def get_pool_status():
     """
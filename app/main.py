@@ -7,11 +7,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy import create_engine
-from app.database import Base, engine, check_db_connection
+from app.database import Base, engine, check_db_connection, apply_schema_updates
 from app.api import auth, admin, chat, users
 from app.api.chat import websocket_heartbeat
 from app.services.document_processor import start_document_processor, stop_document_processor
-from app.services.document_store import DocumentStore
+from app.services.store_registry import get_document_store, get_compaction_scheduler, get_loop_monitor
 from app.config import settings
 import logging
 
@@ -22,6 +22,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 Base.metadata.create_all(bind=engine)
+apply_schema_updates()
 
 app = FastAPI(
     title="Enterprise Knowledge Base API with FAISS - Multi-User",
@@ -58,6 +59,13 @@ async def startup_event():
     else:
         logger.info("Database connection successful")
     
+    try:
+        get_document_store()
+        logger.info("Knowledge base store loaded")
+    except Exception as e:
+        logger.error(f"Failed to load knowledge base store: {str(e)}")
+        sys.exit(1)
+    
     try:
         start_document_processor()
         logger.info("Document processing service started")
@@ -65,6 +73,13 @@ async def startup_event():
         logger.error(f"Failed to start document processor: {str(e)}")
         sys.exit(1)
     
+    get_loop_monitor().start()
+    
+    try:
+        get_compaction_scheduler().start()
+    except Exception as e:
+        logger.error(f"Failed to start compaction scheduler: {str(e)}")
+    
     try:
         asyncio.create_task(websocket_heartbeat())
         logger.info("WebSocket heartbeat service started")
@@ -137,7 +152,8 @@ def health_check():
             system_info = {
                 "cpu_usage_percent": cpu_percent,
                 "memory_usage_percent": memory.percent,
-                "available_memory_gb": round(memory.available / (1024**3), 2)
+                "available_memory_gb": round(memory.available / (1024**3), 2),
+                "worker_memory": get_document_store().get_memory_usage()
             }
         except ImportError:
             system_info = {
@@ -187,9 +203,7 @@ async def serve_chat():
 async def get_document_status_public(document_id: str):
     from app.services.document_processor import get_document_processing_status
     
-    document_store = DocumentStore(settings.OUTPUT_FOLDER)
-    
-    faiss_status = document_store.get_document_status(document_id)
+    faiss_status = get_document_store().get_document_status(document_id)
     
     processing_status = get_document_processing_status(document_id)
     
@@ -200,7 +214,7 @@ async def get_document_status_public(document_id: str):
         "document_id": document_id,
         "status": faiss_status.get('status', 'unknown') if faiss_status else 'unknown',
         "created_at": faiss_status.get('created_at') if faiss_status else None,
-        "chunks_count": len(faiss_status.get('chunks', [])) if faiss_status else 0
+        "chunks_count": faiss_status.get('chunk_count', 0) if faiss_status else 0
     }
     
     if processing_status:
@@ -27,6 +27,7 @@ class ChatMessage(Base):
     response = Column(Text, nullable=False)
     processing_time = Column(Integer, default=0)  # in milliseconds
     used_latest_data = Column(Boolean, default=False)
+    cached = Column(Boolean, default=False)  # Answer served from the semantic answer cache
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships - use string references
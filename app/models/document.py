@@ -18,6 +18,7 @@ class Document(Base):
     file_path = Column(String, nullable=False)
     file_size = Column(Integer, nullable=False)
     file_type = Column(String, nullable=False)
+    content_hash = Column(String(64), index=True, nullable=True)  # SHA-256 of the uploaded file
     status = Column(String, default=DocumentStatus.PROCESSING)
     error_message = Column(Text, nullable=True)
     chunks_count = Column(Integer, default=0)
@@ -13,6 +13,7 @@ class ChatMessage(BaseModel):
     response: str
     processing_time: int
     used_latest_data: bool
+    cached: bool = False
     created_at: datetime
     
     class Config:
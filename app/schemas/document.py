@@ -10,6 +10,19 @@ class DocumentBase(BaseModel):
 class DocumentResponse(BaseModel):
     document_id: str
     message: str
+    sha256: Optional[str] = None
+
+class UploadCreate(BaseModel):
+    filename: str
+    size: int
+
+class UploadStatus(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    offset: int
+    created_at: str
+    expires_at: str
 
 class DocumentStatus(BaseModel):
     document_id: str
@@ -0,0 +1,49 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+
+# Upper bounds on the per-request search-time knobs
+MAX_NPROBE = 4096
+MAX_EF_SEARCH = 4096
+
+class SearchFilters(BaseModel):
+    document_ids: Optional[List[str]] = None
+    file_types: Optional[List[str]] = None
+    filename: Optional[str] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+
+class SearchTuning(BaseModel):
+    """Per-request recall/latency trade-off: IVF lists probed (nprobe) and HNSW candidate list size (ef_search)"""
+    nprobe: Optional[int] = Field(None, ge=1, le=MAX_NPROBE)
+    ef_search: Optional[int] = Field(None, ge=1, le=MAX_EF_SEARCH)
+
+class SearchRequest(SearchTuning):
+    query: str
+    k: Optional[int] = None
+    filters: Optional[SearchFilters] = None
+
+class SearchResponse(BaseModel):
+    query: str
+    chunks: List[str]
+
+class BatchSearchRequest(SearchTuning):
+    queries: List[str]
+    k: Optional[int] = None
+    filters: Optional[SearchFilters] = None
+
+class SearchHit(BaseModel):
+    chunk_id: int
+    text: str
+    document_id: str
+    filename: Optional[str] = None
+    page: Optional[int] = None
+    score: float
+    distance: Optional[float] = None
+
+class QueryResults(BaseModel):
+    query: str
+    hits: List[SearchHit]
+
+class BatchSearchResponse(BaseModel):
+    results: List[QueryResults]
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class SemanticAnswerCache:
+    """
+    LRU cache of LLM answers to standalone questions, matched by embedding similarity.
+
+    An answer is only reused for the same knowledge base generation, LLM model, search
+    filters and per-request nprobe/ef_search tuning, and only when the new question's cosine similarity to the cached
+    one reaches the threshold. Entries expire after ttl_seconds. A purge touches a
+    marker file so every worker process sharing the knowledge base drops its entries.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, threshold: float, purge_marker: Path):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.purge_marker = purge_marker
+        self._purge_signature = self._marker_signature()
+        self._entries: "OrderedDict[int, Tuple[Tuple, np.ndarray, str, float]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def scope(generation: int, model_name: str, filters: Optional[Dict],
+              nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Tuple:
+        fingerprint = json.dumps(filters, sort_keys=True, default=str) if filters else None
+        return (generation, model_name, fingerprint, nprobe, ef_search)
+
+    def _marker_signature(self) -> Optional[int]:
+        try:
+            return os.stat(self.purge_marker).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _expire(self, now: float):
+        # Caller holds the lock
+        signature = self._marker_signature()
+        if signature != self._purge_signature:
+            self._purge_signature = signature
+            self._entries.clear()
+            return
+        expired = [entry_id for entry_id, entry in self._entries.items() if now - entry[3] > self.ttl_seconds]
+        for entry_id in expired:
+            del self._entries[entry_id]
+
+    def lookup(self, vector: np.ndarray, scope: Tuple) -> Optional[str]:
+        """Cached answer for the most similar question in scope, if it is similar enough"""
+        query = _unit(vector)
+        with self._lock:
+            self._expire(time.time())
+            candidates = [(entry_id, entry) for entry_id, entry in self._entries.items() if entry[0] == scope]
+            if candidates:
+                similarities = np.stack([entry[1] for _, entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    logger.info(f"Answer cache hit with similarity {similarities[best]:.4f}")
+                    return entry[2]
+            self.misses += 1
+            return None
+
+    def store(self, vector: np.ndarray, scope: Tuple, answer: str):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[self._next_id] = (scope, _unit(vector), answer, time.time())
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def purge(self) -> int:
+        """Drop every cached answer in this and all other worker processes"""
+        self.purge_marker.parent.mkdir(parents=True, exist_ok=True)
+        self.purge_marker.touch()
+        with self._lock:
+            purged = len(self._entries)
+            self._entries.clear()
+            self._purge_signature = self._marker_signature()
+        logger.info(f"Purged {purged} cached answers")
+        return purged
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
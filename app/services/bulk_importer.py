@@ -0,0 +1,266 @@
+import json
+import time
+import uuid
+import shutil
+import logging
+import zipfile
+import threading
+from concurrent.futures import as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.document import Document
+from app.services.document_store import DocumentStore
+from app.services.ingestion_pipeline import DocumentDeleted, IngestionPipeline
+from app.services.segment_store import atomic_write_bytes
+from app.services.upload_writer import copy_stream, store_by_hash, UploadTooLarge
+
+logger = logging.getLogger(__name__)
+
+# Content hashes per query when looking up documents that were already processed
+HASH_LOOKUP_BATCH = 500
+
+class BulkImporter:
+    """
+    Imports every supported file under a directory into the knowledge base.
+
+    Files are copied into the content-addressed upload store and recorded as Document
+    rows in one transaction; files identical to an already processed document, or to an
+    earlier file of the same import, are linked to its chunks instead of being parsed
+    again. The rest go through the ingestion pipeline, which parses them in parallel and
+    embeds their chunks in batches across documents.
+
+    Background jobs report their progress to a JSON file in status_dir, so every worker
+    process can answer status requests.
+    """
+
+    def __init__(self, store: DocumentStore, pipeline: IngestionPipeline, upload_dir: Path, status_dir: Path,
+                 allowed_extensions: List[str], max_file_size: int, copy_chunk_size: int):
+        self.store = store
+        self.pipeline = pipeline
+        self.upload_dir = upload_dir
+        self.status_dir = status_dir
+        self.allowed_extensions = [extension.lower() for extension in allowed_extensions]
+        self.max_file_size = max_file_size
+        self.copy_chunk_size = copy_chunk_size
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.status_dir.mkdir(parents=True, exist_ok=True)
+
+    def discover(self, root: Path) -> List[Path]:
+        """Supported files anywhere under root"""
+        return sorted(
+            path for path in root.rglob("*")
+            if path.is_file() and path.suffix[1:].lower() in self.allowed_extensions
+        )
+
+    def run(self, root: Path, uploaded_by: int, report: Optional[Dict] = None) -> Dict:
+        """Import root and return counts plus files/sec and chunks/sec over the whole import"""
+        report = report if report is not None else {}
+        started = time.perf_counter()
+        files = self.discover(root)
+        report.update({'files': len(files), 'indexed': 0, 'linked': 0, 'failed': 0, 'skipped': 0, 'chunks': 0})
+        logger.info(f"Bulk importing {len(files)} files from {root}")
+
+        db = SessionLocal()
+        try:
+            rows, pending, links = self._register(root, files, uploaded_by, db, report)
+            self._publish(report)
+            self._process(pending, rows, db, report)
+            self._link(links, rows, db, report)
+        finally:
+            db.close()
+
+        elapsed = time.perf_counter() - started
+        imported = report['indexed'] + report['linked']
+        report['elapsed_seconds'] = round(elapsed, 2)
+        report['files_per_second'] = round(imported / elapsed, 2) if elapsed else 0.0
+        report['chunks_per_second'] = round(report['chunks'] / elapsed, 2) if elapsed else 0.0
+        logger.info(
+            f"Bulk import of {root} finished: {imported} files, {report['chunks']} chunks in {elapsed:.1f}s "
+            f"({report['files_per_second']} files/s, {report['chunks_per_second']} chunks/s), "
+            f"{report['failed']} failed, {report['skipped']} skipped"
+        )
+        return report
+
+    def _register(self, root: Path, files: List[Path], uploaded_by: int, db: Session,
+                  report: Dict) -> Tuple[Dict[str, Document], List[Tuple], List[Tuple]]:
+        """
+        Copy files into the upload store and create their Document rows in one transaction.
+        Returns the rows by document id, the files to parse as (document_id, filename,
+        file_path, file_type) and the duplicates to link as (document_id, source_id, filename).
+        """
+        staged = []
+        for path in files:
+            document_id = str(uuid.uuid4())
+            file_type = path.suffix[1:].lower()
+            temp_path = self.upload_dir / f"temp_{document_id}.{file_type}"
+            try:
+                with open(path, 'rb') as source:
+                    size, content_hash = copy_stream(source, temp_path, self.max_file_size, self.copy_chunk_size)
+                stored = store_by_hash(temp_path, self.upload_dir, content_hash, file_type)
+            except (OSError, UploadTooLarge) as e:
+                logger.error(f"Skipping {path}: {str(e)}")
+                report['skipped'] += 1
+                continue
+            staged.append(Document(
+                document_id=document_id,
+                filename=f"{document_id}.{file_type}",
+                original_filename=path.relative_to(root).as_posix(),
+                file_path=str(stored),
+                file_size=size,
+                file_type=file_type,
+                content_hash=content_hash,
+                uploaded_by=uploaded_by,
+                status="processing"
+            ))
+
+        # Hash -> document whose chunks later identical files share
+        sources = self._completed_by_hash(list({row.content_hash for row in staged}), db)
+        pending, links = [], []
+        for row in staged:
+            if row.content_hash in sources:
+                links.append((row.document_id, sources[row.content_hash], row.original_filename))
+            else:
+                sources[row.content_hash] = row.document_id
+                pending.append((row.document_id, row.original_filename, row.file_path, row.file_type))
+
+        db.add_all(staged)
+        db.commit()
+        self.store.add_documents([(document_id, filename) for document_id, filename, _, _ in pending])
+        logger.info(f"Registered {len(staged)} documents, {len(links)} identical to already imported files")
+        return {row.document_id: row for row in staged}, pending, links
+
+    def _completed_by_hash(self, hashes: List[str], db: Session) -> Dict[str, str]:
+        sources = {}
+        for start in range(0, len(hashes), HASH_LOOKUP_BATCH):
+            rows = db.query(Document.content_hash, Document.document_id).filter(
+                Document.content_hash.in_(hashes[start:start + HASH_LOOKUP_BATCH]),
+                Document.status == "completed"
+            )
+            for content_hash, document_id in rows:
+                sources.setdefault(content_hash, document_id)
+        return sources
+
+    def _process(self, pending: List[Tuple], rows: Dict[str, Document], db: Session, report: Dict):
+        """Feed the ingestion pipeline and record documents as they finish"""
+        futures = {
+            self.pipeline.submit(document_id, file_path, file_type, filename): document_id
+            for document_id, filename, file_path, file_type in pending
+        }
+        for future in as_completed(futures):
+            row = rows[futures[future]]
+            error = future.exception()
+            if isinstance(error, DocumentDeleted):
+                # Its row went with it, nothing left to record
+                report['skipped'] += 1
+            elif error is not None:
+                row.status = "failed"
+                row.error_message = str(error)
+                report['failed'] += 1
+            else:
+                row.status = "completed"
+                row.chunks_count = future.result()
+                report['indexed'] += 1
+                report['chunks'] += row.chunks_count
+            db.commit()
+            self._publish(report)
+
+    def _link(self, links: List[Tuple], rows: Dict[str, Document], db: Session, report: Dict):
+        """Share the chunks of identical documents, once the sources of this import are processed"""
+        for document_id, source_id, filename in links:
+            row = rows[document_id]
+            if not self.store.link_document(document_id, source_id, filename):
+                row.status = "failed"
+                row.error_message = f"Identical document {source_id} could not be processed"
+                report['failed'] += 1
+                continue
+            source = rows.get(source_id) or db.query(Document).filter(Document.document_id == source_id).first()
+            row.status = "completed"
+            row.chunks_count = source.chunks_count if source else 0
+            report['linked'] += 1
+        db.commit()
+
+    def start(self, root: Path, uploaded_by: int, archive: Optional[Path] = None,
+              max_extracted_size: int = 0) -> Dict:
+        """
+        Import root in a background thread and return the job status. With an archive, the
+        zip is first extracted into root, and both are removed once the import finishes.
+        """
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'status': 'running',
+            'source': archive.name if archive else str(root),
+            'started_at': datetime.now(timezone.utc).isoformat()
+        }
+        self._publish(job)
+        threading.Thread(
+            target=self._run_job,
+            args=(job, root, uploaded_by, archive, max_extracted_size),
+            name=f"BulkImport-{job['job_id'][:8]}",
+            daemon=True
+        ).start()
+        return dict(job)
+
+    def _run_job(self, job: Dict, root: Path, uploaded_by: int, archive: Optional[Path], max_extracted_size: int):
+        try:
+            if archive:
+                extract_archive(
+                    archive, root, self.allowed_extensions, self.max_file_size, max_extracted_size, self.copy_chunk_size
+                )
+            self.run(root, uploaded_by, job)
+            job['status'] = 'completed'
+        except Exception as e:
+            logger.error(f"Bulk import job {job['job_id']} failed: {str(e)}")
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        finally:
+            if archive:
+                archive.unlink(missing_ok=True)
+                shutil.rmtree(root, ignore_errors=True)
+            job['finished_at'] = datetime.now(timezone.utc).isoformat()
+            self._publish(job)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        try:
+            with open(self.status_dir / f"{job_id}.json", 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _publish(self, report: Dict):
+        if 'job_id' in report:
+            atomic_write_bytes(self.status_dir / f"{report['job_id']}.json", json.dumps(report).encode('utf-8'))
+
+def extract_archive(archive: Path, target: Path, allowed_extensions: List[str], max_file_size: int,
+                    max_total_size: int, chunk_size: int) -> int:
+    """
+    Extract the supported files of a zip archive into target. Members are copied with
+    their size enforced while reading, since the sizes in the zip directory may lie, and
+    names escaping target are skipped. Returns the number of files extracted.
+    """
+    target = target.resolve()
+    target.mkdir(parents=True, exist_ok=True)
+    extracted, total = 0, 0
+    with zipfile.ZipFile(archive) as zf:
+        for member in zf.infolist():
+            destination = (target / member.filename).resolve()
+            if member.is_dir() or destination.suffix[1:].lower() not in allowed_extensions:
+                continue
+            if not destination.is_relative_to(target):
+                logger.warning(f"Skipping archive member outside the import directory: {member.filename}")
+                continue
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                with zf.open(member) as source:
+                    size, _ = copy_stream(source, destination, max_file_size, chunk_size)
+            except UploadTooLarge:
+                logger.warning(f"Skipping archive member larger than {max_file_size} bytes: {member.filename}")
+                continue
+            total += size
+            if max_total_size and total > max_total_size:
+                raise UploadTooLarge(f"Archive expands to more than {max_total_size} bytes")
+            extracted += 1
+    logger.info(f"Extracted {extracted} files from {archive.name}")
+    return extracted
@@ -54,14 +54,16 @@ class ChatService:
         ).first()
     
     def save_message(self, session_id: int, message: str, response: str, 
-                    processing_time: int, used_latest_data: bool = False) -> ChatMessage:
+                    processing_time: int, used_latest_data: bool = False,
+                    cached: bool = False) -> ChatMessage:
         """Save chat message to database"""
         chat_message = ChatMessage(
             session_id=session_id,
             message=message,
             response=response,
             processing_time=processing_time,
-            used_latest_data=used_latest_data
+            used_latest_data=used_latest_data,
+            cached=cached
         )
         self.db.add(chat_message)
         self.db.commit()
@@ -0,0 +1,165 @@
+import json
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CHUNK_COLUMNS = ('chunk_id', 'document_id', 'filename', 'page', 'chunk_index', 'text')
+
+# SQLite caps the number of bound parameters per statement
+MAX_QUERY_PARAMS = 900
+
+# Keyword index over chunk text, kept in sync with the chunks table by triggers
+KEYWORD_SCHEMA = (
+    "CREATE VIRTUAL TABLE chunks_fts USING fts5("
+    "text, content='chunks', content_rowid='chunk_id', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER chunks_fts_insert AFTER INSERT ON chunks BEGIN "
+    "INSERT INTO chunks_fts (rowid, text) VALUES (new.chunk_id, new.text); END",
+    "CREATE TRIGGER chunks_fts_delete AFTER DELETE ON chunks BEGIN "
+    "INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.chunk_id, old.text); END",
+    "CREATE TRIGGER chunks_fts_update AFTER UPDATE ON chunks BEGIN "
+    "INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.chunk_id, old.text); "
+    "INSERT INTO chunks_fts (rowid, text) VALUES (new.chunk_id, new.text); END"
+)
+
+class ChunkStore:
+    """
+    On-disk chunk records keyed by chunk id.
+
+    Backed by SQLite in WAL mode so every web and processing process can read
+    while one writes, and a search only touches the rows it returns. An FTS5
+    table in the same file holds the BM25 keyword index; its posting lists stay
+    on disk and SQLite pages in only the terms a query touches.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "chunk_id INTEGER PRIMARY KEY, "
+                "document_id TEXT NOT NULL, "
+                "filename TEXT, "
+                "page INTEGER, "
+                "chunk_index INTEGER, "
+                "text TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks (document_id)")
+        self._create_keyword_index()
+
+    def _create_keyword_index(self):
+        """Add the keyword index to stores created before it existed, indexing their chunks once"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'"
+            ).fetchone()
+            if not exists:
+                for statement in KEYWORD_SCHEMA:
+                    conn.execute(statement)
+                conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+                logger.info(f"Built keyword index for {self.count()} chunks")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread, sqlite3 connections must not be shared"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # INSERT OR REPLACE only fires the keyword index delete trigger with this on
+            conn.execute("PRAGMA recursive_triggers=ON")
+            self._local.conn = conn
+        return conn
+
+    def add_chunks(self, records: List[Dict]):
+        if not records:
+            return
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, document_id, filename, page, chunk_index, text) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [tuple(record[column] for column in CHUNK_COLUMNS) for record in records]
+            )
+
+    def get_chunks(self, chunk_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Fetch only the requested chunk records"""
+        chunk_ids = [int(chunk_id) for chunk_id in chunk_ids]
+        chunks = {}
+        conn = self._connection()
+        for start in range(0, len(chunk_ids), MAX_QUERY_PARAMS):
+            batch = chunk_ids[start:start + MAX_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT {', '.join(CHUNK_COLUMNS)} FROM chunks WHERE chunk_id IN ({placeholders})",
+                batch
+            )
+            for row in rows:
+                chunks[row[0]] = dict(zip(CHUNK_COLUMNS, row))
+        return chunks
+
+    def keyword_search(self, match: str, limit: int, max_id: Optional[int] = None,
+                       document_ids: Optional[List[str]] = None) -> List[int]:
+        """Chunk ids ranked by BM25 for an FTS5 match expression, best first, optionally within some documents"""
+        if not match:
+            return []
+        sql = "SELECT rowid FROM chunks_fts WHERE chunks_fts MATCH ? AND rowid < ?"
+        params = [match, max_id if max_id is not None else 2**63 - 1]
+        if document_ids is not None:
+            # One JSON parameter instead of one placeholder per document
+            sql += " AND rowid IN (SELECT chunk_id FROM chunks WHERE document_id IN (SELECT value FROM json_each(?)))"
+            params.append(json.dumps(list(document_ids)))
+        rows = self._connection().execute(sql + " ORDER BY rank LIMIT ?", params + [limit])
+        return [row[0] for row in rows]
+
+    def iter_chunks(self, batch_size: int = 1000) -> Iterator[List[Dict]]:
+        """Stream every chunk record in chunk id order"""
+        conn = self._connection()
+        last_id = -1
+        while True:
+            rows = conn.execute(
+                f"SELECT {', '.join(CHUNK_COLUMNS)} FROM chunks WHERE chunk_id > ? ORDER BY chunk_id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield [dict(zip(CHUNK_COLUMNS, row)) for row in rows]
+            last_id = rows[-1][0]
+
+    def delete_range(self, chunk_range: Tuple[int, int]):
+        """Delete chunk ids in [start, end)"""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM chunks WHERE chunk_id >= ? AND chunk_id < ?", tuple(chunk_range))
+
+    def reassign_document(self, document_id: str, new_document_id: str, filename: str):
+        """Hand a document's chunks to another document sharing them"""
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE chunks SET document_id = ?, filename = ? WHERE document_id = ?",
+                (new_document_id, filename, document_id)
+            )
+
+    def delete_chunks(self, chunk_ids: Iterable[int]):
+        chunk_ids = [int(chunk_id) for chunk_id in chunk_ids]
+        with self._connection() as conn:
+            for start in range(0, len(chunk_ids), MAX_QUERY_PARAMS):
+                batch = chunk_ids[start:start + MAX_QUERY_PARAMS]
+                conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch)
+
+    def delete_from(self, chunk_id: int) -> int:
+        """Drop rows at or above chunk_id, left behind by writes that never committed"""
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM chunks WHERE chunk_id >= ?", (chunk_id,)).rowcount
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
@@ -0,0 +1,118 @@
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class CompactionScheduler:
+    """
+    Background maintenance that compacts the knowledge base once deleted vectors or
+    segments pile up. Deletes only tombstone chunk ids, so their vectors keep using
+    disk, memory and search time until a compaction rewrites the segments.
+
+    A compaction starts when the dead vector ratio reaches COMPACTION_DEAD_RATIO (with
+    at least COMPACTION_MIN_DEAD dead vectors) or the segment count exceeds
+    COMPACTION_MAX_SEGMENTS, and only while this worker sees little search traffic,
+    optionally restricted to the local COMPACTION_HOURS window. Every web worker runs
+    a scheduler; the compaction lock lets only one of them compact at a time.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.enabled = settings.COMPACTION_ENABLED
+        self.last_check = None
+        self.last_reason = None
+        self._searches: Optional[Tuple[float, int]] = None
+        self._thread = None
+
+    def start(self):
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(
+            target=self._run,
+            name="CompactionScheduler",
+            daemon=True
+        )
+        self._thread.start()
+        logger.info("Background compaction scheduler started")
+
+    def _run(self):
+        while True:
+            time.sleep(settings.COMPACTION_CHECK_INTERVAL)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Error in scheduled compaction: {str(e)}")
+
+    def check(self) -> bool:
+        """Compact now if thresholds are crossed and the system is quiet; returns whether it ran"""
+        self.last_check = datetime.utcnow().isoformat()
+        reason = self.compaction_reason(self.store.get_storage_stats())
+        if reason is None:
+            self.last_reason = None
+            return False
+        if not self._is_quiet():
+            self.last_reason = f"{reason}, waiting for low traffic"
+            return False
+
+        self.last_reason = reason
+        logger.info(f"Starting scheduled compaction: {reason}")
+        try:
+            self.store.compact_index(cpu_budget=settings.COMPACTION_CPU_BUDGET)
+        except RuntimeError as e:
+            # Another worker is compacting, or the index changed underneath this run
+            logger.info(f"Scheduled compaction skipped: {str(e)}")
+            return False
+        self.last_reason = None
+        return True
+
+    @staticmethod
+    def compaction_reason(storage: Dict) -> Optional[str]:
+        if (storage['dead_vectors'] >= settings.COMPACTION_MIN_DEAD
+                and storage['dead_ratio'] >= settings.COMPACTION_DEAD_RATIO):
+            return f"{storage['dead_ratio']:.1%} of stored vectors are deleted"
+        if storage['segments'] > settings.COMPACTION_MAX_SEGMENTS and storage['mergeable_segments']:
+            return f"{storage['segments']} segments"
+        return None
+
+    def _is_quiet(self) -> bool:
+        if not _within_hours(settings.COMPACTION_HOURS, datetime.now().hour):
+            return False
+
+        now, searches = time.monotonic(), self.store.search_latency.searches
+        previous, self._searches = self._searches, (now, searches)
+        if previous is None:
+            # Need two samples to measure the search rate
+            return False
+        minutes = max((now - previous[0]) / 60, 1e-6)
+        return (searches - previous[1]) / minutes <= settings.COMPACTION_IDLE_SEARCHES_PER_MINUTE
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'storage': self.store.get_storage_stats(),
+            'thresholds': {
+                'dead_ratio': settings.COMPACTION_DEAD_RATIO,
+                'min_dead': settings.COMPACTION_MIN_DEAD,
+                'max_segments': settings.COMPACTION_MAX_SEGMENTS
+            },
+            'last_check': self.last_check,
+            'pending_reason': self.last_reason,
+            'last_run': self.store.get_compaction_status()
+        }
+
+def _within_hours(window: str, hour: int) -> bool:
+    """Whether hour falls in a "start-end" local hour window, which may wrap midnight"""
+    if not window:
+        return True
+    try:
+        start, end = (int(part) for part in window.split("-"))
+    except ValueError:
+        logger.warning(f"Ignoring invalid COMPACTION_HOURS {window!r}, expected e.g. \"1-5\"")
+        return True
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
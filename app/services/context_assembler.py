@@ -0,0 +1,132 @@
+import logging
+import threading
+from typing import Dict, List
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Shortest suffix/prefix match treated as splitter overlap rather than a coincidence
+MIN_OVERLAP_CHARS = 8
+
+# Rough characters per token, used only when the model's tokenizer cannot be loaded
+CHARS_PER_TOKEN = 4
+
+_tokenizer_lock = threading.Lock()
+_tokenizer = None
+_tokenizer_loaded = False
+
+def _get_tokenizer():
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        with _tokenizer_lock:
+            if not _tokenizer_loaded:
+                try:
+                    from transformers import AutoTokenizer
+                    _tokenizer = AutoTokenizer.from_pretrained(settings.LLM_TOKENIZER)
+                    logger.info(f"Loaded {settings.LLM_TOKENIZER} tokenizer for prompt budgeting")
+                except Exception as e:
+                    logger.warning(f"Could not load tokenizer {settings.LLM_TOKENIZER}, "
+                                   f"estimating {CHARS_PER_TOKEN} characters per token: {str(e)}")
+                _tokenizer_loaded = True
+    return _tokenizer
+
+def count_tokens(text: str) -> int:
+    """Tokens text takes in the chat model's prompt"""
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+def strip_overlap(previous: str, following: str, max_overlap: int) -> str:
+    """following without the leading text it repeats from the end of previous"""
+    longest = min(len(previous), len(following), max_overlap)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(following[:size]):
+            return following[size:]
+    return following
+
+class ContextAssembler:
+    """
+    Builds the documentation and chat history sections of the prompt within a token budget.
+
+    Retrieved chunks that are neighbours in the same document and page are stitched into
+    one passage with the text the splitter repeated between them (SPLIT_OVERLAP) removed.
+    The newest history turns take up to history_share of the budget, and chunks are then
+    added in rank order while the assembled documentation still fits the rest.
+    """
+
+    def __init__(self, token_budget: int, history_share: float, max_overlap: int):
+        self.token_budget = token_budget
+        self.history_share = history_share
+        self.max_overlap = max_overlap
+
+    def assemble(self, chunks: List[Dict], history: List[Dict]) -> Dict:
+        history_text, history_turns = self._fit_history(history, int(self.token_budget * self.history_share))
+        history_tokens = count_tokens(history_text)
+
+        context_budget = self.token_budget - history_tokens
+        selected, seen_texts = [], set()
+        context_text, context_tokens = "", 0
+        for chunk in chunks:
+            if chunk['text'] in seen_texts:
+                continue
+            candidate = self._join(selected + [chunk])
+            candidate_tokens = count_tokens(candidate)
+            if candidate_tokens > context_budget:
+                continue
+            selected.append(chunk)
+            seen_texts.add(chunk['text'])
+            context_text, context_tokens = candidate, candidate_tokens
+
+        return {
+            'context': context_text,
+            'history': history_text,
+            'context_tokens': context_tokens,
+            'history_tokens': history_tokens,
+            'chunks_used': len(selected),
+            'chunks_dropped': len(chunks) - len(selected),
+            'passages': len(self._passages(selected)),
+            'history_turns': history_turns
+        }
+
+    def _fit_history(self, history: List[Dict], budget: int):
+        """Newest turns that fit the budget, oldest first"""
+        turns, used = [], 0
+        for entry in reversed(history):
+            turn = f"User: {entry['question']}\nSage: {entry['answer']}\n\n"
+            tokens = count_tokens(turn)
+            if used + tokens > budget:
+                break
+            turns.insert(0, turn)
+            used += tokens
+        return "".join(turns), len(turns)
+
+    def _passages(self, chunks: List[Dict]) -> List[List[Dict]]:
+        """Runs of consecutive chunks, ordered by each run's best ranked chunk"""
+        rank = {chunk['chunk_id']: position for position, chunk in enumerate(chunks)}
+        ordered = sorted(chunks, key=lambda chunk: (chunk['document_id'], chunk['page'] or 0, chunk['chunk_index']))
+        passages: List[List[Dict]] = []
+        for chunk in ordered:
+            if passages and _follows(passages[-1][-1], chunk):
+                passages[-1].append(chunk)
+            else:
+                passages.append([chunk])
+        return sorted(passages, key=lambda passage: min(rank[chunk['chunk_id']] for chunk in passage))
+
+    def _join(self, chunks: List[Dict]) -> str:
+        texts = []
+        for passage in self._passages(chunks):
+            text = passage[0]['text']
+            for previous, following in zip(passage, passage[1:]):
+                rest = strip_overlap(previous['text'], following['text'], self.max_overlap)
+                # Without a detected overlap the chunks were split at whitespace the splitter stripped
+                text += rest if len(rest) < len(following['text']) else " " + rest
+            texts.append(text)
+        return "\n\n".join(texts)
+
+def _follows(previous: Dict, chunk: Dict) -> bool:
+    """Whether chunk comes right after previous in the same document and page"""
+    return (chunk['document_id'] == previous['document_id'] and chunk['page'] == previous['page']
+            and chunk['chunk_index'] == previous['chunk_index'] + 1)
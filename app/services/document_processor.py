@@ -1,16 +1,14 @@
-import asyncio
-import multiprocessing
 import queue
 import threading
 import logging
 import time
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import Future
 from typing import Dict, Any, Optional
 from dataclasses import dataclass
-from sqlalchemy.orm import Session
 from app.database import SessionLocal
 from app.models.document import Document, DocumentStatus
-from app.services.document_store import DocumentStore
+from app.services.ingestion_pipeline import DocumentDeleted
+from app.services.store_registry import get_ingestion_pipeline
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -25,8 +23,8 @@ class DocumentProcessingTask:
 
 class DocumentProcessingService:
     """
-    Dedicated service for processing documents in separate processes/threads
-    to avoid blocking the main application for other users
+    Queues uploaded documents by priority and feeds them to the staged ingestion
+    pipeline, retrying failed documents with exponential backoff
     """
     
     def __init__(self):
@@ -34,8 +32,7 @@ class DocumentProcessingService:
         self.processing_status = {}  # document_id -> status
         self.is_running = False
         self.workers = []
-        self.process_pool = None
-        self.thread_pool = None
+        self.pipeline = None
         
         # Initialize based on hardware configuration
         self.max_workers = settings.DOC_PROCESSING_WORKERS
@@ -50,11 +47,9 @@ class DocumentProcessingService:
         
         self.is_running = True
         
-        # Create process pool for CPU-intensive tasks
-        self.process_pool = ProcessPoolExecutor(max_workers=self.max_workers)
-        
-        # Create thread pool for I/O operations
-        self.thread_pool = ThreadPoolExecutor(max_workers=self.max_workers * 2)
+        # Parsing, embedding and indexing run in the pipeline's stages
+        self.pipeline = get_ingestion_pipeline()
+        self.pipeline.start()
         
         # Start worker threads for task management
         for i in range(min(3, self.max_workers)):  # Task management threads
@@ -75,13 +70,8 @@ class DocumentProcessingService:
         
         self.is_running = False
         
-        # Shutdown process pool
-        if self.process_pool:
-            self.process_pool.shutdown(wait=True)
-        
-        # Shutdown thread pool
-        if self.thread_pool:
-            self.thread_pool.shutdown(wait=True)
+        if self.pipeline:
+            self.pipeline.stop()
         
         logger.info("DocumentProcessingService stopped")
     
@@ -122,35 +112,27 @@ class DocumentProcessingService:
                 except queue.Empty:
                     continue
                 
-                logger.info(f"Worker {worker_name} processing document {task.document_id}")
-                
-                # Update status
-                self.processing_status[task.document_id] = {
-                    'status': 'processing',
-                    'started_at': time.time(),
-                    'worker': worker_name,
-                    'retry_count': task.retry_count
-                }
-                
-                # Process document in process pool
-                future = self.process_pool.submit(
-                    self._process_document_task,
-                    task.document_id,
-                    task.file_path
-                )
-                
                 try:
-                    # Wait for processing to complete
-                    success = future.result(timeout=300)  # 5 minute timeout per document
+                    document = self._start_document(task.document_id)
+                    if document is None:
+                        logger.warning(f"Document {task.document_id} no longer exists, skipping")
+                        self.processing_status.pop(task.document_id, None)
+                        continue
+                    
+                    logger.info(f"Worker {worker_name} submitting document {task.document_id} to the ingestion pipeline")
+                    
+                    # Update status
+                    self.processing_status[task.document_id] = {
+                        'status': 'processing',
+                        'started_at': time.time(),
+                        'worker': worker_name,
+                        'retry_count': task.retry_count
+                    }
                     
-                    if success:
-                        self.processing_status[task.document_id] = {
-                            'status': 'completed',
-                            'completed_at': time.time()
-                        }
-                        logger.info(f"Document {task.document_id} processed successfully")
-                    else:
-                        self._handle_processing_failure(task, "Processing failed")
+                    # Blocks only while the pipeline's parse queue is full
+                    file_type, filename = document
+                    future = self.pipeline.submit(task.document_id, task.file_path, file_type, filename)
+                    future.add_done_callback(lambda done, task=task: self._finish_document(task, done))
                 
                 except Exception as e:
                     logger.error(f"Error processing document {task.document_id}: {str(e)}")
@@ -165,6 +147,49 @@ class DocumentProcessingService:
         
         logger.info(f"Worker {worker_name} stopped")
     
+    def _start_document(self, document_id: str) -> Optional[tuple]:
+        """Mark the database record as processing; returns its file type and original filename"""
+        db = SessionLocal()
+        try:
+            document = db.query(Document).filter(Document.document_id == document_id).first()
+            if document is None:
+                return None
+            document.status = DocumentStatus.PROCESSING
+            db.commit()
+            return document.file_type, document.original_filename
+        finally:
+            db.close()
+    
+    def _finish_document(self, task: DocumentProcessingTask, future: Future):
+        """Record the pipeline's outcome for a document, called from the pipeline's threads"""
+        error = future.exception()
+        db = SessionLocal()
+        try:
+            document = db.query(Document).filter(Document.document_id == task.document_id).first()
+            if document:
+                if error is None:
+                    document.status = DocumentStatus.COMPLETED
+                    document.chunks_count = future.result()
+                else:
+                    document.status = DocumentStatus.FAILED
+                    document.error_message = str(error)
+                db.commit()
+        except Exception as e:
+            logger.error(f"Error updating document {task.document_id}: {str(e)}")
+        finally:
+            db.close()
+        
+        if error is None:
+            self.processing_status[task.document_id] = {
+                'status': 'completed',
+                'completed_at': time.time()
+            }
+            logger.info(f"Document {task.document_id} processed successfully")
+        elif isinstance(error, DocumentDeleted):
+            self.processing_status.pop(task.document_id, None)
+        else:
+            self._handle_processing_failure(task, str(error))
+    
     def _handle_processing_failure(self, task: DocumentProcessingTask, error_message: str):
         """Handle document processing failure with retry logic"""
         task.retry_count += 1
@@ -180,9 +205,12 @@ class DocumentProcessingService:
                 max_retries=task.max_retries
             )
             
-            # Add back to queue with delay
-            time.sleep(2 ** task.retry_count)  # Exponential backoff
-            self.task_queue.put((retry_priority, time.time(), retry_task))
+            # Add back to queue with delay, without holding up the calling pipeline stage
+            threading.Timer(
+                2 ** task.retry_count,  # Exponential backoff
+                self.task_queue.put,
+                args=((retry_priority, time.time(), retry_task),)
+            ).start()
             
             self.processing_status[task.document_id] = {
                 'status': 'retrying',
@@ -201,34 +229,6 @@ class DocumentProcessingService:
                 'retry_count': task.retry_count
             }
             logger.error(f"Document {task.document_id} failed after {task.retry_count} retries")
-    
-    @staticmethod
-    def _process_document_task(document_id: str, file_path: str) -> bool:
-        """
-        Static method for processing document in separate process
-        This runs in a separate process to avoid GIL limitations
-        """
-        try:
-            # Create new database session for this process
-            db = SessionLocal()
-            
-            try:
-                # Initialize document store
-                document_store = DocumentStore(settings.OUTPUT_FOLDER)
-                
-                # Process the document
-                success = asyncio.run(
-                    document_store.process_document(document_id, file_path, db)
-                )
-                
-                return success
-            
-            finally:
-                db.close()
-        
-        except Exception as e:
-            logger.error(f"Error in document processing task: {str(e)}")
-            return False
 
 # Global instance
 document_processor = DocumentProcessingService()
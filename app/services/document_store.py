@@ -1,19 +1,31 @@
 import os
+import time
 import uuid
 import pickle
 import logging
 import asyncio
-from typing import Dict, Optional, List
-from datetime import datetime
+import threading
+from contextlib import contextmanager, suppress
+from typing import Dict, Optional, List, Tuple
+from datetime import datetime, timezone
 from pathlib import Path
 import numpy as np
 import faiss
-import torch
+import psutil
+from filelock import Timeout
 from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from sqlalchemy.orm import Session
-from app.models.document import Document, DocumentStatus
+from app.models.document import DocumentStatus
+from app.services import index_factory
+from app.services.segment_store import SegmentStore
+from app.services.chunk_store import ChunkStore
+from app.services.tiered_index import SegmentFlatIndex, TieredIndex
+from app.services.embedding_cache import QueryEmbeddingCache
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.search_cache import SearchResultCache
+from app.services.retrieval_executor import RetrievalExecutor, RetrievalTimeout
+from app.services.hybrid_search import StageLatency, keyword_query, reciprocal_rank_fusion, reciprocal_rank_scores
+from app.services.embedding_backends import ModelLock, create_embeddings, embed_to_array, embedding_model_id
 from app.config import settings
 import pandas as pd
 import docx
@@ -21,196 +33,571 @@ import docx
 logger = logging.getLogger(__name__)
 
 class DocumentStore:
-    def __init__(self, base_path: str):
+    def __init__(self, base_path: str, embeddings=None):
         logger.info(f"Initializing DocumentStore with base path: {base_path}")
         self.base_path = Path(base_path)
         self.base_path.mkdir(parents=True, exist_ok=True)
-        self.index_path = self.base_path / "unified_faiss_index"
-        self.metadata_path = self.base_path / "unified_metadata.pickle"
+        # Single-file layout used before segment persistence, only read for migration
+        self.legacy_index_path = self.base_path / "unified_faiss_index"
+        self.legacy_metadata_path = self.base_path / "unified_metadata.pickle"
+        self.segment_store = SegmentStore(self.base_path)
+        self.chunk_store = ChunkStore(self.base_path / "chunks.sqlite3")
         
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=settings.EMBEDDINGS_MODEL,
-            model_kwargs={'device': "cuda" if torch.cuda.is_available() else "cpu"}
+        # Guards this process's view; the manifest write lock serializes writers across processes
+        self._lock = threading.RLock()
+        self._maintenance_thread = None
+        self._compaction_thread = None
+        self._watcher_thread = None
+        self._signature = None
+        self.index = None
+        
+        self.embeddings = embeddings or create_embeddings()
+        self._model_lock = ModelLock()
+        self.retrieval = RetrievalExecutor(settings.RETRIEVAL_CONCURRENCY, settings.RETRIEVAL_TIMEOUT)
+        self.query_cache = QueryEmbeddingCache(settings.EMBEDDING_CACHE_SIZE, embedding_model_id())
+        # Queries use the same encoding as documents, so concurrent ones can share a batch
+        self.query_batcher = EmbeddingBatcher(
+            self.embed_texts,
+            max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBEDDING_BATCH_WAIT_MS,
+            run_blocking=self.retrieval.run
         )
+        self.search_latency = StageLatency()
+        self.search_cache = SearchResultCache(settings.SEARCH_CACHE_SIZE)
         
         self._initialize_storage()
+        self._start_manifest_watcher()
 
     def _initialize_storage(self):
         logger.info("Initializing unified knowledge base storage")
         try:
-            if self.index_path.exists() and self.metadata_path.exists():
-                logger.info("Loading existing unified index and metadata")
-                self.index = faiss.read_index(str(self.index_path))
-                with open(self.metadata_path, 'rb') as f:
-                    self.metadata = pickle.load(f)
-            else:
-                logger.info("Creating new unified index and metadata")
-                embedding_dim = len(self.embeddings.embed_query("test"))
-                self.index = faiss.IndexFlatL2(embedding_dim)
-                self.metadata = {
-                    'documents': {},
-                    'chunks': [],
-                    'id_mapping': {},
-                    'global_status': 'ready'
-                }
-                self._save_storage()
+            with self._lock, self.segment_store.write_lock():
+                self._open_storage()
+            self._schedule_maintenance()
         except Exception as e:
             logger.error(f"Error initializing storage: {str(e)}")
             raise
 
-    def _save_storage(self):
-        logger.info("Saving unified storage")
+    def _open_storage(self):
+        if self.segment_store.exists():
+            logger.info("Loading existing unified manifest and segments")
+            self._signature = self.segment_store.manifest_signature()
+            self.metadata = self.segment_store.load_manifest()
+            if self.metadata.get('version', 1) < 2:
+                self._upgrade_manifest_v1()
+            orphaned = self.chunk_store.delete_from(self.metadata['next_chunk_id'])
+            if orphaned:
+                logger.warning(f"Dropped {orphaned} chunk records from an uncommitted write")
+            self._load_segments()
+        elif self.legacy_index_path.exists() and self.legacy_metadata_path.exists():
+            self._migrate_legacy_storage()
+        else:
+            logger.info("Creating new unified manifest")
+            index_type = index_factory.resolve_index_type(0)
+            if index_type in index_factory.TRAINED_INDEX_TYPES:
+                # IVF indexes need training data, start flat and migrate once vectors arrive
+                index_type = index_factory.FLAT
+            self.metadata = SegmentStore.empty_manifest(index_type)
+            self.metadata['dimension'] = len(self.embeddings.embed_query("test"))
+            self._commit()
+            self._load_segments()
+
+    def _load_segments(self):
+        """Open the index tiers for the current manifest"""
+        self.index = self._open_index(self.metadata, previous=self.index)
+
+    def _open_index(self, manifest: Dict, previous: Optional[TieredIndex] = None) -> TieredIndex:
+        """
+        Build the index tiers for a manifest: a read-only base shared through the
+        page cache plus an in-memory delta. Base data already open in previous is reused.
+        """
+        dimension = manifest['dimension']
+        index_type = manifest['index_type']
+        
+        if not index_factory.uses_checkpoint(index_type) and settings.INDEX_MMAP:
+            # Exact search runs straight over the mapped segment files, no index copy needed
+            mapped = previous.base.segments if previous is not None and previous.segment_backed else {}
+            base = SegmentFlatIndex(dimension)
+            for segment in manifest['segments']:
+                if segment['name'] in mapped:
+                    base.add_segment(segment['name'], *mapped[segment['name']][:2])
+                else:
+                    base.add_segment(segment['name'], *self.segment_store.read_vectors(segment['name'], mmap=True))
+            index = TieredIndex(index_type, dimension, base=base, covered_until=manifest['next_chunk_id'])
+        else:
+            checkpoint = _usable_checkpoint(manifest)
+            if checkpoint:
+                if previous is not None and previous.checkpoint_file == checkpoint['file']:
+                    base = previous.base
+                else:
+                    base = self.segment_store.read_checkpoint(checkpoint, mmap=settings.INDEX_MMAP)
+                base_mapped = settings.INDEX_MMAP and index_type in index_factory.TRAINED_INDEX_TYPES
+                if settings.INDEX_MMAP and not base_mapped and base is not getattr(previous, 'base', None):
+                    logger.warning(f"{index_type} checkpoints cannot be memory-mapped, loading into process memory")
+                index = TieredIndex(index_type, dimension, base=base, covered_until=checkpoint['covered_until'],
+                                    base_mapped=base_mapped, checkpoint_file=checkpoint['file'])
+            else:
+                # Serve exact search from the delta until a checkpoint of the target type exists
+                index = TieredIndex(index_factory.FLAT, dimension)
+            
+            ids, vectors = self._read_live_vectors(manifest, min_id=index.covered_until)
+            logger.info(f"Replaying {len(ids)} vectors not covered by the index checkpoint")
+            if len(ids):
+                index.add(ids, vectors)
+        
+        index.set_tombstones(manifest['tombstones'])
+        return index
+    
+    def _read_live_vectors(self, manifest: Dict, min_id: int = 0, max_id: Optional[int] = None):
+        """Concatenate non-deleted segment vectors with chunk ids in [min_id, max_id)"""
+        tombstones = manifest['tombstones']
+        excluded = np.fromiter(tombstones, dtype=np.int64, count=len(tombstones))
+        all_ids, all_vectors = [], []
+        for segment in manifest['segments']:
+            if segment['max_id'] < min_id or (max_id is not None and segment['min_id'] >= max_id):
+                continue
+            ids, vectors = self.segment_store.read_vectors(segment['name'])
+            mask = (ids >= min_id) & ~np.isin(ids, excluded)
+            if max_id is not None:
+                mask &= ids < max_id
+            all_ids.append(ids[mask])
+            all_vectors.append(vectors[mask])
+        
+        if not all_ids:
+            return np.empty(0, dtype=np.int64), np.empty((0, manifest['dimension']), dtype=np.float32)
+        return np.concatenate(all_ids), np.concatenate(all_vectors)
+
+    @contextmanager
+    def _writing(self):
+        """Serialize manifest writers across processes, starting from the latest committed generation"""
+        with self._lock, self.segment_store.write_lock():
+            self._refresh()
+            try:
+                yield
+            except BaseException:
+                self._rollback()
+                raise
+
+    def _rollback(self):
+        """Drop uncommitted changes of a failed write, going back to the last committed manifest"""
         try:
-            faiss.write_index(self.index, str(self.index_path))
-            with open(self.metadata_path, 'wb') as f:
-                pickle.dump(self.metadata, f)
+            manifest = self.segment_store.load_manifest()
+            committed = {segment['name'] for segment in manifest['segments']}
+            for segment in self.metadata['segments']:
+                if segment['name'] not in committed:
+                    self.segment_store.delete_segment(segment['name'])
+            self.chunk_store.delete_from(manifest['next_chunk_id'])
+            index = self._open_index(manifest, previous=self.index)
+            self.index, self.metadata = index, manifest
+            self._signature = self.segment_store.manifest_signature()
+            logger.warning(f"Rolled back to unified knowledge base generation {manifest['generation']}")
         except Exception as e:
-            logger.error(f"Error saving storage: {str(e)}")
-            raise
+            logger.error(f"Error rolling back to the committed manifest: {str(e)}")
+
+    def _refresh(self) -> bool:
+        """Swap in a newer generation committed by another process; the caller holds self._lock"""
+        signature = self.segment_store.manifest_signature()
+        if signature is None or signature == self._signature:
+            return False
+        
+        manifest = self.segment_store.load_manifest()
+        if manifest['generation'] <= self.metadata['generation']:
+            self._signature = signature
+            return False
+        
+        # In-flight searches keep using the snapshot they started with
+        index = self._open_index(manifest, previous=self.index)
+        # Index first, so a search that sees the new generation number also sees its index
+        self.index, self.metadata, self._signature = index, manifest, signature
+        logger.info(f"Loaded unified knowledge base generation {manifest['generation']}")
+        return True
+
+    def _start_manifest_watcher(self):
+        self._watcher_thread = threading.Thread(
+            target=self._watch_manifest,
+            name="ManifestWatcher",
+            daemon=True
+        )
+        self._watcher_thread.start()
+
+    def _watch_manifest(self):
+        """Pick up documents indexed and deleted by other processes"""
+        while True:
+            time.sleep(settings.MANIFEST_POLL_INTERVAL)
+            try:
+                with self._lock:
+                    self._refresh()
+            except Exception as e:
+                # A concurrent merge can delete segments of the generation being loaded, retry next poll
+                logger.error(f"Error reloading unified manifest: {str(e)}")
+
+    def _migrate_legacy_storage(self):
+        """Convert the single-file index + pickle layout into the first segment"""
+        logger.info("Migrating unified knowledge base to segment storage")
+        legacy_index = faiss.read_index(str(self.legacy_index_path))
+        with open(self.legacy_metadata_path, 'rb') as f:
+            legacy = pickle.load(f)
+        
+        if 'next_chunk_id' in legacy:
+            chunks = legacy['chunks']
+            try:
+                ids, vectors = index_factory.extract_vectors(legacy_index)
+                by_id = dict(zip(ids.tolist(), range(len(ids))))
+                vectors = np.stack([vectors[by_id[chunk_id]] for chunk_id in chunks]) if chunks else None
+            except (ValueError, KeyError):
+                vectors = None
+        else:
+            # Positional ids are only trustworthy if nothing was ever deleted
+            chunks = dict(enumerate(legacy['chunks']))
+            id_mapping = legacy.get('id_mapping', {})
+            positions_intact = (
+                legacy_index.ntotal == len(chunks)
+                and all(faiss_id == chunk_idx for faiss_id, chunk_idx in id_mapping.items())
+            )
+            vectors = legacy_index.reconstruct_n(0, legacy_index.ntotal) if positions_intact and chunks else None
+            for document_id, doc_info in legacy['documents'].items():
+                doc_info['chunk_ids'] = [chunk_id for chunk_id, chunk in chunks.items()
+                                         if chunk.get('document_id') == document_id]
+        
+        for doc_info in legacy['documents'].values():
+            doc_info.pop('chunks', None)
+            _set_document_chunks(doc_info, doc_info.pop('chunk_ids', []))
+        
+        if vectors is None and chunks:
+            logger.warning("Stored vectors could not be mapped to chunks, re-embedding once for migration")
+            vectors = self.embed_texts([chunk['text'] for chunk in chunks.values()], background=True)
+        
+        self.metadata = SegmentStore.empty_manifest(index_factory.resolve_index_type(len(chunks)))
+        self.metadata['dimension'] = legacy_index.d
+        self.metadata['next_chunk_id'] = max(chunks, default=-1) + 1
+        self.metadata['documents'] = legacy['documents']
+        
+        if chunks:
+            ids = np.fromiter(chunks.keys(), dtype=np.int64)
+            self.chunk_store.add_chunks([dict(chunk, chunk_id=chunk_id) for chunk_id, chunk in chunks.items()])
+            self.metadata['segments'].append(self.segment_store.write_segment(ids, vectors))
+        self._commit()
+        self._load_segments()
+        logger.info(f"Migrated {len(chunks)} chunks into segment storage")
+
+    def _upgrade_manifest_v1(self):
+        """Move chunk records out of version 1 segments into the chunk store"""
+        logger.info("Moving segment chunk records into the chunk store")
+        tombstones = self.metadata['tombstones']
+        for segment in self.metadata['segments']:
+            records = self.segment_store.read_legacy_records(segment['name'])
+            self.chunk_store.add_chunks([record for record in records if record['chunk_id'] not in tombstones])
+        for doc_info in self.metadata['documents'].values():
+            _set_document_chunks(doc_info, doc_info.pop('chunk_ids', []))
+        self.metadata['version'] = 2
+        self._commit()
+
+    def _commit(self):
+        """Publish the current manifest, the only file rewritten on every change; hold _writing()"""
+        self.segment_store.commit(self.metadata)
+        self._signature = self.segment_store.manifest_signature()
 
     async def add_document(self, document_id: str, filename: str) -> None:
         logger.info(f"Adding document {document_id} with filename {filename} to unified knowledge base")
-        self.metadata['documents'][document_id] = {
-            'status': DocumentStatus.PROCESSING,
-            'chunks': [],
-            'filename': filename,
-            'created_at': datetime.utcnow().isoformat()
-        }
-        self._save_storage()
+        self.add_documents([(document_id, filename)])
 
-    def _load_document_by_type(self, file_path: str, file_type: str):
-        """Load document based on file type"""
-        try:
-            if file_type.lower() == 'pdf':
-                loader = PyPDFLoader(file_path)
-                return loader.load()
+    def add_documents(self, documents: List[Tuple[str, str]]):
+        """Register (document_id, filename) pairs as processing, in one manifest commit"""
+        with self._writing():
+            for document_id, filename in documents:
+                self.metadata['documents'][document_id] = {
+                    'status': DocumentStatus.PROCESSING,
+                    'chunk_count': 0,
+                    'filename': filename,
+                    'file_type': _file_type(filename),
+                    'created_at': datetime.utcnow().isoformat()
+                }
+            self._commit()
+
+    def index_documents(self, documents: List[Tuple[str, str, List[Dict]]], vectors: np.ndarray) -> List[str]:
+        """
+        Add the split chunks of one or more documents, given as (document_id, filename, chunks)
+        with their vectors in the same order, as one segment and one manifest commit.
+        Documents deleted in the meantime are skipped; returns their ids.
+        """
+        with self._writing():
+            # Checked before anything is written, so a deleted document cannot leave partial state
+            registered = [document_id in self.metadata['documents'] for document_id, _, _ in documents]
+            skipped = [document_id for (document_id, _, _), keep in zip(documents, registered) if not keep]
+            if skipped:
+                counts = [len(chunks) for _, _, chunks in documents]
+                vectors = vectors[np.repeat(registered, counts)] if len(vectors) else vectors
+                documents = [document for document, keep in zip(documents, registered) if keep]
             
-            elif file_type.lower() == 'docx':
-                doc = docx.Document(file_path)
-                content = []
-                for paragraph in doc.paragraphs:
-                    if paragraph.text.strip():
-                        content.append(paragraph.text)
-                
-                from langchain_core.documents import Document as LangChainDoc
-                return [LangChainDoc(page_content='\n'.join(content), metadata={'source': file_path})]
+            start_id = self.metadata['next_chunk_id']
+            total = sum(len(chunks) for _, _, chunks in documents)
+            chunk_ids = np.arange(start_id, start_id + total, dtype=np.int64)
+            records = []
+            for document_id, filename, chunks in documents:
+                for i, chunk in enumerate(chunks):
+                    records.append({
+                        'chunk_id': int(chunk_ids[len(records)]),
+                        'text': chunk['text'],
+                        'page': chunk['page'],
+                        'document_id': document_id,
+                        'filename': filename,
+                        'chunk_index': i
+                    })
             
-            elif file_type.lower() == 'txt':
-                loader = TextLoader(file_path, encoding='utf-8')
-                return loader.load()
+            # Searches run on other threads: build the next index and swap it in, as _refresh does
+            index = self.index.copy()
+            if records:
+                self.chunk_store.add_chunks(records)
+                segment = self.segment_store.write_segment(chunk_ids, vectors)
+                self.metadata['segments'].append(segment)
+                if index.segment_backed:
+                    # Search the mapped file rather than keeping a private copy of the vectors
+                    index.add(*self.segment_store.read_vectors(segment['name'], mmap=True),
+                              segment_name=segment['name'])
+                else:
+                    index.add(chunk_ids, vectors)
+            self.metadata['next_chunk_id'] = start_id + total
             
-            elif file_type.lower() in ['xlsx', 'xls']:
-                df = pd.read_excel(file_path)
-                content = df.to_string(index=False)
-                
-                from langchain_core.documents import Document as LangChainDoc
-                return [LangChainDoc(page_content=content, metadata={'source': file_path})]
+            logger.info("Updating unified knowledge base metadata")
+            offset = 0
+            for document_id, _, chunks in documents:
+                doc_info = self.metadata['documents'][document_id]
+                doc_info['status'] = DocumentStatus.COMPLETED
+                _set_document_chunks(doc_info, chunk_ids[offset:offset + len(chunks)].tolist())
+                offset += len(chunks)
             
-            else:
-                raise ValueError(f"Unsupported file type: {file_type}")
-                
-        except Exception as e:
-            logger.error(f"Error loading {file_type} file: {str(e)}")
-            raise
+            self.index = index
+            self._maybe_upgrade_index()
+            self._commit()
+        
+        self._schedule_maintenance()
+        return skipped
 
-    async def process_document(self, document_id: str, file_path: str, db: Session) -> bool:
-        logger.info(f"Processing document {document_id} for unified knowledge base")
+    def mark_failed(self, document_id: str, error: str):
+        with self._writing():
+            if document_id in self.metadata['documents']:
+                self.metadata['documents'][document_id]['status'] = DocumentStatus.FAILED
+                self.metadata['documents'][document_id]['error'] = error
+                self._commit()
+
+    def _maybe_upgrade_index(self):
+        """Switch from the flat index to a trained index once the corpus crosses the configured threshold"""
+        current_type = self.metadata['index_type']
+        target_type = index_factory.resolve_index_type(self.index.ntotal)
+        if target_type == current_type or current_type != index_factory.FLAT:
+            return
+        
+        logger.info(f"Unified index reached {self.index.ntotal} vectors, migrating from {current_type} to {target_type}")
+        # The background checkpoint builds the new index, searches stay exact until it is ready
+        self.metadata['index_type'] = target_type
+
+    async def search(self, query: str, k: int = 4, nprobe: Optional[int] = None,
+                     ef_search: Optional[int] = None, filters: Optional[Dict] = None) -> List[str]:
+        """
+        Search across the unified knowledge base, or only the documents matching filters
+        (document_ids, file_types, filename, uploaded_after, uploaded_before).
+        Vector and BM25 keyword results are fused with reciprocal rank fusion when HYBRID_SEARCH is on.
+        nprobe (IVF) and ef_search (HNSW) override the configured search-time defaults.
+        """
+        chunks = await self.search_chunks(query, k=k, nprobe=nprobe, ef_search=ef_search, filters=filters)
+        return [chunk['text'] for chunk in chunks]
+
+    async def search_chunks(self, query: str, k: int = 4, nprobe: Optional[int] = None,
+                            ef_search: Optional[int] = None, filters: Optional[Dict] = None) -> List[Dict]:
+        """Like search, but returns the ranked chunk records (chunk_id, document_id, filename, page, chunk_index, text)"""
+        keyword_task = None
         try:
-            db_document = db.query(Document).filter(Document.document_id == document_id).first()
-            if db_document:
-                db_document.status = DocumentStatus.PROCESSING
-                db.commit()
-            
-            file_type = db_document.file_type if db_document else 'pdf'
-            logger.info(f"Processing file as type: {file_type}")
-            
-            documents = self._load_document_by_type(file_path, file_type)
-            
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=settings.SPLIT_CHUNK_SIZE,
-                chunk_overlap=settings.SPLIT_OVERLAP
-            )
-            chunks = text_splitter.split_documents(documents)
-            logger.info(f"Split document into {len(chunks)} chunks")
+            # Read before the index: a new generation's index is always published before its number
+            generation = self.metadata['generation']
+            index = self.index
+            if index.ntotal == 0:
+                logger.warning("No documents in unified knowledge base")
+                return []
             
-            chunk_texts = [chunk.page_content for chunk in chunks]
-            logger.info("Creating embeddings for unified knowledge base")
-            embeddings = self.embeddings.embed_documents(chunk_texts)
+            started = time.perf_counter()
+            cache_key = SearchResultCache.key(query, k, nprobe, ef_search, filters)
+            cached = self.search_cache.get(cache_key, generation)
+            if cached is not None:
+                logger.info(f"Served {len(cached)} chunks from the search result cache")
+                return cached
             
-            logger.info("Adding to unified FAISS index")
-            start_idx = self.index.ntotal
-            self.index.add(np.array(embeddings))
+            timings = {}
+            document_ids, allowed = None, None
+            if filters:
+                document_ids, allowed = await self.retrieval.run(self._resolve_filters, filters)
+                timings['filter'] = time.perf_counter() - started
+                if not len(allowed):
+                    logger.info("No documents match the search filters")
+                    return []
             
-            chunk_metadata = []
-            for i, chunk in enumerate(chunks):
-                faiss_id = start_idx + i
-                chunk_info = {
-                    'text': chunk.page_content,
-                    'page': chunk.metadata.get('page', 0),
-                    'document_id': document_id,
-                    'filename': db_document.original_filename if db_document else 'unknown',
-                    'chunk_index': i
-                }
-                
-                self.metadata['id_mapping'][faiss_id] = len(self.metadata['chunks'])
-                self.metadata['chunks'].append(chunk_info)
-                chunk_metadata.append(chunk_info)
+            candidates = max(k, settings.HYBRID_CANDIDATES) if settings.HYBRID_SEARCH else k
+            if settings.HYBRID_SEARCH:
+                # The keyword lookup runs while the query is being embedded
+                keyword_task = asyncio.create_task(self.retrieval.run(
+                    self._keyword_search, query, candidates, self.metadata['next_chunk_id'], document_ids, timings
+                ))
             
-            logger.info("Updating unified knowledge base metadata")
-            self.metadata['documents'][document_id].update({
-                'status': DocumentStatus.COMPLETED,
-                'chunks': chunk_metadata,
-                'chunk_count': len(chunks)
-            })
+            query_embedding = await self.embed_query(query)
+            embedded = time.perf_counter()
+            timings['embed'] = embedded - started
             
-            self._save_storage()
+            D, I = await self.retrieval.run(
+                index.search,
+                np.array([query_embedding], dtype=np.float32),
+                candidates,
+                nprobe=nprobe,
+                ef_search=max(ef_search or settings.HNSW_EF_SEARCH, candidates),
+                allowed=allowed
+            )
+            chunk_ids = [int(chunk_id) for chunk_id in I[0] if chunk_id != -1]
+            timings['vector'] = time.perf_counter() - embedded
             
-            if db_document:
-                db_document.status = DocumentStatus.COMPLETED
-                db_document.chunks_count = len(chunks)
-                db.commit()
+            if keyword_task is not None:
+                keyword_ids = await keyword_task
+                fusion_started = time.perf_counter()
+                chunk_ids = reciprocal_rank_fusion([chunk_ids, keyword_ids], settings.RRF_K)
+                timings['fusion'] = time.perf_counter() - fusion_started
+            chunk_ids = chunk_ids[:k]
             
-            logger.info(f"Successfully processed document {document_id} into unified knowledge base")
-            return True
+            fetch_started = time.perf_counter()
+            chunks = await self.retrieval.run(self.chunk_store.get_chunks, chunk_ids)
+            relevant_chunks = [chunks[chunk_id] for chunk_id in chunk_ids if chunk_id in chunks]
+            timings['fetch'] = time.perf_counter() - fetch_started
+            timings['total'] = time.perf_counter() - started
+            self.search_latency.record(timings)
+            self.search_cache.put(cache_key, generation, relevant_chunks, timings['total'])
             
+            stages = ", ".join(f"{stage} {seconds * 1000:.1f}" for stage, seconds in timings.items())
+            logger.info(f"Found {len(relevant_chunks)} relevant chunks from unified knowledge base ({stages} ms)")
+            return relevant_chunks
+        
+        except RetrievalTimeout as e:
+            logger.error(f"Search of unified knowledge base timed out: {str(e)}")
+            raise
         except Exception as e:
-            logger.error(f"Error processing document: {str(e)}")
-            self.metadata['documents'][document_id]['status'] = DocumentStatus.FAILED
-            self.metadata['documents'][document_id]['error'] = str(e)
-            self._save_storage()
-            
-            if db_document:
-                db_document.status = DocumentStatus.FAILED
-                db_document.error_message = str(e)
-                db.commit()
-            
-            return False
+            logger.error(f"Error searching unified knowledge base: {str(e)}")
+            return []
+        finally:
+            if keyword_task is not None:
+                await _cancel_task(keyword_task)
 
-    async def search(self, query: str, k: int = 4) -> List[str]:
-        """Search across the entire unified knowledge base"""
+    async def search_batch(self, queries: List[str], k: int = 4, nprobe: Optional[int] = None,
+                           ef_search: Optional[int] = None, filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """
+        Search many queries at once: one embedding batch and one index search over the query matrix.
+        Each hit carries chunk_id, text, document_id, filename, page, its fused rank score and,
+        when the vector stage found it, the L2 distance.
+        """
+        index = self.index
+        if not queries or index.ntotal == 0:
+            return [[] for _ in queries]
+        
+        started = time.perf_counter()
+        document_ids, allowed = None, None
+        if filters:
+            document_ids, allowed = await self.retrieval.run(self._resolve_filters, filters)
+            if not len(allowed):
+                return [[] for _ in queries]
+        
+        candidates = max(k, settings.HYBRID_CANDIDATES) if settings.HYBRID_SEARCH else k
+        keyword_task = None
+        if settings.HYBRID_SEARCH:
+            keyword_task = asyncio.create_task(self.retrieval.run(
+                self._keyword_search_batch, queries, candidates, self.metadata['next_chunk_id'], document_ids
+            ))
+        
         try:
-            if self.index.ntotal == 0:
-                logger.warning("No documents in unified knowledge base")
-                return []
-            
-            query_embedding = self.embeddings.embed_query(query)
-            
-            D, I = self.index.search(np.array([query_embedding]), k)
-            
-            relevant_chunks = []
-            for idx in I[0]:
-                if idx != -1 and idx in self.metadata['id_mapping']:
-                    chunk_idx = self.metadata['id_mapping'][int(idx)]
-                    if chunk_idx < len(self.metadata['chunks']):
-                        chunk = self.metadata['chunks'][chunk_idx]
-                        relevant_chunks.append(chunk['text'])
-            
-            logger.info(f"Found {len(relevant_chunks)} relevant chunks from unified knowledge base")
-            return relevant_chunks
-                        
+            vectors = await self.retrieval.run(self.embed_texts, queries)
+            D, I = await self.retrieval.run(
+                index.search,
+                vectors,
+                candidates,
+                nprobe=nprobe,
+                ef_search=max(ef_search or settings.HNSW_EF_SEARCH, candidates),
+                allowed=allowed
+            )
+            keyword_rankings = await keyword_task if keyword_task is not None else [None] * len(queries)
+        finally:
+            if keyword_task is not None:
+                await _cancel_task(keyword_task)
+        
+        ranked = []
+        for distances, labels, keyword_ids in zip(D, I, keyword_rankings):
+            distance_by_id = {int(chunk_id): float(distance) for chunk_id, distance in zip(labels, distances)
+                              if chunk_id != -1}
+            rankings = [list(distance_by_id)] + ([keyword_ids] if keyword_ids is not None else [])
+            ranked.append([(chunk_id, score, distance_by_id.get(chunk_id))
+                           for chunk_id, score in reciprocal_rank_scores(rankings, settings.RRF_K)[:k]])
+        
+        chunks = await self.retrieval.run(
+            self.chunk_store.get_chunks, {chunk_id for hits in ranked for chunk_id, _, _ in hits}
+        )
+        results = [
+            [
+                {
+                    'chunk_id': chunk_id,
+                    'text': chunks[chunk_id]['text'],
+                    'document_id': chunks[chunk_id]['document_id'],
+                    'filename': chunks[chunk_id]['filename'],
+                    'page': chunks[chunk_id]['page'],
+                    'score': score,
+                    'distance': distance
+                }
+                for chunk_id, score, distance in hits if chunk_id in chunks
+            ]
+            for hits in ranked
+        ]
+        
+        elapsed = time.perf_counter() - started
+        logger.info(f"Batch searched {len(queries)} queries in {elapsed * 1000:.1f} ms "
+                    f"({len(queries) / elapsed:.1f} queries/s)")
+        return results
+
+    def _resolve_filters(self, filters: Dict):
+        """Document ids the matching chunks are stored under, and the sorted chunk ids"""
+        documents = dict(self.metadata['documents'])
+        document_ids = _filter_documents(documents, filters)
+        # A document sharing an identical document's chunks finds them under that document's id
+        owners = sorted({documents[document_id].get('chunks_of', document_id) for document_id in document_ids})
+        return owners, _chunk_id_array(documents, document_ids)
+
+    def _keyword_search_batch(self, queries: List[str], limit: int, max_id: int,
+                              document_ids: Optional[List[str]]) -> List[List[int]]:
+        timings = {}
+        return [self._keyword_search(query, limit, max_id, document_ids, timings) for query in queries]
+
+    def _keyword_search(self, query: str, limit: int, max_id: int, document_ids: Optional[List[str]],
+                        timings: Dict) -> List[int]:
+        """BM25 ranked chunk ids, limited to chunks committed to the manifest this search started from"""
+        started = time.perf_counter()
+        try:
+            return self.chunk_store.keyword_search(keyword_query(query), limit, max_id=max_id,
+                                                   document_ids=document_ids)
         except Exception as e:
-            logger.error(f"Error searching unified knowledge base: {str(e)}")
+            # Vector results alone still answer the query
+            logger.error(f"Error in keyword search: {str(e)}")
             return []
+        finally:
+            timings['keyword'] = time.perf_counter() - started
+
+    def embed_texts(self, texts: List[str], background: bool = False) -> np.ndarray:
+        """
+        Embed texts with the shared model, one call at a time. Background work (ingestion,
+        re-embedding) takes the model INGEST_EMBED_SLICE texts at a time and yields it to
+        waiting queries in between.
+        """
+        if background:
+            return embed_to_array(self.embeddings, texts, batch_size=settings.INGEST_EMBED_SLICE,
+                                  guard=self._model_lock.background)
+        with self._model_lock.query():
+            return embed_to_array(self.embeddings, texts)
+
+    async def embed_query(self, query: str) -> np.ndarray:
+        """Embed a search query, reusing recent identical queries and batching concurrent ones"""
+        vector = self.query_cache.get(query)
+        if vector is None:
+            vector = self.query_cache.put(query, await self.query_batcher.embed(query))
+        return vector
 
     def get_document_status(self, document_id: str) -> Optional[Dict]:
         """Get document processing status from unified knowledge base"""
@@ -218,73 +605,654 @@ class DocumentStore:
 
     def get_knowledge_base_status(self) -> Dict:
         """Get overall knowledge base status"""
-        total_documents = len(self.metadata['documents'])
-        completed_documents = len([doc for doc in self.metadata['documents'].values() 
-                                 if doc['status'] == DocumentStatus.COMPLETED])
-        total_chunks = len(self.metadata['chunks'])
+        # Writers and manifest reloads change the documents concurrently, count over a snapshot
+        metadata = self.metadata
+        documents = list(metadata['documents'].values())
+        total_documents = len(documents)
+        completed_documents = len([doc for doc in documents if doc['status'] == DocumentStatus.COMPLETED])
+        # Identical documents share their chunks, count them once
+        total_chunks = sum(doc.get('chunk_count', 0) for doc in documents if 'chunks_of' not in doc)
         
         return {
-            'status': self.metadata['global_status'],
+            'status': metadata['global_status'],
             'total_documents': total_documents,
             'completed_documents': completed_documents,
             'total_chunks': total_chunks,
             'last_updated': datetime.utcnow().isoformat()
         }
 
+    def get_memory_usage(self) -> Dict:
+        """Memory of this worker process; shared pages are the mapped index files every worker reuses"""
+        process = psutil.Process()
+        memory = process.memory_full_info()
+        return {
+            'pid': process.pid,
+            'rss_mb': round(memory.rss / (1024**2), 1),
+            'private_mb': round(memory.uss / (1024**2), 1),
+            'shared_mb': round((memory.rss - memory.uss) / (1024**2), 1),
+            'vector_storage': index_factory.vector_storage(),
+            'index': self.index.memory_stats()
+        }
+
+    def link_document(self, document_id: str, source_id: str, filename: str) -> bool:
+        """
+        Add a document whose file is byte-identical to an already processed one by sharing
+        the source's chunks and vectors. Returns False if the source is no longer completed.
+        """
+        with self._writing():
+            source = self.metadata['documents'].get(source_id)
+            if source is None or source['status'] != DocumentStatus.COMPLETED:
+                return False
+            doc_info = {
+                'status': DocumentStatus.COMPLETED,
+                'filename': filename,
+                'file_type': _file_type(filename),
+                'created_at': datetime.utcnow().isoformat(),
+                # The document whose id the shared chunk records carry
+                'chunks_of': source.get('chunks_of', source_id)
+            }
+            _set_document_chunks(doc_info, _document_chunk_ids(source))
+            self.metadata['documents'][document_id] = doc_info
+            self._commit()
+        logger.info(f"Linked document {document_id} to the chunks of identical document {source_id}")
+        return True
+
     def delete_document(self, document_id: str) -> bool:
         """Delete document from unified knowledge base"""
         try:
-            if document_id in self.metadata['documents']:
-                logger.info(f"Removing document {document_id} from unified knowledge base")
+            with self._writing():
+                if document_id not in self.metadata['documents']:
+                    return False
                 
-                chunks_to_remove = []
-                for i, chunk in enumerate(self.metadata['chunks']):
-                    if chunk.get('document_id') == document_id:
-                        chunks_to_remove.append(i)
+                logger.info(f"Removing document {document_id} from unified knowledge base")
                 
-                for chunk_idx in reversed(chunks_to_remove):
-                    del self.metadata['chunks'][chunk_idx]
+                doc_info = self.metadata['documents'][document_id]
+                if self._release_shared_chunks(document_id, doc_info):
+                    del self.metadata['documents'][document_id]
+                    self._commit()
+                    return True
                 
-                keys_to_remove = []
-                for faiss_id, chunk_idx in self.metadata['id_mapping'].items():
-                    if chunk_idx in chunks_to_remove or chunk_idx >= len(self.metadata['chunks']):
-                        keys_to_remove.append(faiss_id)
+                chunk_ids = _document_chunk_ids(doc_info)
+                index = self.index.copy()
+                index.remove(chunk_ids)
                 
-                for key in keys_to_remove:
-                    del self.metadata['id_mapping'][key]
+                if 'chunk_range' in doc_info:
+                    self.chunk_store.delete_range(doc_info['chunk_range'])
+                else:
+                    self.chunk_store.delete_chunks(chunk_ids)
+                # Segments are immutable, the merger drops tombstoned chunks when rewriting them
+                self.metadata['tombstones'].update(chunk_ids)
+                index.set_tombstones(self.metadata['tombstones'])
+                self.index = index
                 
                 del self.metadata['documents'][document_id]
-                
-                logger.warning(f"Document {document_id} removed from metadata. FAISS index rebuild recommended for optimal performance.")
-                
-                self._save_storage()
-                return True
-            return False
+                self._commit()
+            
+            logger.info(f"Document {document_id} removed with {len(chunk_ids)} vectors")
+            self._schedule_maintenance()
+            return True
         except Exception as e:
             logger.error(f"Error deleting document: {str(e)}")
             return False
 
-    def rebuild_index(self):
-        """Rebuild FAISS index from current chunks (optional maintenance operation)"""
+    def _release_shared_chunks(self, document_id: str, doc_info: Dict) -> bool:
+        """
+        Drop one reference to chunks shared by identical documents; True if other documents
+        still use them, so they must not be deleted. Caller holds the write lock.
+        """
+        owner = doc_info.get('chunks_of', document_id)
+        sharers = [other for other, info in self.metadata['documents'].items()
+                   if other != document_id and info.get('chunks_of', other) == owner]
+        if not sharers:
+            return False
+        
+        if owner == document_id:
+            # The chunk records carry this document's id, hand them to a remaining sharer
+            heir = sharers[0]
+            self.chunk_store.reassign_document(document_id, heir, self.metadata['documents'][heir]['filename'])
+            for other in sharers:
+                if other == heir:
+                    self.metadata['documents'][other].pop('chunks_of', None)
+                else:
+                    self.metadata['documents'][other]['chunks_of'] = heir
+        logger.info(f"Chunks of document {document_id} are still used by {len(sharers)} identical documents")
+        return True
+
+    def rebuild_index(self, reembed: bool = False):
+        """
+        Rebuild the FAISS index (optional maintenance operation).
+        Rebuilds from the stored segment vectors; reembed re-runs the embedding model
+        over every chunk, only needed after changing EMBEDDINGS_MODEL.
+        """
+        if not reembed:
+            self.compact_index()
+            return
+        
+        # Keeps compaction and segment merges from rewriting the segments being replaced
+        lock = self.segment_store.compaction_lock()
         try:
-            logger.info("Rebuilding unified FAISS index")
+            lock.acquire(timeout=0)
+        except Timeout:
+            raise RuntimeError("Another compaction is already running")
+        try:
+            self._reembed()
+        except Exception as e:
+            logger.error(f"Error rebuilding index: {str(e)}")
+            raise
+        finally:
+            lock.release()
+
+    def _reembed(self):
+        logger.info("Rebuilding unified FAISS index")
+        with self._lock:
+            # Chunks indexed from here on keep their segments, only the ones below are re-embedded
+            snapshot = {segment['name'] for segment in self.metadata['segments']}
+            until = self.metadata['next_chunk_id']
+        
+        total = self.chunk_store.count()
+        chunk_ids = np.empty(total, dtype=np.int64)
+        embeddings = np.empty((total, self.metadata['dimension']), dtype=np.float32)
+        filled = 0
+        for batch in self.chunk_store.iter_chunks():
+            batch = [chunk for chunk in batch if chunk['chunk_id'] < until][:total - filled]
+            if not batch:
+                break
+            chunk_ids[filled:filled + len(batch)] = [chunk['chunk_id'] for chunk in batch]
+            embeddings[filled:filled + len(batch)] = self.embed_texts([chunk['text'] for chunk in batch], background=True)
+            filled += len(batch)
+        
+        if not filled:
+            logger.info("No chunks to rebuild index from")
+            return
+        
+        chunk_ids, embeddings = chunk_ids[:filled], embeddings[:filled]
+        segment = self.segment_store.write_segment(chunk_ids, embeddings)
+        
+        with self._writing():
+            # The re-embedded vectors replace the snapshot's segments; segments added since stay
+            previous_segments = [entry['name'] for entry in self.metadata['segments'] if entry['name'] in snapshot]
+            kept = [entry for entry in self.metadata['segments'] if entry['name'] not in snapshot]
+            previous_checkpoint = self.metadata.get('checkpoint')
+            # Deletions are still pending for chunks stored in the new segment or in the kept ones
+            tombstones = np.fromiter(self.metadata['tombstones'], dtype=np.int64, count=len(self.metadata['tombstones']))
+            pending = tombstones[np.isin(tombstones, chunk_ids) | (tombstones >= until)]
+            self.metadata['segments'] = [segment] + kept
+            self.metadata['tombstones'] = set(pending.tolist())
+            self.metadata['checkpoint'] = None
+            live_count = sum(entry['count'] for entry in self.metadata['segments']) - len(pending)
+            self.metadata['index_type'] = index_factory.resolve_index_type(live_count)
+            self._commit()
+            self._load_segments()
+        
+        for name in previous_segments:
+            self.segment_store.delete_segment(name)
+        self.segment_store.delete_checkpoint(previous_checkpoint)
+        
+        if self._checkpoint_due():
+            self._write_checkpoint()
+        logger.info("FAISS index rebuilt successfully")
+
+    def start_compaction(self, index_type: Optional[str] = None) -> Dict:
+        """Run compact_index in the background unless a compaction is already running in this process"""
+        if index_type is not None and index_type not in index_factory.INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        with self._lock:
+            if self._compaction_thread is None or not self._compaction_thread.is_alive():
+                self._compaction_thread = threading.Thread(
+                    target=self._run_compaction,
+                    args=(index_type,),
+                    name="IndexCompactor",
+                    daemon=True
+                )
+                self._compaction_thread.start()
+        return self.get_compaction_status()
+
+    def _run_compaction(self, index_type: Optional[str]):
+        try:
+            self.compact_index(index_type)
+        except Exception as e:
+            logger.error(f"Error compacting index: {str(e)}")
+
+    def get_compaction_status(self) -> Dict:
+        """Progress of the latest compaction run by any process"""
+        return self.segment_store.read_status("compaction") or {'state': 'idle'}
+
+    def compact_index(self, index_type: Optional[str] = None, cpu_budget: float = 1.0):
+        """
+        Drop deleted vectors, merge segments up to COMPACTION_SEGMENT_CHUNKS and rebuild
+        the index, optionally as another index type, from the stored segment vectors
+        without re-embedding anything. Searches keep using the current index until the
+        rebuilt one is committed. A cpu_budget below 1 paces the rewrite and caps the
+        FAISS threads used for training.
+        """
+        lock = self.segment_store.compaction_lock()
+        try:
+            lock.acquire(timeout=0)
+        except Timeout:
+            raise RuntimeError("Another compaction is already running")
+        try:
+            self._compact(index_type, cpu_budget)
+        finally:
+            lock.release()
+
+    def _compact(self, index_type: Optional[str], cpu_budget: float):
+        started = time.perf_counter()
+        with self._lock:
+            segments = sorted(self.metadata['segments'], key=lambda segment: segment['min_id'])
+            tombstones = set(self.metadata['tombstones'])
+            live_count = sum(segment['count'] for segment in segments) - len(tombstones)
+            bytes_before = self.segment_store.storage_bytes(self.metadata)
+        target_type = index_type or index_factory.resolve_index_type(live_count)
+        
+        status = {
+            'state': 'running',
+            'phase': 'segments',
+            'index_type': target_type,
+            'segments_done': 0,
+            'segments_total': len(segments),
+            'vectors_done': 0,
+            'vectors_total': sum(segment['count'] for segment in segments),
+            'dropped': 0,
+            'bytes_before': bytes_before,
+            'bytes_after': None,
+            'reclaimed_bytes': None,
+            'started_at': datetime.utcnow().isoformat(),
+            'finished_at': None,
+            'duration_seconds': None,
+            'error': None
+        }
+        self.segment_store.write_status("compaction", status)
+        logger.info(f"Compacting unified knowledge base into a {target_type} index")
+        
+        try:
+            excluded = np.fromiter(tombstones, dtype=np.int64, count=len(tombstones))
+            for group in _compaction_groups(segments, settings.COMPACTION_SEGMENT_CHUNKS):
+                step_started = time.perf_counter()
+                dirty = len(group) > 1
+                if not dirty:
+                    segment = group[0]
+                    in_range = excluded[(excluded >= segment['min_id']) & (excluded <= segment['max_id'])]
+                    dirty = bool(len(in_range)) and bool(self.segment_store.stored_ids([segment['name']], in_range.tolist()))
+                if dirty:
+                    status['dropped'] += self._merge_segments([segment['name'] for segment in group])
+                    _pace(time.perf_counter() - step_started, cpu_budget)
+                status['segments_done'] += len(group)
+                status['vectors_done'] += sum(segment['count'] for segment in group)
+                self.segment_store.write_status("compaction", status)
             
-            if not self.metadata['chunks']:
-                logger.info("No chunks to rebuild index from")
-                return
+            status['phase'] = 'index'
+            self.segment_store.write_status("compaction", status)
+            if index_factory.uses_checkpoint(target_type):
+                threads = faiss.omp_get_max_threads()
+                if cpu_budget < 1:
+                    faiss.omp_set_num_threads(max(1, int(threads * cpu_budget)))
+                try:
+                    committed = self._write_checkpoint(index_type=target_type, rebuild=True)
+                finally:
+                    faiss.omp_set_num_threads(threads)
+                if not committed:
+                    raise RuntimeError("Index changed while compacting, run the compaction again")
+            else:
+                self._drop_checkpoint(target_type)
             
-            chunk_texts = [chunk['text'] for chunk in self.metadata['chunks']]
-            embeddings = self.embeddings.embed_documents(chunk_texts)
+            with self._lock:
+                bytes_after = self.segment_store.storage_bytes(self.metadata)
+            status.update(
+                state='completed',
+                phase='done',
+                bytes_after=bytes_after,
+                reclaimed_bytes=bytes_before - bytes_after,
+                finished_at=datetime.utcnow().isoformat(),
+                duration_seconds=round(time.perf_counter() - started, 2)
+            )
+            self.segment_store.write_status("compaction", status)
+            logger.info(f"Compaction finished, dropped {status['dropped']} deleted vectors "
+                        f"and reclaimed {status['reclaimed_bytes'] / (1024**2):.1f} MB")
+        except Exception as e:
+            status.update(
+                state='failed',
+                error=str(e),
+                finished_at=datetime.utcnow().isoformat(),
+                duration_seconds=round(time.perf_counter() - started, 2)
+            )
+            self.segment_store.write_status("compaction", status)
+            raise
+
+    def get_storage_stats(self) -> Dict:
+        """Live and deleted-but-still-stored vectors, the inputs for scheduling compaction"""
+        with self._lock:
+            segments = sorted(self.metadata['segments'], key=lambda segment: segment['min_id'])
+            stored = sum(segment['count'] for segment in segments)
+            dead = len(self.metadata['tombstones'])
+            groups = _compaction_groups(segments, settings.COMPACTION_SEGMENT_CHUNKS)
+            return {
+                'stored_vectors': stored,
+                'dead_vectors': dead,
+                'live_vectors': max(stored - dead, 0),
+                'dead_ratio': round(dead / stored, 4) if stored else 0.0,
+                'segments': len(segments),
+                # Segments a compaction would remove by merging neighbours
+                'mergeable_segments': len(segments) - len(groups),
+                'storage_bytes': self.segment_store.storage_bytes(self.metadata)
+            }
+
+    def _drop_checkpoint(self, index_type: str):
+        """Switch to an index type served straight from the segments and forget the checkpoint"""
+        with self._writing():
+            previous = self.metadata.get('checkpoint')
+            names = [segment['name'] for segment in self.metadata['segments']]
+            tombstones = self.metadata['tombstones']
+            # Without a checkpoint, tombstones only matter while a segment still stores the chunk
+            self.metadata['tombstones'] = self.segment_store.stored_ids(names, tombstones)
+            self.metadata['checkpoint'] = None
+            self.metadata['index_type'] = index_type
+            self._commit()
+            self._load_segments()
+        self.segment_store.delete_checkpoint(previous)
+
+    def _schedule_maintenance(self):
+        """Start the background segment merger if there is merge or checkpoint work to do"""
+        if self._maintenance_thread is not None and self._maintenance_thread.is_alive():
+            return
+        if not (self._merge_candidates() or self._checkpoint_due()):
+            return
+        
+        self._maintenance_thread = threading.Thread(
+            target=self._run_maintenance,
+            name="SegmentMerger",
+            daemon=True
+        )
+        self._maintenance_thread.start()
+
+    def _run_maintenance(self):
+        # A running compaction or re-embed rewrites the segments itself
+        lock = self.segment_store.compaction_lock()
+        try:
+            lock.acquire(timeout=0)
+        except Timeout:
+            return
+        try:
+            candidates = self._merge_candidates()
+            if candidates:
+                self._merge_segments(candidates)
+            if self._checkpoint_due():
+                self._write_checkpoint()
+        except Exception as e:
+            logger.error(f"Error in segment maintenance: {str(e)}")
+        finally:
+            lock.release()
+
+    def _merge_candidates(self) -> List[str]:
+        small = [segment['name'] for segment in self.metadata['segments']
+                 if segment['count'] < settings.SEGMENT_MERGE_MAX_CHUNKS]
+        return small if len(small) >= settings.SEGMENT_MERGE_MIN_COUNT else []
+
+    def _checkpoint_due(self) -> bool:
+        if not index_factory.uses_checkpoint(self.metadata['index_type']):
+            return False
+        checkpoint = _usable_checkpoint(self.metadata)
+        if checkpoint is None:
+            return bool(self.metadata['segments'])
+        uncovered = sum(segment['count'] for segment in self.metadata['segments']
+                        if segment['max_id'] >= checkpoint['covered_until'])
+        return uncovered >= settings.CHECKPOINT_MIN_CHUNKS
+
+    def _tombstone_horizon(self) -> int:
+        """Tombstones below this id may still be stored in a checkpointed index and must be kept"""
+        checkpoint = _usable_checkpoint(self.metadata)
+        horizon = checkpoint['covered_until'] if checkpoint else 0
+        if self.index.base is not None and not self.index.segment_backed:
+            horizon = max(horizon, self.index.covered_until)
+        return horizon
+
+    def _merge_segments(self, names: List[str]) -> int:
+        """Combine segments into one, dropping tombstoned chunks; returns the number dropped"""
+        logger.info(f"Merging {len(names)} small segments")
+        with self._lock:
+            tombstones = set(self.metadata['tombstones'])
+        
+        # Segments are immutable, so the expensive rewrite happens outside the lock
+        merged, dropped = self.segment_store.merge_segments(names, tombstones)
+        
+        with self._writing():
+            live_names = {segment['name'] for segment in self.metadata['segments']}
+            if not set(names) <= live_names:
+                logger.warning("Segments changed during merge, discarding merged segment")
+                if merged:
+                    self.segment_store.delete_segment(merged['name'])
+                return 0
             
-            embedding_dim = len(embeddings[0])
-            self.index = faiss.IndexFlatL2(embedding_dim)
-            self.index.add(np.array(embeddings))
+            segments = [segment for segment in self.metadata['segments'] if segment['name'] not in names]
+            if merged:
+                segments.append(merged)
+            self.metadata['segments'] = sorted(segments, key=lambda segment: segment['min_id'])
+            horizon = self._tombstone_horizon()
+            self.metadata['tombstones'] -= {chunk_id for chunk_id in dropped if chunk_id >= horizon}
+            self._commit()
+            self._load_segments()
+        
+        for name in names:
+            self.segment_store.delete_segment(name)
+        logger.info(f"Merged segments, dropped {len(dropped)} deleted chunks")
+        return len(dropped)
+
+    def _write_checkpoint(self, index_type: Optional[str] = None, rebuild: bool = False) -> bool:
+        """
+        Build the index off the request path and swap it in as the shared base tier.
+        index_type migrates to another type; rebuild trains from scratch instead of
+        extending the current checkpoint. Returns whether the checkpoint was committed.
+        """
+        with self._lock:
+            current_type = self.metadata['index_type']
+            index_type = index_type or current_type
+            if not index_factory.uses_checkpoint(index_type):
+                return False
+            storage = index_factory.vector_storage()
+            covered_until = self.metadata['next_chunk_id']
+            started_from = self.metadata.get('checkpoint')
+            checkpoint = None if rebuild or index_type != current_type else _usable_checkpoint(self.metadata)
+            applied = set(self.metadata['tombstones'])
+            snapshot = {
+                'dimension': self.metadata['dimension'],
+                'segments': list(self.metadata['segments']),
+                'tombstones': applied
+            }
+            segment_names = [segment['name'] for segment in snapshot['segments']]
+        
+        if checkpoint:
+            # Extend the previous checkpoint instead of retraining from scratch
+            index = self.segment_store.read_checkpoint(checkpoint)
+            if applied and index_type not in index_factory.TOMBSTONE_INDEX_TYPES:
+                index.remove_ids(np.fromiter(applied, dtype=np.int64, count=len(applied)))
+            ids, vectors = self._read_live_vectors(snapshot, min_id=checkpoint['covered_until'],
+                                                   max_id=covered_until)
+            tombstones_applied = index_type not in index_factory.TOMBSTONE_INDEX_TYPES
+        else:
+            ids, vectors = self._read_live_vectors(snapshot, max_id=covered_until)
+            index = index_factory.build_index(snapshot['dimension'], index_type,
+                                              training_vectors=vectors, storage=storage)
+            tombstones_applied = True
+        if len(ids):
+            index.add_with_ids(vectors, ids)
+        
+        file_name = self.segment_store.write_checkpoint(faiss.serialize_index(index))
+        del index
+        still_stored = self.segment_store.stored_ids(segment_names, applied)
+        
+        with self._writing():
+            if self.metadata['index_type'] != current_type or self.metadata.get('checkpoint') != started_from:
+                logger.warning("Index changed while checkpointing, discarding checkpoint")
+                self.segment_store.delete_checkpoint({'file': file_name})
+                return False
+            if tombstones_applied:
+                # Removed from the checkpointed index and from every segment, safe to forget
+                self.metadata['tombstones'] -= applied - still_stored
+            previous = self.metadata.get('checkpoint')
+            self.metadata['index_type'] = index_type
+            self.metadata['checkpoint'] = {
+                'file': file_name,
+                'covered_until': covered_until,
+                'index_type': index_type,
+                'storage': storage
+            }
+            self._commit()
+            self._load_segments()
+        
+        self.segment_store.delete_checkpoint(previous)
+        logger.info(f"Wrote index checkpoint covering chunk ids below {covered_until}")
+        return True
+
+def _usable_checkpoint(manifest: Dict) -> Optional[Dict]:
+    """The manifest checkpoint if it matches the configured index type and vector storage"""
+    checkpoint = manifest.get('checkpoint')
+    index_type = manifest['index_type']
+    if not checkpoint or not index_factory.uses_checkpoint(index_type):
+        return None
+    if checkpoint['index_type'] != index_type:
+        return None
+    if checkpoint.get('storage', index_factory.FLOAT32) != index_factory.vector_storage():
+        return None
+    return checkpoint
+
+def load_document_file(file_path: str, file_type: str):
+    """Load document based on file type"""
+    try:
+        if file_type.lower() == 'pdf':
+            loader = PyPDFLoader(file_path)
+            return loader.load()
+        
+        elif file_type.lower() == 'docx':
+            doc = docx.Document(file_path)
+            content = []
+            for paragraph in doc.paragraphs:
+                if paragraph.text.strip():
+                    content.append(paragraph.text)
             
-            self.metadata['id_mapping'] = {i: i for i in range(len(self.metadata['chunks']))}
+            from langchain_core.documents import Document as LangChainDoc
+            return [LangChainDoc(page_content='\n'.join(content), metadata={'source': file_path})]
+        
+        elif file_type.lower() == 'txt':
+            loader = TextLoader(file_path, encoding='utf-8')
+            return loader.load()
+        
+        elif file_type.lower() in ['xlsx', 'xls']:
+            df = pd.read_excel(file_path)
+            content = df.to_string(index=False)
             
-            self._save_storage()
-            logger.info("FAISS index rebuilt successfully")
+            from langchain_core.documents import Document as LangChainDoc
+            return [LangChainDoc(page_content=content, metadata={'source': file_path})]
+        
+        else:
+            raise ValueError(f"Unsupported file type: {file_type}")
             
-        except Exception as e:
-            logger.error(f"Error rebuilding index: {str(e)}")
-            raise
\ No newline at end of file
+    except Exception as e:
+        logger.error(f"Error loading {file_type} file: {str(e)}")
+        raise
+
+def parse_document_file(file_path: str, file_type: str) -> List[Dict]:
+    """
+    Load a document as pages of text and page number. A plain function with picklable
+    results, so ingestion can run it in worker processes.
+    """
+    pages = load_document_file(file_path, file_type)
+    return [{'text': page.page_content, 'page': page.metadata.get('page', 0)} for page in pages]
+
+def split_pages(pages: List[Dict]) -> List[Dict]:
+    """Split parsed pages into chunks of text and page number"""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.SPLIT_CHUNK_SIZE,
+        chunk_overlap=settings.SPLIT_OVERLAP
+    )
+    return [{'text': text, 'page': page['page']} for page in pages for text in text_splitter.split_text(page['text'])]
+
+def split_document_file(file_path: str, file_type: str) -> List[Dict]:
+    """Load and split a document into chunks of text and page number"""
+    return split_pages(parse_document_file(file_path, file_type))
+
+def _set_document_chunks(doc_info: Dict, chunk_ids: List[int]):
+    """Record a document's chunks as an id range, or an explicit list if they are not contiguous"""
+    chunk_ids = sorted(chunk_ids)
+    doc_info['chunk_count'] = len(chunk_ids)
+    if not chunk_ids:
+        doc_info['chunk_range'] = [0, 0]
+    elif chunk_ids[-1] - chunk_ids[0] + 1 == len(chunk_ids):
+        doc_info['chunk_range'] = [chunk_ids[0], chunk_ids[-1] + 1]
+    else:
+        doc_info['chunk_ids'] = chunk_ids
+
+def _document_chunk_ids(doc_info: Dict) -> List[int]:
+    if 'chunk_range' in doc_info:
+        return list(range(*doc_info['chunk_range']))
+    return doc_info.get('chunk_ids', [])
+
+def _compaction_groups(segments: List[Dict], max_chunks: int) -> List[List[Dict]]:
+    """Consecutive segments batched into groups of at most max_chunks, oversized segments alone"""
+    groups, current, current_count = [], [], 0
+    for segment in segments:
+        if current and current_count + segment['count'] > max_chunks:
+            groups.append(current)
+            current, current_count = [], 0
+        current.append(segment)
+        current_count += segment['count']
+    if current:
+        groups.append(current)
+    return groups
+
+def _pace(elapsed: float, cpu_budget: float):
+    """Sleep so that work of this duration uses about cpu_budget of the time"""
+    if 0 < cpu_budget < 1:
+        time.sleep(elapsed * (1 - cpu_budget) / cpu_budget)
+
+async def _cancel_task(task: asyncio.Task):
+    """Cancel a task whose result is no longer needed and collect its outcome, so asyncio never logs it as unretrieved"""
+    task.cancel()
+    with suppress(asyncio.CancelledError, Exception):
+        await task
+
+def _file_type(filename: str) -> str:
+    return Path(filename or '').suffix.lstrip('.').lower()
+
+def _utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Compare filter dates like the naive UTC created_at timestamps in the manifest"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _filter_documents(documents: Dict, filters: Dict) -> List[str]:
+    """Ids of completed documents matching every given filter"""
+    document_ids = set(filters.get('document_ids') or [])
+    file_types = {file_type.lower().lstrip('.') for file_type in filters.get('file_types') or []}
+    filename = (filters.get('filename') or '').lower()
+    uploaded_after = _utc_naive(filters.get('uploaded_after'))
+    uploaded_before = _utc_naive(filters.get('uploaded_before'))
+    
+    matches = []
+    for document_id, doc_info in documents.items():
+        if doc_info['status'] != DocumentStatus.COMPLETED:
+            continue
+        if document_ids and document_id not in document_ids:
+            continue
+        if file_types and doc_info.get('file_type', _file_type(doc_info.get('filename'))) not in file_types:
+            continue
+        if filename and filename not in (doc_info.get('filename') or '').lower():
+            continue
+        if uploaded_after or uploaded_before:
+            created_at = datetime.fromisoformat(doc_info['created_at'])
+            if (uploaded_after and created_at < uploaded_after) or (uploaded_before and created_at > uploaded_before):
+                continue
+        matches.append(document_id)
+    return matches
+
+def _chunk_id_array(documents: Dict, document_ids: List[str]) -> np.ndarray:
+    """Sorted chunk ids of the given documents"""
+    parts = []
+    for document_id in document_ids:
+        doc_info = documents[document_id]
+        if 'chunk_range' in doc_info:
+            parts.append(np.arange(*doc_info['chunk_range'], dtype=np.int64))
+        else:
+            parts.append(np.asarray(doc_info.get('chunk_ids', []), dtype=np.int64))
+    if not parts:
+        return np.empty(0, dtype=np.int64)
+    # Identical documents share chunk ids
+    return np.unique(np.concatenate(parts))
@@ -0,0 +1,185 @@
+import json
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable, List
+import numpy as np
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TORCH = "torch"
+ONNX = "onnx"
+EMBEDDING_BACKENDS = (TORCH, ONNX)
+
+# Written next to the exported model by scripts/export_onnx_embeddings.py
+ONNX_CONFIG_FILE = "embedding_config.json"
+
+class OnnxEmbeddings:
+    """
+    Sentence embeddings from an exported ONNX model on ONNX Runtime.
+    Drop-in replacement for HuggingFaceEmbeddings (embed_documents / embed_query).
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = True, batch_size: int = 32, num_threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_dir = Path(model_dir)
+        with open(self.model_dir / ONNX_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+
+        model_file = self.config['model_file']
+        if quantized and self.config.get('quantized_file'):
+            model_file = self.config['quantized_file']
+        self.quantized = model_file == self.config.get('quantized_file')
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            str(self.model_dir / model_file),
+            options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+        self.batch_size = batch_size
+        logger.info(f"Loaded ONNX embedding model {self.config['model_name']} from {model_file}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into a float32 array"""
+        vectors = np.empty((len(texts), self.config['dimension']), dtype=np.float32)
+        # Length-sorted batches keep padding, and so wasted compute, to a minimum
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vectors[batch] = self._embed_batch([texts[i] for i in batch])
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.config['max_length'],
+            return_tensors="np"
+        )
+        feed = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+
+        if self.config['pooling'] == "mean":
+            mask = encoded['attention_mask'][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        else:
+            pooled = hidden[:, 0]
+
+        if self.config['normalize']:
+            pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.astype(np.float32)
+
+def _encode_batch(embeddings, texts: List[str]) -> np.ndarray:
+    if isinstance(embeddings, OnnxEmbeddings):
+        return embeddings.encode(texts)
+    client = getattr(embeddings, '_client', None)
+    if client is not None and hasattr(client, 'encode'):
+        # Same call HuggingFaceEmbeddings.embed_documents makes, minus the conversion to lists
+        return client.encode(
+            [text.replace("\n", " ") for text in texts],
+            show_progress_bar=False,
+            **dict(getattr(embeddings, 'encode_kwargs', {}) or {}, convert_to_numpy=True)
+        )
+    return np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+def embed_to_array(embeddings, texts: List[str], batch_size: int = 256,
+                   guard: Callable = nullcontext) -> np.ndarray:
+    """
+    Embed texts batch by batch into one preallocated float32 buffer, never building Python
+    lists of floats. guard() is entered around each batch's call into the model.
+    """
+    vectors = None
+    for start in range(0, len(texts), batch_size):
+        with guard():
+            batch = _encode_batch(embeddings, texts[start:start + batch_size])
+        if vectors is None:
+            vectors = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+        vectors[start:start + len(batch)] = batch
+    if vectors is None:
+        return np.empty((0, 0), dtype=np.float32)
+    return vectors
+
+class ModelLock:
+    """
+    Serializes calls into an embedding model shared by several threads; the tokenizers are
+    not thread-safe. Queries get the model before any waiting background work, so ingestion
+    and re-embedding only delay a query by the model call already running.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._busy = False
+        self._waiting_queries = 0
+
+    @contextmanager
+    def query(self):
+        with self._condition:
+            self._waiting_queries += 1
+            try:
+                self._condition.wait_for(lambda: not self._busy)
+            finally:
+                self._waiting_queries -= 1
+            self._busy = True
+        try:
+            yield
+        finally:
+            self._release()
+
+    @contextmanager
+    def background(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._busy and not self._waiting_queries)
+            self._busy = True
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._condition:
+            self._busy = False
+            self._condition.notify_all()
+
+def embedding_model_id() -> str:
+    """Identifies the model and runtime producing query vectors, for cache keys"""
+    backend = settings.EMBEDDING_BACKEND.lower()
+    if backend == ONNX:
+        return f"{settings.EMBEDDINGS_MODEL}:onnx{'-int8' if settings.ONNX_QUANTIZED else ''}"
+    return settings.EMBEDDINGS_MODEL
+
+def create_embeddings():
+    """Load the embedding model for the configured backend"""
+    backend = settings.EMBEDDING_BACKEND.lower()
+    if backend == ONNX:
+        return OnnxEmbeddings(
+            settings.ONNX_MODEL_DIR,
+            quantized=settings.ONNX_QUANTIZED,
+            num_threads=settings.ONNX_NUM_THREADS
+        )
+    if backend != TORCH:
+        raise ValueError(f"Unsupported embedding backend: {settings.EMBEDDING_BACKEND}")
+
+    # Imported lazily so the ONNX backend never pays the torch import
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=settings.EMBEDDINGS_MODEL,
+        model_kwargs={'device': "cuda" if torch.cuda.is_available() else "cpu"}
+    )
@@ -0,0 +1,91 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+import numpy as np
+from app.services.latency import LATENCY_WINDOW, LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBatcher:
+    """
+    Collects query embedding requests arriving within a short window and runs
+    them as one batched forward pass off the event loop.
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], List[List[float]]],
+                 max_batch_size: int, max_wait_ms: float,
+                 run_blocking: Optional[Callable[..., Awaitable]] = None):
+        self.embed_batch = embed_batch
+        # Coroutine function running a blocking call off the loop, asyncio.to_thread unless given
+        self.run_blocking = run_blocking or asyncio.to_thread
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._loop = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker = None
+        self._latencies = LatencyWindow()
+        self._batch_sizes = deque(maxlen=LATENCY_WINDOW)
+        self.batches = 0
+        self.requests = 0
+
+    def _ensure_worker(self):
+        # The queue and worker task belong to the loop that first used the batcher
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def embed(self, text: str) -> np.ndarray:
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._embed(batch)
+
+    async def _embed(self, batch):
+        # Identical questions in the same window share one row of the forward pass
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            vectors = await self.run_blocking(self.embed_batch, texts)
+        except Exception as e:
+            logger.error(f"Error embedding query batch of {len(texts)}: {str(e)}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, np.asarray(vectors, dtype=np.float32)))
+        finished = time.perf_counter()
+        for text, future, started in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+            self._latencies.record(finished - started)
+        self._batch_sizes.append(len(texts))
+        self.batches += 1
+        self.requests += len(batch)
+
+    def stats(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'avg_batch_size': round(float(np.mean(self._batch_sizes)), 2) if self._batch_sizes else 0.0,
+            **self._latencies.percentiles(),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000
+        }
@@ -0,0 +1,69 @@
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace and unicode variants so trivially different spellings share an entry"""
+    return " ".join(unicodedata.normalize("NFC", query).split())
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings keyed by embedding model and normalized query text.
+    Cached vectors are read-only so callers cannot corrupt shared entries.
+    """
+
+    def __init__(self, max_size: int, model_id: str):
+        self.max_size = max_size
+        self.model_id = model_id
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, query: str) -> Tuple[str, str]:
+        return (self.model_id, normalize_query(query))
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        key = self._key(query)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, query: str, vector: np.ndarray) -> np.ndarray:
+        if self.max_size <= 0:
+            return vector
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        key = self._key(query)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'model': self.model_id,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,60 @@
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+from app.services.latency import LATENCY_WINDOW, LatencyWindow
+
+# Longest keyword query sent to the index; each term is one posting list to merge
+MAX_KEYWORD_TERMS = 16
+
+# Words too common to help ranking, they only add large posting lists to the query
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i if in into is it its me my "
+    "not of on or our so that the their them there these they this to was we were what "
+    "when where which who why will with you your".split()
+)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def keyword_query(text: str) -> str:
+    """FTS5 match expression ORing the distinctive terms of a free-text question"""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token not in STOPWORDS and token not in terms:
+            terms.append(token)
+    # Quoted terms cannot be read as FTS5 operators or column filters
+    return " OR ".join(f'"{term}"' for term in terms[:MAX_KEYWORD_TERMS])
+
+def reciprocal_rank_scores(rankings: Iterable[List[int]], k: int) -> List[Tuple[int, float]]:
+    """Merge ranked id lists by summing 1 / (k + rank), ids in several lists rise to the top"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], k: int) -> List[int]:
+    return [chunk_id for chunk_id, _ in reciprocal_rank_scores(rankings, k)]
+
+class StageLatency:
+    """Recent per-stage search timings, reported as percentiles"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self._stages: Dict[str, LatencyWindow] = {}
+        self.searches = 0
+
+    def record(self, timings: Dict[str, float]):
+        """Add one search's stage durations in seconds"""
+        with self._lock:
+            for stage, seconds in timings.items():
+                self._stages.setdefault(stage, LatencyWindow(self._window)).record(seconds)
+            self.searches += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'searches': self.searches,
+                'stages': {stage: window.percentiles() for stage, window in self._stages.items() if len(window)}
+            }
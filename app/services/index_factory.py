@@ -0,0 +1,169 @@
+import logging
+from typing import Optional, Tuple
+import numpy as np
+import faiss
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+FLAT = "flat"
+HNSW = "hnsw"
+IVF_FLAT = "ivf_flat"
+IVF_PQ = "ivf_pq"
+AUTO = "auto"
+
+INDEX_TYPES = (FLAT, HNSW, IVF_FLAT, IVF_PQ)
+TRAINED_INDEX_TYPES = (IVF_FLAT, IVF_PQ)
+# HNSW graphs cannot drop vectors, deleted ids are masked at search time instead
+TOMBSTONE_INDEX_TYPES = (HNSW,)
+
+# Per-dimension vector encodings: 4, 2 and 1 bytes (IVF-PQ always uses its own codes)
+FLOAT32 = "float32"
+FP16 = "fp16"
+SQ8 = "sq8"
+VECTOR_STORAGES = (FLOAT32, FP16, SQ8)
+STORAGE_CODECS = {FLOAT32: "Flat", FP16: "SQfp16", SQ8: "SQ8"}
+
+# FAISS warns below ~39 training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+MAX_POINTS_PER_CENTROID = 256
+# SQ8 only learns per-dimension ranges, a modest sample is plenty
+SQ_TRAINING_POINTS = 65536
+
+def resolve_index_type(n_vectors: int) -> str:
+    """Pick the index type for a corpus of the given size based on settings"""
+    index_type = settings.INDEX_TYPE.lower()
+    if index_type == AUTO:
+        if n_vectors >= settings.INDEX_AUTO_THRESHOLD:
+            return settings.INDEX_AUTO_TYPE.lower()
+        return FLAT
+
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type: {settings.INDEX_TYPE}")
+    return index_type
+
+def vector_storage() -> str:
+    storage = settings.VECTOR_STORAGE.lower()
+    if storage not in VECTOR_STORAGES:
+        raise ValueError(f"Unsupported vector storage: {settings.VECTOR_STORAGE}")
+    return storage
+
+def uses_checkpoint(index_type: str) -> bool:
+    """Float32 flat indexes are served straight from the segment files, everything else from a checkpoint"""
+    return index_type != FLAT or vector_storage() != FLOAT32
+
+def _ivf_nlist(n_vectors: int) -> int:
+    return max(1, min(settings.IVF_NLIST, n_vectors // MIN_POINTS_PER_CENTROID))
+
+def _pq_m(dim: int) -> int:
+    """Largest sub-quantizer count <= PQ_M that divides the dimension"""
+    m = min(settings.PQ_M, dim)
+    while dim % m != 0:
+        m -= 1
+    return m
+
+def _factory_string(index_type: str, dim: int, n_vectors: int, storage: str = FLOAT32) -> str:
+    # IVF indexes store ids natively, flat and HNSW storage needs an id map
+    codec = STORAGE_CODECS[storage]
+    if index_type == FLAT:
+        return f"IDMap2,{codec}"
+    if index_type == HNSW:
+        if storage == FLOAT32:
+            return f"IDMap2,HNSW{settings.HNSW_M}"
+        return f"IDMap2,HNSW{settings.HNSW_M}_{codec}"
+    if index_type == IVF_FLAT:
+        return f"IVF{_ivf_nlist(n_vectors)},{codec}"
+    if index_type == IVF_PQ:
+        return f"IVF{_ivf_nlist(n_vectors)},PQ{_pq_m(dim)}x{settings.PQ_NBITS}"
+    raise ValueError(f"Unsupported index type: {index_type}")
+
+def build_index(dim: int, index_type: str, training_vectors: Optional[np.ndarray] = None,
+                storage: Optional[str] = None) -> faiss.Index:
+    """
+    Create an empty index of the requested type and vector storage that accepts add_with_ids.
+    IVF and SQ8 indexes are trained on (a sample of) training_vectors before being returned.
+    """
+    storage = storage or vector_storage()
+    n_vectors = len(training_vectors) if training_vectors is not None else 0
+
+    factory_string = _factory_string(index_type, dim, n_vectors, storage)
+    index = faiss.index_factory(dim, factory_string, faiss.METRIC_L2)
+
+    if not index.is_trained and n_vectors == 0:
+        logger.warning(f"No training vectors available for {index_type} index with {storage} storage, falling back to flat")
+        index_type, storage = FLAT, FLOAT32
+        factory_string = _factory_string(index_type, dim, n_vectors, storage)
+        index = faiss.index_factory(dim, factory_string, faiss.METRIC_L2)
+    logger.info(f"Building {index_type} index ({factory_string}) with dimension {dim}")
+
+    if index_type == HNSW:
+        hnsw_index = faiss.downcast_index(index.index)
+        hnsw_index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+        hnsw_index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+
+    if not index.is_trained:
+        if index_type in TRAINED_INDEX_TYPES:
+            max_points = _ivf_nlist(n_vectors) * MAX_POINTS_PER_CENTROID
+        else:
+            max_points = SQ_TRAINING_POINTS
+        sample = _training_sample(training_vectors, max_points)
+        logger.info(f"Training {index_type} index on {len(sample)} vectors")
+        index.train(sample)
+
+    if index_type in TRAINED_INDEX_TYPES:
+        ivf_index = faiss.extract_index_ivf(index)
+        ivf_index.nprobe = settings.IVF_NPROBE
+        # Hashtable direct map keeps remove_ids proportional to the number of removed ids
+        ivf_index.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+    return index
+
+def extract_vectors(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (ids, vectors) stored in an id-mapped flat or HNSW index"""
+    if not isinstance(index, faiss.IndexIDMap2):
+        raise ValueError("Vectors can only be extracted from id-mapped flat or HNSW indexes")
+    ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+    vectors = index.index.reconstruct_n(0, index.ntotal)
+    return ids, vectors
+
+def _training_sample(vectors: np.ndarray, max_points: int) -> np.ndarray:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if len(vectors) <= max_points:
+        return vectors
+    rng = np.random.default_rng(1234)
+    return vectors[rng.choice(len(vectors), max_points, replace=False)]
+
+def search_parameters(index_type: str, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None,
+                      selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Build per-request search parameters for the given index type.
+    The caller must keep selector alive for as long as the parameters are used.
+    """
+    if index_type in TRAINED_INDEX_TYPES:
+        params = faiss.SearchParametersIVF(nprobe=nprobe or settings.IVF_NPROBE)
+    elif index_type == HNSW:
+        params = faiss.SearchParametersHNSW(efSearch=max(ef_search or settings.HNSW_EF_SEARCH, 1))
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+
+    if selector is not None:
+        params.sel = selector
+    return params
+
+def exclusion_selector(excluded_ids) -> Optional[faiss.IDSelector]:
+    """Selector that rejects the given ids, or None when there is nothing to exclude"""
+    if not excluded_ids:
+        return None
+    excluded = np.fromiter(excluded_ids, dtype=np.int64, count=len(excluded_ids))
+    batch = faiss.IDSelectorBatch(excluded)
+    selector = faiss.IDSelectorNot(batch)
+    # IDSelectorNot does not own the wrapped selector
+    selector.referenced_objects = [batch]
+    return selector
+
+def inclusion_selector(allowed_ids: np.ndarray) -> faiss.IDSelector:
+    """Selector that accepts only the given ids"""
+    return faiss.IDSelectorBatch(np.ascontiguousarray(allowed_ids, dtype=np.int64))
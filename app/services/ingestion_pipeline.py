@@ -0,0 +1,284 @@
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+from app.services.document_store import DocumentStore, parse_document_file, split_pages
+
+logger = logging.getLogger(__name__)
+
+# Seconds an idle stage waits on its input queue before checking for shutdown
+POLL_INTERVAL = 1.0
+
+class DocumentDeleted(Exception):
+    """The document was deleted from the knowledge base while it was being ingested"""
+
+@dataclass
+class IngestionJob:
+    document_id: str
+    file_path: str
+    file_type: str
+    filename: str
+    future: Future = field(default_factory=Future)
+    pages: Optional[List[Dict]] = None
+    chunks: Optional[List[Dict]] = None
+    vectors: Optional[np.ndarray] = None
+    embedded: int = 0
+
+class StageStats:
+    """Work done by one pipeline stage and how busy its workers were"""
+
+    def __init__(self, workers: int, input_queue: queue.Queue):
+        self.workers = workers
+        self.input_queue = input_queue
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.calls = 0
+        self.items = 0
+        self.failures = 0
+        self.busy_seconds = 0.0
+
+    @contextmanager
+    def timed(self, items: int = 1):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.busy_seconds += time.perf_counter() - started
+                self.calls += 1
+                self.items += items
+
+    def stats(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            'workers': self.workers,
+            'queue_depth': self.input_queue.qsize(),
+            'queue_capacity': self.input_queue.maxsize,
+            'items': self.items,
+            'failures': self.failures,
+            'items_per_call': round(self.items / self.calls, 1) if self.calls else 0.0,
+            'ms_per_item': round(self.busy_seconds / self.items * 1000, 2) if self.items else 0.0,
+            'busy_seconds': round(self.busy_seconds, 2),
+            'utilization': round(self.busy_seconds / (elapsed * self.workers), 3) if elapsed else 0.0
+        }
+
+class IngestionPipeline:
+    """
+    Document ingestion as stages connected by bounded queues: parse (worker processes),
+    split (threads), embed (one thread) and index (one writer thread).
+
+    The embedding stage fills batches of embed_batch_size chunks across documents, so
+    small documents no longer get tiny forward passes, and embeds a partial batch once no
+    new document arrived for embed_wait_seconds. The writer adds every document that
+    finished embedding as one segment. A full queue blocks the stage feeding it, so a slow
+    stage holds back intake instead of buffering unbounded work. In stats(), the stage
+    near full utilization with a full input queue is the bottleneck.
+
+    Each parse thread owns one worker process; a document that takes longer than
+    parse_timeout seconds fails and the process, which may be stuck in a parser, is replaced.
+    """
+
+    def __init__(self, store: DocumentStore, parse_workers: int, split_workers: int, embed_batch_size: int,
+                 embed_wait_seconds: float, queue_size: int, parse_timeout: float):
+        self.store = store
+        self.parse_workers = max(1, parse_workers)
+        self.split_workers = max(1, split_workers)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.embed_wait_seconds = embed_wait_seconds
+        self.parse_timeout = parse_timeout
+        self._parse_queue = queue.Queue(maxsize=queue_size)
+        self._split_queue = queue.Queue(maxsize=queue_size)
+        self._embed_queue = queue.Queue(maxsize=queue_size)
+        self._index_queue = queue.Queue(maxsize=queue_size)
+        self._stages: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+        self.running = False
+
+    def start(self):
+        """Start the stage workers; sizes changed before the first start take effect"""
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            stages = (
+                ('parse', self._parse_loop, self.parse_workers, self._parse_queue),
+                ('split', self._split_loop, self.split_workers, self._split_queue),
+                ('embed', self._embed_loop, 1, self._embed_queue),
+                ('index', self._index_loop, 1, self._index_queue)
+            )
+            for name, target, workers, input_queue in stages:
+                self._stages[name] = StageStats(workers, input_queue)
+                for i in range(workers):
+                    threading.Thread(target=target, name=f"Ingest-{name}-{i}", daemon=True).start()
+        logger.info(
+            f"Ingestion pipeline started with {self.parse_workers} parse processes, {self.split_workers} split threads "
+            f"and embedding batches of {self.embed_batch_size} chunks"
+        )
+
+    def stop(self):
+        """Stop the stages; documents still in flight stay processing until they are queued again"""
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+        logger.info("Ingestion pipeline stopped")
+
+    def submit(self, document_id: str, file_path: str, file_type: str, filename: str) -> Future:
+        """
+        Queue a document registered with the store, blocking while the parse queue is full.
+        The future resolves to the number of chunks indexed, or raises the error it failed with.
+        """
+        self.start()
+        job = IngestionJob(document_id, file_path, file_type, filename)
+        self._parse_queue.put(job)
+        return job.future
+
+    def _get(self, source: queue.Queue, timeout: float = POLL_INTERVAL) -> Optional[IngestionJob]:
+        try:
+            return source.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _parse_loop(self):
+        # Spawned rather than forked: the server process runs threads holding locks
+        context = multiprocessing.get_context("spawn")
+        pool = context.Pool(1)
+        try:
+            while self.running:
+                job = self._get(self._parse_queue)
+                if job is None:
+                    continue
+                try:
+                    with self._stages['parse'].timed():
+                        result = pool.apply_async(parse_document_file, (job.file_path, job.file_type))
+                        job.pages = result.get(self.parse_timeout)
+                except multiprocessing.TimeoutError:
+                    pool.terminate()
+                    pool = context.Pool(1)
+                    self._fail([job], 'parse', TimeoutError(f"Parsing took longer than {self.parse_timeout:g} seconds"))
+                    continue
+                except Exception as e:
+                    self._fail([job], 'parse', e)
+                    continue
+                self._split_queue.put(job)
+        finally:
+            pool.terminate()
+
+    def _split_loop(self):
+        while self.running:
+            job = self._get(self._split_queue)
+            if job is None:
+                continue
+            try:
+                with self._stages['split'].timed():
+                    job.chunks = split_pages(job.pages)
+            except Exception as e:
+                self._fail([job], 'split', e)
+                continue
+            job.pages = None
+            self._embed_queue.put(job)
+
+    def _embed_loop(self):
+        open_jobs = deque()  # documents with chunks still to embed, oldest first
+        pending = 0          # chunks of open_jobs not embedded yet
+        while self.running:
+            job = self._get(self._embed_queue, self.embed_wait_seconds if pending else POLL_INTERVAL)
+            if job is not None:
+                if not job.chunks:
+                    self._index_queue.put(job)
+                    continue
+                open_jobs.append(job)
+                pending += len(job.chunks)
+            # Full batches as soon as they fill up, a partial one once the queue went quiet
+            while pending >= self.embed_batch_size or (pending and job is None):
+                pending -= self._embed_batch(open_jobs)
+
+    def _embed_batch(self, open_jobs: deque) -> int:
+        """Embed up to embed_batch_size chunks of the oldest open documents; returns the chunks taken off"""
+        parts, texts = [], []
+        for job in open_jobs:
+            take = min(len(job.chunks) - job.embedded, self.embed_batch_size - len(texts))
+            parts.append((job, job.embedded, take))
+            texts.extend(chunk['text'] for chunk in job.chunks[job.embedded:job.embedded + take])
+            if len(texts) == self.embed_batch_size:
+                break
+
+        return self._embed_parts(open_jobs, parts, texts)
+
+    def _embed_parts(self, open_jobs: deque, parts: List, texts: List[str]) -> int:
+        try:
+            with self._stages['embed'].timed(len(texts)):
+                vectors = self.store.embed_texts(texts, background=True)
+        except Exception as e:
+            if len(parts) > 1:
+                # Retry the batch document by document, so only a bad one fails
+                return sum(
+                    self._embed_parts(open_jobs, [(job, start, take)], [chunk['text'] for chunk in job.chunks[start:start + take]])
+                    for job, start, take in parts
+                )
+            job, start, _ = parts[0]
+            open_jobs.remove(job)
+            self._fail([job], 'embed', e)
+            # Its remaining chunks leave the pending count as well
+            return len(job.chunks) - start
+
+        offset = 0
+        for job, start, take in parts:
+            if job.vectors is None:
+                job.vectors = np.empty((len(job.chunks), vectors.shape[1]), dtype=np.float32)
+            job.vectors[start:start + take] = vectors[offset:offset + take]
+            offset += take
+            job.embedded += take
+            if job.embedded == len(job.chunks):
+                open_jobs.remove(job)
+                self._index_queue.put(job)
+        return len(texts)
+
+    def _index_loop(self):
+        while self.running:
+            job = self._get(self._index_queue)
+            if job is None:
+                continue
+            jobs = [job]
+            while True:
+                try:
+                    jobs.append(self._index_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with self._stages['index'].timed(len(jobs)):
+                    arrays = [job.vectors for job in jobs if job.vectors is not None]
+                    vectors = np.concatenate(arrays) if arrays else np.empty((0, 0), dtype=np.float32)
+                    skipped = self.store.index_documents([(job.document_id, job.filename, job.chunks) for job in jobs], vectors)
+            except Exception as e:
+                self._fail(jobs, 'index', e)
+                continue
+            for job in jobs:
+                if job.document_id in skipped:
+                    logger.info(f"Document {job.document_id} was deleted while it was ingested, dropped its chunks")
+                    job.future.set_exception(DocumentDeleted(f"Document {job.document_id} was deleted"))
+                    continue
+                logger.info(f"Indexed document {job.document_id} ({len(job.chunks)} chunks)")
+                job.future.set_result(len(job.chunks))
+
+    def _fail(self, jobs: List[IngestionJob], stage: str, error: Exception):
+        self._stages[stage].failures += len(jobs)
+        for job in jobs:
+            logger.error(f"Ingestion of document {job.document_id} failed in the {stage} stage: {str(error)}")
+            self.store.mark_failed(job.document_id, str(error))
+            job.future.set_exception(error)
+
+    def stats(self) -> Dict:
+        return {
+            'running': self.running,
+            'embed_batch_size': self.embed_batch_size,
+            'stages': {name: stage.stats() for name, stage in self._stages.items()}
+        }
@@ -0,0 +1,28 @@
+from collections import deque
+from typing import Dict
+import numpy as np
+
+# Number of recent samples kept for percentiles
+LATENCY_WINDOW = 2048
+
+class LatencyWindow:
+    """The most recent durations in seconds, reported as millisecond percentiles"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentiles(self, prefix: str = "") -> Dict[str, float]:
+        """p50 and p99 in milliseconds, keys prefixed with prefix; zeros before the first sample"""
+        samples = np.array(list(self._samples)) * 1000
+        if not len(samples):
+            return {f'{prefix}p50_ms': 0.0, f'{prefix}p99_ms': 0.0}
+        return {
+            f'{prefix}p50_ms': round(float(np.percentile(samples, 50)), 2),
+            f'{prefix}p99_ms': round(float(np.percentile(samples, 99)), 2)
+        }
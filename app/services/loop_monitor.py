@@ -0,0 +1,49 @@
+import time
+import asyncio
+import logging
+from typing import Dict, Optional
+from app.services.latency import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+class EventLoopMonitor:
+    """
+    Measures event loop lag: how much later than requested a short sleep wakes up.
+    Blocking work on the loop (a forward pass, an index search) shows up directly as
+    lag, and every websocket served by the loop stalls for that long.
+    """
+
+    def __init__(self, interval_seconds: float, warn_seconds: float):
+        self.interval = interval_seconds
+        self.warn_seconds = warn_seconds
+        self._lags = LatencyWindow()
+        self._task: Optional[asyncio.Task] = None
+        self.max_lag = 0.0
+
+    def start(self):
+        """Start sampling on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self._lags.record(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.warn_seconds:
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms")
+
+    def stats(self) -> Dict:
+        return {
+            'samples': len(self._lags),
+            'interval_ms': self.interval * 1000,
+            **self._lags.percentiles(),
+            'max_ms': round(self.max_lag * 1000, 2)
+        }
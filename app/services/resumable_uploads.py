@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from filelock import FileLock, Timeout
+from app.services.segment_store import atomic_write_bytes
+from app.services.upload_writer import UploadTooLarge
+
+logger = logging.getLogger(__name__)
+
+# Bytes read at a time when hashing a finished upload
+HASH_CHUNK_SIZE = 1048576
+
+class UploadConflict(ValueError):
+    """The request does not match the upload's state, e.g. a wrong offset or an unfinished upload"""
+
+class ResumableUploadStore:
+    """
+    Staging area for tus-style resumable uploads: create an upload with its total size,
+    append byte ranges at the current offset, then finalize once every byte arrived.
+
+    Each upload is a .part file plus a small JSON state file, so any worker process can
+    continue an upload another one started; a per-upload file lock keeps two requests
+    from writing the same upload at once. Uploads not finalized within ttl_seconds of
+    their last write expire and are removed.
+    """
+
+    def __init__(self, staging_dir: Path, max_size: int, ttl_seconds: float):
+        self.staging_dir = staging_dir
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, upload_id: str, kind: str) -> Path:
+        return self.staging_dir / f"{upload_id}.{kind}"
+
+    def _lock(self, upload_id: str) -> FileLock:
+        return FileLock(str(self._path(upload_id, "lock")))
+
+    def _save_state(self, state: Dict):
+        atomic_write_bytes(self._path(state['upload_id'], "json"), json.dumps(state).encode('utf-8'))
+
+    def _load_state(self, upload_id: str) -> Optional[Dict]:
+        try:
+            with open(self._path(upload_id, "json"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def create(self, filename: str, file_type: str, size: int, uploaded_by: int) -> Dict:
+        if size > self.max_size:
+            raise UploadTooLarge(f"Upload exceeds {self.max_size} bytes")
+        self.purge_expired()
+
+        upload_id = uuid.uuid4().hex
+        self._path(upload_id, "part").touch()
+        state = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'file_type': file_type,
+            'size': size,
+            'offset': 0,
+            'uploaded_by': uploaded_by,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'updated_at': time.time()
+        }
+        self._save_state(state)
+        logger.info(f"Created resumable upload {upload_id} for {filename} ({size} bytes)")
+        return self.describe(state)
+
+    def get(self, upload_id: str) -> Optional[Dict]:
+        """State of a live upload, None if it does not exist or has expired"""
+        state = self._load_state(upload_id)
+        if state is None or self._expired(state):
+            return None
+        return state
+
+    def describe(self, state: Dict) -> Dict:
+        return {
+            'upload_id': state['upload_id'],
+            'filename': state['filename'],
+            'size': state['size'],
+            'offset': state['offset'],
+            'created_at': state['created_at'],
+            'expires_at': datetime.fromtimestamp(state['updated_at'] + self.ttl_seconds, timezone.utc).isoformat()
+        }
+
+    def _expired(self, state: Dict) -> bool:
+        return time.time() - state['updated_at'] > self.ttl_seconds
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> Dict:
+        """
+        Write a byte range starting at offset, which must be the upload's current offset.
+        Bytes received before an interrupted request still count, so the client resumes
+        from the offset reported afterwards.
+        """
+        lock = self._lock(upload_id)
+        try:
+            lock.acquire(timeout=0)
+        except Timeout:
+            raise UploadConflict("Another request is writing this upload")
+        try:
+            state = self.get(upload_id)
+            if state is None:
+                raise KeyError(upload_id)
+            if offset != state['offset']:
+                raise UploadConflict(f"Upload offset is {state['offset']}, not {offset}")
+
+            target = await asyncio.to_thread(open, self._path(upload_id, "part"), "r+b")
+            try:
+                await asyncio.to_thread(target.seek, offset)
+                async for chunk in chunks:
+                    if state['offset'] + len(chunk) > state['size']:
+                        raise UploadTooLarge(f"Upload exceeds its declared size of {state['size']} bytes")
+                    await asyncio.to_thread(target.write, chunk)
+                    state['offset'] += len(chunk)
+            finally:
+                await asyncio.to_thread(target.close)
+                state['updated_at'] = time.time()
+                await asyncio.to_thread(self._save_state, state)
+            return self.describe(state)
+        finally:
+            lock.release()
+
+    async def finalize(self, upload_id: str, destination: Path) -> Tuple[Dict, str]:
+        """Move a complete upload to destination; returns its state and SHA-256 hex digest"""
+        lock = self._lock(upload_id)
+        try:
+            lock.acquire(timeout=0)
+        except Timeout:
+            raise UploadConflict("Another request is writing this upload")
+        try:
+            state = self.get(upload_id)
+            if state is None:
+                raise KeyError(upload_id)
+            if state['offset'] != state['size']:
+                raise UploadConflict(f"Upload has {state['offset']} of {state['size']} bytes")
+
+            part = self._path(upload_id, "part")
+            content_hash = await asyncio.to_thread(_sha256_file, part)
+            await asyncio.to_thread(os.replace, part, destination)
+            self._remove(upload_id, ("json",))
+        finally:
+            lock.release()
+        self._remove(upload_id, ("lock",))
+        logger.info(f"Finalized resumable upload {upload_id} to {destination}")
+        return state, content_hash
+
+    def abort(self, upload_id: str) -> bool:
+        if self._load_state(upload_id) is None:
+            return False
+        lock = self._lock(upload_id)
+        try:
+            lock.acquire(timeout=0)
+        except Timeout:
+            raise UploadConflict("Another request is writing this upload")
+        try:
+            self._remove(upload_id, ("part", "json"))
+        finally:
+            lock.release()
+        self._remove(upload_id, ("lock",))
+        logger.info(f"Aborted resumable upload {upload_id}")
+        return True
+
+    def list_uploads(self) -> List[Dict]:
+        self.purge_expired()
+        states = (self._load_state(path.stem) for path in self.staging_dir.glob("*.json"))
+        return [self.describe(state) for state in states if state is not None]
+
+    def purge_expired(self) -> int:
+        """Remove uploads that have not been written to within the TTL"""
+        purged = 0
+        for path in self.staging_dir.glob("*.json"):
+            state = self._load_state(path.stem)
+            if state is None or not self._expired(state):
+                continue
+            lock = self._lock(path.stem)
+            try:
+                lock.acquire(timeout=0)
+            except Timeout:
+                continue
+            try:
+                self._remove(path.stem, ("part", "json"))
+            finally:
+                lock.release()
+            self._remove(path.stem, ("lock",))
+            purged += 1
+        if purged:
+            logger.info(f"Removed {purged} expired resumable uploads")
+        return purged
+
+    def _remove(self, upload_id: str, kinds):
+        for kind in kinds:
+            try:
+                self._path(upload_id, kind).unlink()
+            except FileNotFoundError:
+                pass
+
+def _sha256_file(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
@@ -0,0 +1,89 @@
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+from app.services.latency import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+class RetrievalTimeout(TimeoutError):
+    """Retrieval did not get a worker or did not finish within the timeout"""
+
+class RetrievalExecutor:
+    """
+    Dedicated thread pool for blocking retrieval work (embedding forward passes, index
+    searches, chunk store reads) so it never runs on the event loop. A semaphore admits
+    at most max_concurrency calls per event loop; the rest wait in line, and the wait
+    counts towards timeout_seconds. A timed out call keeps its slot until the thread
+    finishes, so a slow index cannot pile more work onto the pool.
+    """
+
+    def __init__(self, max_concurrency: int, timeout_seconds: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="retrieval")
+        self._semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self._queue_times = LatencyWindow()
+        self._run_times = LatencyWindow()
+        self.calls = 0
+        self.running = 0
+        self.waiting = 0
+        self.timeouts = 0
+
+    def _semaphore(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        # asyncio primitives belong to one loop; scripts may run several loops in turn
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                self._semaphores = {other: value for other, value in self._semaphores.items() if not other.is_closed()}
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+            return semaphore
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run func(*args, **kwargs) on the retrieval pool, raising RetrievalTimeout when it takes too long"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphore(loop)
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise RetrievalTimeout(f"No retrieval worker free within {self.timeout_seconds:g}s")
+        finally:
+            self.waiting -= 1
+
+        started = time.perf_counter()
+        self._queue_times.record(started - queued)
+        self.running += 1
+        future = loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+        def finished(_):
+            self.running -= 1
+            self._run_times.record(time.perf_counter() - started)
+            semaphore.release()
+        future.add_done_callback(finished)
+
+        try:
+            # Shielded: cancelling the wait must not release the slot of a thread still working
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout_seconds - (started - queued))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise RetrievalTimeout(f"Retrieval did not finish within {self.timeout_seconds:g}s")
+        finally:
+            self.calls += 1
+
+    def stats(self) -> Dict:
+        return {
+            'max_concurrency': self.max_concurrency,
+            'timeout_seconds': self.timeout_seconds,
+            'calls': self.calls,
+            'running': self.running,
+            'waiting': self.waiting,
+            'timeouts': self.timeouts,
+            **self._queue_times.percentiles('queue_'),
+            **self._run_times.percentiles('run_')
+        }
@@ -0,0 +1,83 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.services.embedding_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+class SearchResultCache:
+    """
+    Bounded LRU cache of search results for one manifest generation.
+    Every upload, delete or index rebuild commits a new generation, and the
+    first lookup against it drops all entries of the previous one.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.generation = None
+        self._entries: "OrderedDict[Tuple, Tuple[Tuple[Dict, ...], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def key(query: str, k: int, nprobe: Optional[int], ef_search: Optional[int],
+            filters: Optional[Dict]) -> Tuple:
+        fingerprint = json.dumps(filters, sort_keys=True, default=str) if filters else None
+        return (normalize_query(query), k, nprobe, ef_search, fingerprint)
+
+    def _advance(self, generation: int) -> bool:
+        """Move to a newer generation, False if generation is older than the one being served"""
+        # Caller holds the lock
+        if self.generation is None or generation > self.generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.generation = generation
+        return generation == self.generation
+
+    def get(self, key: Tuple, generation: int) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(key) if self._advance(generation) else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[1]
+            return [dict(chunk) for chunk in entry[0]]
+
+    def put(self, key: Tuple, generation: int, chunks: List[Dict], elapsed: float):
+        """Store results computed against generation, elapsed is what a later hit saves"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                # Computed against an older generation than the cache now serves
+                return
+            self._entries[key] = (tuple(chunks), elapsed)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'generation': self.generation,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'saved_ms': round(self.saved_seconds * 1000, 1)
+            }
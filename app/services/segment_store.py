@@ -0,0 +1,220 @@
+import io
+import os
+import json
+import pickle
+import uuid
+import logging
+from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+import numpy as np
+import faiss
+from filelock import FileLock
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2
+
+def _fsync_directory(path: Path):
+    if os.name == 'nt':
+        return
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """Write data to path so readers see either the old or the new file, never a partial one"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_directory(path.parent)
+
+class SegmentStore:
+    """
+    Append-only on-disk layout for the unified knowledge base.
+
+    Every processed document is written once as an immutable segment (chunk ids
+    and vectors). A small JSON manifest lists the live segments,
+    documents and tombstoned chunk ids and is the single atomic commit point.
+    An optional index checkpoint saves rebuilding the FAISS index on startup.
+    """
+
+    def __init__(self, base_path: Path):
+        self.base_path = base_path
+        self.segments_path = base_path / "segments"
+        self.segments_path.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = base_path / "manifest.json"
+        self._write_lock = FileLock(str(base_path / "manifest.lock"))
+
+    def exists(self) -> bool:
+        return self.manifest_path.exists()
+
+    def write_lock(self) -> FileLock:
+        """Inter-process lock serializing manifest writers"""
+        return self._write_lock
+
+    def compaction_lock(self) -> FileLock:
+        """Inter-process lock held for a whole compaction run, a fresh lock object per run"""
+        return FileLock(str(self.base_path / "compaction.lock"))
+
+    def manifest_signature(self) -> Optional[Tuple[int, int, int]]:
+        """Cheap change marker for the manifest, every commit replaces the file"""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def empty_manifest(index_type: str) -> Dict:
+        return {
+            'version': MANIFEST_VERSION,
+            'generation': 0,
+            'next_chunk_id': 0,
+            'index_type': index_type,
+            'segments': [],
+            'checkpoint': None,
+            'documents': {},
+            'tombstones': set(),
+            'global_status': 'ready'
+        }
+
+    def load_manifest(self) -> Dict:
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest['tombstones'] = set(manifest.get('tombstones', []))
+        return manifest
+
+    def commit(self, manifest: Dict):
+        """Atomically publish a new manifest generation"""
+        manifest['generation'] += 1
+        data = dict(manifest)
+        data['tombstones'] = sorted(manifest['tombstones'])
+        atomic_write_bytes(self.manifest_path, json.dumps(data).encode('utf-8'))
+
+    def _segment_file(self, name: str, kind: str) -> Path:
+        return self.segments_path / f"{name}.{kind}"
+
+    def write_segment(self, ids: np.ndarray, vectors: np.ndarray) -> Dict:
+        """Write a new immutable segment and return its manifest entry (not yet committed)"""
+        first_id = int(ids.min()) if len(ids) else 0
+        name = f"seg_{first_id:012d}_{uuid.uuid4().hex[:8]}"
+
+        atomic_write_bytes(self._segment_file(name, "ids.npy"), _npy_bytes(ids.astype(np.int64)))
+        atomic_write_bytes(self._segment_file(name, "vectors.npy"), _npy_bytes(vectors.astype(np.float32)))
+
+        return {
+            'name': name,
+            'count': int(len(ids)),
+            'min_id': first_id,
+            'max_id': int(ids.max()) if len(ids) else 0
+        }
+
+    def read_vectors(self, name: str, mmap: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Load a segment, optionally as read-only memory maps shared through the page cache"""
+        mmap_mode = 'r' if mmap else None
+        ids = np.load(self._segment_file(name, "ids.npy"), mmap_mode=mmap_mode)
+        vectors = np.load(self._segment_file(name, "vectors.npy"), mmap_mode=mmap_mode)
+        return ids, vectors
+
+    def stored_ids(self, names: List[str], chunk_ids) -> set:
+        """Subset of chunk_ids still present in the given segments"""
+        if not chunk_ids:
+            return set()
+        candidates = np.fromiter(chunk_ids, dtype=np.int64, count=len(chunk_ids))
+        present = np.zeros(len(candidates), dtype=bool)
+        for name in names:
+            present |= np.isin(candidates, np.load(self._segment_file(name, "ids.npy")))
+        return set(candidates[present].tolist())
+
+    def read_legacy_records(self, name: str) -> List[Dict]:
+        """Chunk records embedded in version 1 segments, before the chunk store existed"""
+        path = self._segment_file(name, "chunks.pickle")
+        if not path.exists():
+            return []
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def delete_segment(self, name: str):
+        for kind in ("ids.npy", "vectors.npy", "chunks.pickle"):
+            path = self._segment_file(name, kind)
+            if path.exists():
+                path.unlink()
+
+    def merge_segments(self, names: List[str], tombstones) -> Tuple[Optional[Dict], set]:
+        """
+        Combine segments into one, dropping tombstoned chunks.
+        Returns the new segment entry (None if nothing survived) and the dropped ids.
+        """
+        all_ids, all_vectors = [], []
+        for name in names:
+            ids, vectors = self.read_vectors(name)
+            all_ids.append(ids)
+            all_vectors.append(vectors)
+
+        ids = np.concatenate(all_ids)
+        vectors = np.concatenate(all_vectors)
+        keep = ~np.isin(ids, np.fromiter(tombstones, dtype=np.int64, count=len(tombstones)))
+        dropped = set(ids[~keep].tolist())
+
+        if not keep.any():
+            return None, dropped
+
+        return self.write_segment(ids[keep], vectors[keep]), dropped
+
+    def storage_bytes(self, manifest: Dict) -> int:
+        """On-disk size of the manifest's segment files and index checkpoint"""
+        paths = [self._segment_file(segment['name'], kind)
+                 for segment in manifest['segments'] for kind in ("ids.npy", "vectors.npy")]
+        if manifest.get('checkpoint'):
+            paths.append(self.base_path / manifest['checkpoint']['file'])
+        total = 0
+        for path in paths:
+            try:
+                total += os.stat(path).st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def write_status(self, name: str, status: Dict):
+        """Publish a small JSON status file, e.g. background job progress, readable by every process"""
+        atomic_write_bytes(self.base_path / f"{name}.json", json.dumps(status).encode('utf-8'))
+
+    def read_status(self, name: str) -> Optional[Dict]:
+        try:
+            with open(self.base_path / f"{name}.json", 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def write_checkpoint(self, index_bytes: np.ndarray) -> str:
+        name = f"checkpoint_{uuid.uuid4().hex}.faiss"
+        atomic_write_bytes(self.base_path / name, index_bytes.tobytes())
+        return name
+
+    def read_checkpoint(self, checkpoint: Dict, mmap: bool = False) -> faiss.Index:
+        """
+        Load an index checkpoint. With mmap, IVF inverted lists are mapped read-only
+        instead of copied to the heap; other index types ignore the flag.
+        """
+        io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        return faiss.read_index(str(self.base_path / checkpoint['file']), io_flags)
+
+    def delete_checkpoint(self, checkpoint: Optional[Dict]):
+        if checkpoint:
+            path = self.base_path / checkpoint['file']
+            try:
+                if path.exists():
+                    path.unlink()
+            except OSError as e:
+                # Windows refuses to unlink a file another process still has mapped
+                logger.warning(f"Could not remove old checkpoint {checkpoint['file']}: {str(e)}")
+
+def _npy_bytes(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
@@ -0,0 +1,143 @@
+import logging
+import threading
+from pathlib import Path
+from app.services.document_store import DocumentStore
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.compaction_scheduler import CompactionScheduler
+from app.services.context_assembler import ContextAssembler
+from app.services.loop_monitor import EventLoopMonitor
+from app.services.resumable_uploads import ResumableUploadStore
+from app.services.bulk_importer import BulkImporter
+from app.services.ingestion_pipeline import IngestionPipeline
+from app.services.embedding_backends import create_embeddings
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# One embedding model and one knowledge base store per process, created on first use
+_lock = threading.Lock()
+_embeddings = None
+_document_store = None
+_answer_cache = None
+_compaction_scheduler = None
+_context_assembler = None
+_loop_monitor = None
+_upload_store = None
+_bulk_importer = None
+_ingestion_pipeline = None
+
+def get_embeddings():
+    """Shared embedding model for this process"""
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                logger.info(f"Loading embedding model {settings.EMBEDDINGS_MODEL} ({settings.EMBEDDING_BACKEND} backend)")
+                _embeddings = create_embeddings()
+    return _embeddings
+
+def get_document_store() -> DocumentStore:
+    """Shared unified knowledge base store for this process"""
+    global _document_store
+    if _document_store is None:
+        embeddings = get_embeddings()
+        with _lock:
+            if _document_store is None:
+                _document_store = DocumentStore(settings.OUTPUT_FOLDER, embeddings=embeddings)
+    return _document_store
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Shared semantic answer cache for this process"""
+    global _answer_cache
+    if _answer_cache is None:
+        with _lock:
+            if _answer_cache is None:
+                _answer_cache = SemanticAnswerCache(
+                    settings.ANSWER_CACHE_SIZE,
+                    ttl_seconds=settings.ANSWER_CACHE_TTL,
+                    threshold=settings.ANSWER_CACHE_THRESHOLD,
+                    purge_marker=Path(settings.OUTPUT_FOLDER) / "answer_cache.purged"
+                )
+    return _answer_cache
+
+def get_compaction_scheduler() -> CompactionScheduler:
+    """Background compaction scheduler for this process's knowledge base store"""
+    global _compaction_scheduler
+    if _compaction_scheduler is None:
+        store = get_document_store()
+        with _lock:
+            if _compaction_scheduler is None:
+                _compaction_scheduler = CompactionScheduler(store)
+    return _compaction_scheduler
+
+def get_context_assembler() -> ContextAssembler:
+    """Shared prompt context assembler for this process"""
+    global _context_assembler
+    if _context_assembler is None:
+        with _lock:
+            if _context_assembler is None:
+                _context_assembler = ContextAssembler(
+                    settings.CONTEXT_TOKEN_BUDGET,
+                    history_share=settings.CONTEXT_HISTORY_SHARE,
+                    max_overlap=settings.SPLIT_OVERLAP
+                )
+    return _context_assembler
+
+def get_loop_monitor() -> EventLoopMonitor:
+    """Event loop lag monitor for this process"""
+    global _loop_monitor
+    if _loop_monitor is None:
+        with _lock:
+            if _loop_monitor is None:
+                _loop_monitor = EventLoopMonitor(settings.LOOP_LAG_INTERVAL, warn_seconds=settings.LOOP_LAG_WARN_MS / 1000)
+    return _loop_monitor
+
+def get_upload_store() -> ResumableUploadStore:
+    """Staging area for resumable uploads, shared by every worker process through the filesystem"""
+    global _upload_store
+    if _upload_store is None:
+        with _lock:
+            if _upload_store is None:
+                _upload_store = ResumableUploadStore(
+                    Path(settings.UPLOAD_DIR) / "staging",
+                    max_size=settings.RESUMABLE_MAX_FILE_SIZE,
+                    ttl_seconds=settings.RESUMABLE_UPLOAD_TTL
+                )
+    return _upload_store
+
+def get_ingestion_pipeline() -> IngestionPipeline:
+    """Staged ingestion pipeline for this process's knowledge base store, started on first use"""
+    global _ingestion_pipeline
+    if _ingestion_pipeline is None:
+        store = get_document_store()
+        with _lock:
+            if _ingestion_pipeline is None:
+                _ingestion_pipeline = IngestionPipeline(
+                    store,
+                    parse_workers=settings.DOC_PROCESSING_WORKERS,
+                    split_workers=settings.INGEST_SPLIT_WORKERS,
+                    embed_batch_size=settings.INGEST_EMBED_BATCH,
+                    embed_wait_seconds=settings.INGEST_EMBED_WAIT_MS / 1000,
+                    parse_timeout=settings.INGEST_PARSE_TIMEOUT,
+                    queue_size=settings.INGEST_QUEUE_SIZE
+                )
+    return _ingestion_pipeline
+
+def get_bulk_importer() -> BulkImporter:
+    """Bulk importer for this process's knowledge base store, job status kept under UPLOAD_DIR/imports"""
+    global _bulk_importer
+    if _bulk_importer is None:
+        store = get_document_store()
+        pipeline = get_ingestion_pipeline()
+        with _lock:
+            if _bulk_importer is None:
+                _bulk_importer = BulkImporter(
+                    store,
+                    pipeline,
+                    upload_dir=Path(settings.UPLOAD_DIR),
+                    status_dir=Path(settings.UPLOAD_DIR) / "imports",
+                    allowed_extensions=settings.ALLOWED_EXTENSIONS_LIST,
+                    max_file_size=settings.MAX_FILE_SIZE,
+                    copy_chunk_size=settings.UPLOAD_CHUNK_SIZE
+                )
+    return _bulk_importer
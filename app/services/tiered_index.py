@@ -0,0 +1,203 @@
+import copy
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+import faiss
+from app.services import index_factory
+
+logger = logging.getLogger(__name__)
+
+# Filters selecting at most this many ids skip the approximate base index and search them exactly
+EXACT_FILTER_MAX_IDS = 4096
+
+class SegmentFlatIndex:
+    """
+    Exact L2 search straight over memory-mapped segment vector files.
+    The vectors stay in the OS page cache and are shared by every process.
+    """
+
+    def __init__(self, dim: int):
+        self.d = dim
+        self.segments: Dict[str, Tuple[np.ndarray, np.ndarray, int, int]] = {}
+
+    @property
+    def ntotal(self) -> int:
+        return sum(len(segment[0]) for segment in self.segments.values())
+
+    # The segment map is replaced rather than mutated so concurrent searches see a stable view
+    def add_segment(self, name: str, ids: np.ndarray, vectors: np.ndarray):
+        if len(ids):
+            self.segments = {**self.segments, name: (ids, vectors, int(ids.min()), int(ids.max()))}
+
+    def drop_segment(self, name: str):
+        self.segments = {key: value for key, value in self.segments.items() if key != name}
+
+    def search(self, queries: np.ndarray, k: int, excluded: np.ndarray,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest live vectors; allowed (sorted, live ids only) restricts the search to those ids"""
+        distances, labels = [], []
+        for ids, vectors, min_id, max_id in list(self.segments.values()):
+            if allowed is not None:
+                selected = allowed[np.searchsorted(allowed, min_id):np.searchsorted(allowed, max_id, side='right')]
+                if not len(selected):
+                    continue
+                # Only the selected rows are paged in and compared
+                rows = np.flatnonzero(np.isin(ids, selected))
+                if not len(rows):
+                    continue
+                D, P = faiss.knn(queries, vectors[rows], min(len(rows), k))
+                distances.append(D)
+                labels.append(np.where(P >= 0, ids[rows[np.maximum(P, 0)]], -1))
+                continue
+            
+            # Over-fetch so tombstoned hits cannot push live ones out of the top k
+            dead_count = np.count_nonzero((excluded >= min_id) & (excluded <= max_id))
+            segment_k = min(len(ids), k + dead_count)
+            D, P = faiss.knn(queries, vectors, segment_k)
+            I = np.where(P >= 0, ids[np.maximum(P, 0)], -1)
+            if dead_count:
+                dead = np.isin(I, excluded)
+                D = np.where(dead, np.inf, D)
+                I = np.where(dead, -1, I)
+            distances.append(D)
+            labels.append(I)
+        return _merge_results(distances, labels, len(queries), k)
+
+class TieredIndex:
+    """
+    Read-only base tier plus a small writable delta tier.
+
+    The base is either an index checkpoint (memory-mapped when the index type
+    supports it) covering chunk ids below covered_until, or the segment vector
+    files themselves for flat indexes. Vectors added since then live in an
+    in-memory flat delta index. Deleted base vectors are masked via tombstones.
+
+    Searches run on several threads while a writer changes the index, and FAISS indexes
+    must not be modified during a search: writes build a new delta (or segment map) and
+    swap the reference, so a search keeps the tiers it started with. Writers must be
+    serialized by the caller.
+    """
+
+    def __init__(self, index_type: str, dim: int, base=None, covered_until: int = 0,
+                 base_mapped: bool = False, checkpoint_file: Optional[str] = None):
+        self.index_type = index_type
+        self.d = dim
+        self.base = base
+        self.base_mapped = base_mapped
+        self.checkpoint_file = checkpoint_file
+        self.covered_until = covered_until
+        self.delta = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+        # Tombstoned ids and their selector, swapped together
+        self._mask = (np.empty(0, dtype=np.int64), None)
+
+    @property
+    def ntotal(self) -> int:
+        base_total = self.base.ntotal if self.base is not None else 0
+        return base_total + self.delta.ntotal
+
+    @property
+    def segment_backed(self) -> bool:
+        return isinstance(self.base, SegmentFlatIndex)
+
+    def copy(self) -> 'TieredIndex':
+        """Cheap copy sharing the tiers, to change and then publish in place of this index"""
+        index = copy.copy(self)
+        if self.segment_backed:
+            index.base = copy.copy(self.base)
+        return index
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray, segment_name: Optional[str] = None):
+        if self.segment_backed and segment_name is not None:
+            self.base.add_segment(segment_name, ids, vectors)
+        else:
+            delta = faiss.clone_index(self.delta)
+            delta.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), ids)
+            self.delta = delta
+
+    def remove(self, ids: Iterable[int]):
+        """Remove ids from the delta tier; base tier deletions go through set_tombstones"""
+        ids = np.fromiter(ids, dtype=np.int64)
+        if len(ids) and self.delta.ntotal:
+            delta = faiss.clone_index(self.delta)
+            delta.remove_ids(ids)
+            self.delta = delta
+
+    def set_tombstones(self, tombstones):
+        """Mask deleted ids that are still stored in the read-only base tier"""
+        excluded = np.fromiter(tombstones, dtype=np.int64, count=len(tombstones))
+        self._mask = (excluded, index_factory.exclusion_selector(tombstones))
+
+    def search(self, queries: np.ndarray, k: int, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """k nearest neighbours; allowed restricts every tier to those ids before any distance is computed"""
+        distances, labels = [], []
+        excluded, selector = self._mask
+        delta = self.delta
+        delta_params = None
+        if allowed is not None:
+            # Dropping tombstoned ids up front lets the filter stand in for the tombstone mask
+            allowed = np.setdiff1d(np.asarray(allowed, dtype=np.int64), excluded)
+            selector = index_factory.inclusion_selector(allowed)
+            delta_params = faiss.SearchParameters(sel=selector)
+
+        if self.segment_backed:
+            D, I = self.base.search(queries, k, excluded, allowed=allowed)
+            distances.append(D)
+            labels.append(I)
+        elif self.base is not None and self.base.ntotal and allowed is not None and len(allowed) <= EXACT_FILTER_MAX_IDS:
+            # Graph and inverted list traversal rarely reach a few scattered ids, compare them directly
+            base_ids = allowed[allowed < self.covered_until]
+            if len(base_ids):
+                D, P = faiss.knn(queries, self.base.reconstruct_batch(base_ids), min(len(base_ids), k))
+                distances.append(D)
+                labels.append(np.where(P >= 0, base_ids[np.maximum(P, 0)], -1))
+        elif self.base is not None and self.base.ntotal:
+            params = index_factory.search_parameters(
+                self.index_type,
+                nprobe=nprobe,
+                ef_search=ef_search,
+                selector=selector
+            )
+            D, I = self.base.search(queries, k, params=params)
+            distances.append(D)
+            labels.append(I)
+
+        if delta.ntotal:
+            D, I = delta.search(queries, min(k, delta.ntotal), params=delta_params)
+            distances.append(D)
+            labels.append(I)
+
+        return _merge_results(distances, labels, len(queries), k)
+
+    def memory_stats(self) -> Dict:
+        """Approximate private heap held by the index versus memory-mapped data"""
+        delta_bytes = self.delta.ntotal * self.d * 4
+        base_vectors = self.base.ntotal if self.base is not None else 0
+        mapped = self.base_mapped or self.segment_backed
+        return {
+            'index_type': self.index_type,
+            'base_vectors': base_vectors,
+            'base_memory_mapped': mapped,
+            'delta_vectors': self.delta.ntotal,
+            'delta_bytes': delta_bytes
+        }
+
+def _merge_results(distances, labels, n_queries: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Combine per-tier results into the k nearest per query"""
+    if not distances:
+        return np.full((n_queries, k), np.inf, dtype=np.float32), np.full((n_queries, k), -1, dtype=np.int64)
+    if len(distances) == 1 and distances[0].shape[1] == k:
+        return distances[0], labels[0]
+
+    D = np.hstack(distances)
+    I = np.hstack(labels)
+    D = np.where(I < 0, np.inf, D)
+    order = np.argsort(D, axis=1, kind='stable')[:, :k]
+    D = np.take_along_axis(D, order, axis=1)
+    I = np.take_along_axis(I, order, axis=1)
+    if I.shape[1] < k:
+        pad = k - I.shape[1]
+        D = np.pad(D, ((0, 0), (0, pad)), constant_values=np.inf)
+        I = np.pad(I, ((0, 0), (0, pad)), constant_values=-1)
+    return D, I
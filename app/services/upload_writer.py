@@ -0,0 +1,180 @@
+import os
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Dict, List, Tuple
+from fastapi import UploadFile
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+# Bytes a multipart body carries beside the file itself: boundaries and part headers
+MULTIPART_OVERHEAD = 16384
+
+class UploadTooLarge(ValueError):
+    """The upload grew past the size limit while it was being copied"""
+
+class MalformedUpload(ValueError):
+    """The request body is not multipart/form-data or lacks the expected file"""
+
+def _write_chunk(target: BinaryIO, hasher, chunk: bytes):
+    target.write(chunk)
+    hasher.update(chunk)
+
+async def save_upload(upload: UploadFile, destination: Path, max_size: int, chunk_size: int) -> Tuple[int, str]:
+    """
+    Copy an upload to destination in chunk_size pieces, hashing as it goes.
+    Writes and hashing run in a worker thread so the event loop never blocks on disk,
+    and at most one chunk is held in memory. The file only appears at destination once
+    complete; an upload growing past max_size raises UploadTooLarge and leaves nothing behind.
+    Returns the size in bytes and the SHA-256 hex digest.
+
+    An UploadFile has already been received in full and spooled to a temporary file by
+    the framework, so max_size only bounds the copy, not the bandwidth and temporary disk
+    an oversized upload takes; save_multipart_upload stops reading the request instead.
+    """
+    partial = destination.with_name(destination.name + ".part")
+    hasher = hashlib.sha256()
+    size = 0
+    target = await asyncio.to_thread(open, partial, "wb")
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge(f"Upload exceeds {max_size} bytes")
+            await asyncio.to_thread(_write_chunk, target, hasher, chunk)
+        await asyncio.to_thread(target.close)
+        await asyncio.to_thread(os.replace, partial, destination)
+    except BaseException:
+        await asyncio.to_thread(target.close)
+        await asyncio.to_thread(_remove, partial)
+        raise
+
+    logger.info(f"Saved upload {upload.filename} to {destination} ({size} bytes, sha256 {hasher.hexdigest()})")
+    return size, hasher.hexdigest()
+
+async def save_multipart_upload(chunks: AsyncIterator[bytes], content_type: str, field: str, destination: Path,
+                                max_size: int) -> Tuple[str, int, str]:
+    """
+    Parse a multipart/form-data request body as it arrives and write the file in field
+    to destination, hashing as it goes. Unlike save_upload, the body is never spooled
+    first: reading stops once the file passes max_size, which raises UploadTooLarge and
+    leaves nothing behind. Other fields are skipped. Returns the client's filename, the
+    size in bytes and the SHA-256 hex digest.
+    """
+    _, options = parse_options_header(content_type)
+    boundary = options.get(b'boundary')
+    if not boundary:
+        raise MalformedUpload("Request body must be multipart/form-data")
+
+    part: Dict = {'headers': {}, 'field': b'', 'value': b'', 'writing': False}
+    received: List[bytes] = []
+    found = {}
+
+    def on_part_begin():
+        part.update(headers={}, field=b'', value=b'', writing=False)
+
+    def on_header_field(data: bytes, start: int, end: int):
+        part['field'] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        part['value'] += data[start:end]
+
+    def on_header_end():
+        part['headers'][part['field'].lower()] = part['value']
+        part['field'], part['value'] = b'', b''
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part['headers'].get(b'content-disposition', b''))
+        if disposition.get(b'name') == field.encode() and b'filename' in disposition and 'filename' not in found:
+            found['filename'] = disposition[b'filename'].decode('utf-8', 'replace')
+            part['writing'] = True
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if part['writing']:
+            received.append(data[start:end])
+
+    def on_part_end():
+        part['writing'] = False
+
+    parser = MultipartParser(boundary, {
+        'on_part_begin': on_part_begin,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end
+    })
+
+    partial = destination.with_name(destination.name + ".part")
+    hasher = hashlib.sha256()
+    size = 0
+    target = await asyncio.to_thread(open, partial, "wb")
+    try:
+        async for chunk in chunks:
+            try:
+                parser.write(chunk)
+            except FormParserError as e:
+                raise MalformedUpload(f"Malformed multipart body: {str(e)}")
+            data = b"".join(received)
+            received.clear()
+            size += len(data)
+            if size > max_size:
+                raise UploadTooLarge(f"Upload exceeds {max_size} bytes")
+            if data:
+                await asyncio.to_thread(_write_chunk, target, hasher, data)
+        parser.finalize()
+        if 'filename' not in found:
+            raise MalformedUpload(f"Request has no file in the {field} field")
+        await asyncio.to_thread(target.close)
+        await asyncio.to_thread(os.replace, partial, destination)
+    except BaseException:
+        await asyncio.to_thread(target.close)
+        await asyncio.to_thread(_remove, partial)
+        raise
+
+    logger.info(f"Saved upload {found['filename']} to {destination} ({size} bytes, sha256 {hasher.hexdigest()})")
+    return found['filename'], size, hasher.hexdigest()
+
+def copy_stream(source: BinaryIO, destination: Path, max_size: int, chunk_size: int) -> Tuple[int, str]:
+    """
+    Blocking counterpart of save_upload for files already on the server, such as bulk
+    imports: copy and hash source in chunk_size pieces, raising UploadTooLarge past max_size.
+    """
+    partial = destination.with_name(destination.name + ".part")
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(partial, "wb") as target:
+            for chunk in iter(lambda: source.read(chunk_size), b""):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(f"File exceeds {max_size} bytes")
+                _write_chunk(target, hasher, chunk)
+        os.replace(partial, destination)
+    except BaseException:
+        _remove(partial)
+        raise
+    return size, hasher.hexdigest()
+
+def store_by_hash(path: Path, upload_dir: Path, content_hash: str, file_type: str) -> Path:
+    """
+    Move a saved upload to its content-addressed name in upload_dir, so byte-identical
+    uploads share one stored file. Replacing an existing copy is harmless, the bytes are
+    the same, and keeps the file in place even if a delete of the old copy races with this.
+    """
+    destination = upload_dir / f"{content_hash}.{file_type}"
+    os.replace(path, destination)
+    return destination
+
+def _remove(path: Path):
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,47 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import asyncio
+import argparse
+from app.services.store_registry import get_document_store
+from app.config import settings
+from sample_questions import SAMPLE_QUESTIONS
+
+async def run_loop(store, queries, k):
+    """One search call per query, as the websocket chat does"""
+    for query in queries:
+        await store.search(query, k=k)
+
+async def run_batch(store, queries, k, batch_size):
+    for start in range(0, len(queries), batch_size):
+        await store.search_batch(queries[start:start + batch_size], k=k)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare batched multi-query search throughput against one search per query")
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--k", type=int, default=settings.SIMILAR_DOCS_COUNT)
+    args = parser.parse_args()
+
+    store = get_document_store()
+    if store.index.ntotal == 0:
+        print(f"Knowledge base in {settings.OUTPUT_FOLDER} is empty, upload documents first")
+        sys.exit(1)
+    # Unique queries so neither path is helped by the query or result caches
+    queries = [f"{SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]} ({i})" for i in range(args.queries)]
+    print(f"Searching {store.index.ntotal} chunks with {len(queries)} queries, k={args.k}")
+
+    asyncio.run(store.search_batch(queries[:2], k=args.k))
+    results = {}
+    for name, run in (("loop", run_loop(store, queries, args.k)),
+                      ("batch", run_batch(store, queries, args.k, args.batch_size))):
+        started = time.perf_counter()
+        asyncio.run(run)
+        results[name] = len(queries) / (time.perf_counter() - started)
+        print(f"{name:<6} {results[name]:8.1f} queries/s")
+    print(f"Batched search is {results['batch'] / results['loop']:.1f}x the per-query loop")
+
+if __name__ == "__main__":
+    main()
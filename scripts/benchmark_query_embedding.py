@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import asyncio
+import argparse
+from app.services.store_registry import get_embeddings
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.latency import LatencyWindow
+from app.config import settings
+from sample_questions import SAMPLE_QUESTIONS
+
+def percentiles(latencies):
+    window = LatencyWindow(len(latencies))
+    for latency in latencies:
+        window.record(latency)
+    stats = window.percentiles()
+    return stats['p50_ms'], stats['p99_ms']
+
+async def run_unbatched(embeddings, questions, concurrency):
+    """One embed_query call per request, as every chat turn did before batching"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(question):
+        async with semaphore:
+            started = time.perf_counter()
+            await asyncio.to_thread(embeddings.embed_query, question)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(question) for question in questions))
+    return latencies
+
+async def run_batched(batcher, questions, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(question):
+        async with semaphore:
+            started = time.perf_counter()
+            await batcher.embed(question)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(question) for question in questions))
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare query embedding latency with and without micro-batching")
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_MAX_SIZE)
+    parser.add_argument("--wait-ms", type=float, default=settings.EMBEDDING_BATCH_WAIT_MS)
+    args = parser.parse_args()
+
+    embeddings = get_embeddings()
+    # Unique suffixes keep identical questions from collapsing into one row
+    questions = [f"{SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]} ({i})" for i in range(args.requests)]
+    embeddings.embed_query("warm up")
+
+    started = time.perf_counter()
+    latencies = asyncio.run(run_unbatched(embeddings, questions, args.concurrency))
+    elapsed = time.perf_counter() - started
+    p50, p99 = percentiles(latencies)
+    print(f"Unbatched: {args.requests / elapsed:.1f} queries/s, p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+
+    batcher = EmbeddingBatcher(embeddings.embed_documents, args.batch_size, args.wait_ms)
+    started = time.perf_counter()
+    latencies = asyncio.run(run_batched(batcher, questions, args.concurrency))
+    elapsed = time.perf_counter() - started
+    p50, p99 = percentiles(latencies)
+    stats = batcher.stats()
+    print(f"Batched:   {args.requests / elapsed:.1f} queries/s, p50 {p50:.1f} ms, p99 {p99:.1f} ms, "
+          f"avg batch {stats['avg_batch_size']}")
+
+if __name__ == "__main__":
+    main()
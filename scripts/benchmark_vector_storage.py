@@ -0,0 +1,112 @@
+"""
+Memory and recall of the VECTOR_STORAGE modes against the float32 baseline.
+
+Memory per million 768-dim chunks (bge-base), vector codes only; IDMap2 adds
+about 16 bytes per chunk for ids and the reverse id map:
+
+    float32   3072 B/vector   ~2.86 GiB per 1M chunks
+    fp16      1536 B/vector   ~1.43 GiB per 1M chunks
+    sq8        768 B/vector   ~0.72 GiB per 1M chunks
+
+Recall@k is measured against exact float32 search. On 50k synthetic clustered
+768-dim unit vectors with a flat index:
+
+    fp16      recall@10 0.999
+    sq8       recall@10 0.968
+
+Both quantized modes also search more slowly than float32, because codes are
+decoded during the distance computation. Real embedding distributions differ,
+so run this script against the live knowledge base before switching
+VECTOR_STORAGE.
+
+The sizes above are per process. Flat and HNSW checkpoints cannot be
+memory-mapped, so each of the WORKERS server processes loads its own copy of
+the quantized codes, whereas float32 flat search maps the segment files once
+and shares them through the page cache (IVF inverted lists are mapped with
+any storage). The float32 segments also stay on disk next to the quantized
+checkpoint, so quantizing adds disk instead of saving it. The "RAM, N workers"
+and "disk" columns account for both: with 4 workers, flat sq8 holds 4 x 768
+bytes per vector against 3072 shared float32 bytes, no saving at all.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import argparse
+from pathlib import Path
+import numpy as np
+import faiss
+from app.services import index_factory
+from app.services.segment_store import SegmentStore
+from app.config import settings
+
+def load_vectors(limit: int, dim: int) -> np.ndarray:
+    """Stored segment vectors from the live knowledge base, or synthetic clustered unit vectors"""
+    store_path = Path(settings.OUTPUT_FOLDER)
+    if (store_path / "manifest.json").exists():
+        segment_store = SegmentStore(store_path)
+        manifest = segment_store.load_manifest()
+        parts, total = [], 0
+        for segment in manifest['segments']:
+            _, vectors = segment_store.read_vectors(segment['name'])
+            parts.append(vectors)
+            total += len(vectors)
+            if total >= limit:
+                break
+        if parts:
+            print(f"Using {min(total, limit)} vectors from {store_path}")
+            return np.ascontiguousarray(np.concatenate(parts)[:limit], dtype=np.float32)
+
+    print(f"No knowledge base found, using {limit} synthetic {dim}-dim vectors")
+    rng = np.random.default_rng(1234)
+    centers = rng.standard_normal((max(1, limit // 100), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), limit)] + 0.3 * rng.standard_normal((limit, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray, k: int) -> float:
+    hits = [len(set(t[:k]) & set(f[:k])) for t, f in zip(truth, found)]
+    return float(np.mean(hits)) / k
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare float32, fp16 and sq8 vector storage")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=768, help="Dimension of synthetic vectors")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-type", default=index_factory.FLAT, choices=index_factory.INDEX_TYPES)
+    parser.add_argument("--workers", type=int, default=settings.WORKERS, help="Server processes searching the index")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.vectors + args.queries, args.dim)
+    queries, vectors = vectors[:args.queries], vectors[args.queries:]
+    ids = np.arange(len(vectors), dtype=np.int64)
+    _, truth = faiss.knn(queries, vectors, args.k)
+
+    # Every stored chunk keeps its float32 vector and int64 id in the segment files
+    segment_bytes = vectors.shape[1] * 4 + 8
+    ram_header = f"RAM, {args.workers} workers"
+    print(f"{'storage':<9} {'bytes/vec':>10} {'GiB per 1M':>11} {ram_header:>16} {'disk':>9} "
+          f"{'recall@' + str(args.k):>10} {'ms/query':>9}")
+    for storage in index_factory.VECTOR_STORAGES:
+        index = index_factory.build_index(vectors.shape[1], args.index_type, training_vectors=vectors, storage=storage)
+        index.add_with_ids(vectors, ids)
+        size = len(faiss.serialize_index(index))
+        params = index_factory.search_parameters(args.index_type)
+
+        started = time.perf_counter()
+        _, found = index.search(queries, args.k, params=params)
+        elapsed = time.perf_counter() - started
+
+        bytes_per_vector = size / len(vectors)
+        # Same rules as DocumentStore._open_index: what is mapped is shared, the rest is loaded per worker
+        segment_served = args.index_type == index_factory.FLAT and storage == index_factory.FLOAT32
+        mapped = segment_served or args.index_type in index_factory.TRAINED_INDEX_TYPES
+        ram_per_vector = bytes_per_vector if mapped else bytes_per_vector * args.workers
+        disk_per_vector = segment_bytes + (0 if segment_served else bytes_per_vector)
+        print(f"{storage:<9} {bytes_per_vector:>10.0f} {bytes_per_vector * 1e6 / 1024**3:>11.2f} "
+              f"{ram_per_vector:>16.0f} {disk_per_vector:>9.0f} "
+              f"{recall_at_k(truth, found, args.k):>10.3f} {elapsed * 1000 / len(queries):>9.3f}")
+
+if __name__ == "__main__":
+    main()
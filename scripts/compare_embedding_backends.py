@@ -0,0 +1,104 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import argparse
+from pathlib import Path
+import numpy as np
+from app.services.embedding_backends import OnnxEmbeddings, ONNX_CONFIG_FILE
+from app.services.chunk_store import ChunkStore
+from app.config import settings
+
+SAMPLE_TEXTS = [
+    "VaultMind keeps every uploaded document searchable in a unified knowledge base.",
+    "Administrators upload PDF, DOCX, TXT and XLSX files from the admin panel.",
+    "The chat assistant answers questions using the most relevant document chunks.",
+    "Deleted documents are removed from the vector index and the chunk store.",
+    "AFNEXIS builds enterprise software for clients around the world.",
+    "Install the server, create an admin user and start the API with run.py.",
+    "Each processing worker splits documents into overlapping chunks before embedding them.",
+    "Search quality depends on the embedding model and the number of retrieved chunks."
+]
+
+def load_corpus(sample_size: int):
+    """Chunks from the live knowledge base when there is one, otherwise built-in sample texts"""
+    db_path = Path(settings.OUTPUT_FOLDER) / "chunks.sqlite3"
+    texts = []
+    if db_path.exists():
+        for batch in ChunkStore(db_path).iter_chunks():
+            texts.extend(chunk['text'] for chunk in batch)
+            if len(texts) >= sample_size:
+                break
+    if not texts:
+        print("No chunk store found, using built-in sample texts")
+        texts = [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] + f" ({i})" for i in range(sample_size)]
+    return texts[:sample_size]
+
+def timed_embed(name: str, embeddings, texts):
+    embeddings.embed_documents(texts[:4])
+    started = time.perf_counter()
+    vectors = np.array(embeddings.embed_documents(texts), dtype=np.float32)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<12} {len(texts) / elapsed:8.1f} texts/s")
+    return vectors
+
+def neighbour_overlap(reference: np.ndarray, candidate: np.ndarray, k: int) -> float:
+    """Share of top-k corpus neighbours that stay the same when the candidate vectors are used"""
+    k = min(k, len(reference) - 1)
+    ref_order = np.argsort(-(reference @ reference.T), axis=1)[:, 1:k + 1]
+    cand_order = np.argsort(-(candidate @ candidate.T), axis=1)[:, 1:k + 1]
+    shared = [len(set(a) & set(b)) for a, b in zip(ref_order, cand_order)]
+    return float(np.mean(shared)) / k
+
+def main():
+    parser = argparse.ArgumentParser(description="Check ONNX embedding parity and throughput against the torch backend")
+    parser.add_argument("--model-dir", default=settings.ONNX_MODEL_DIR)
+    parser.add_argument("--sample", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    if not (Path(args.model_dir) / ONNX_CONFIG_FILE).exists():
+        print(f"No exported model in {args.model_dir}, run scripts/export_onnx_embeddings.py first")
+        sys.exit(1)
+
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    texts = load_corpus(args.sample)
+    print(f"Comparing backends on {len(texts)} texts")
+
+    reference = timed_embed("torch", HuggingFaceEmbeddings(
+        model_name=settings.EMBEDDINGS_MODEL,
+        model_kwargs={'device': "cuda" if torch.cuda.is_available() else "cpu"}
+    ), texts)
+
+    candidates = {"onnx-fp32": OnnxEmbeddings(args.model_dir, quantized=False)}
+    int8 = OnnxEmbeddings(args.model_dir, quantized=True)
+    if int8.quantized:
+        candidates["onnx-int8"] = int8
+
+    failed = []
+    results = {name: timed_embed(name, embeddings, texts) for name, embeddings in candidates.items()}
+    for name, vectors in results.items():
+        if vectors.shape != reference.shape:
+            print(f"{name}: dimension {vectors.shape[1]} does not match torch dimension {reference.shape[1]}")
+            failed.append(name)
+            continue
+        cosine = np.sum(reference * vectors, axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1)
+        )
+        overlap = neighbour_overlap(reference, vectors, args.k)
+        print(f"{name}: cosine to torch min {cosine.min():.4f}, mean {cosine.mean():.4f}, "
+              f"top-{args.k} neighbour overlap {overlap:.1%}")
+        if cosine.min() < args.min_cosine:
+            failed.append(name)
+
+    if failed:
+        print(f"Parity check failed for {', '.join(failed)} (min cosine below {args.min_cosine})")
+        sys.exit(1)
+    print("Parity check passed, ONNX vectors are compatible with the existing index")
+
+if __name__ == "__main__":
+    main()
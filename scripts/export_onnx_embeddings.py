@@ -0,0 +1,100 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import argparse
+from pathlib import Path
+import torch
+from transformers import AutoModel, AutoTokenizer
+from app.services.embedding_backends import ONNX_CONFIG_FILE
+from app.config import settings
+
+class LastHiddenState(torch.nn.Module):
+    """Expose only the token embeddings, pooling happens in the runtime"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        return self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            token_type_ids=token_type_ids
+        ).last_hidden_state
+
+def export(model_name: str, output_dir: Path, quantize: bool, pooling: str, normalize: bool, max_length: int):
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"Loading {model_name}")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.save_pretrained(str(output_dir))
+
+    sample = tokenizer(["VaultMind exports embeddings to ONNX"], return_tensors="pt", return_token_type_ids=True)
+    model_file = "model.onnx"
+    print(f"Exporting to {output_dir / model_file}")
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(model),
+            (sample['input_ids'], sample['attention_mask'], sample['token_type_ids']),
+            str(output_dir / model_file),
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "token_type_ids": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"}
+            },
+            opset_version=17,
+            dynamo=False
+        )
+
+    quantized_file = None
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantized_file = "model.int8.onnx"
+        print(f"Quantizing weights to int8 into {output_dir / quantized_file}")
+        quantize_dynamic(
+            str(output_dir / model_file),
+            str(output_dir / quantized_file),
+            weight_type=QuantType.QInt8
+        )
+
+    config = {
+        'model_name': model_name,
+        'model_file': model_file,
+        'quantized_file': quantized_file,
+        'dimension': model.config.hidden_size,
+        'max_length': min(max_length, tokenizer.model_max_length),
+        'pooling': pooling,
+        'normalize': normalize
+    }
+    with open(output_dir / ONNX_CONFIG_FILE, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+    print("Export complete. Check parity with scripts/compare_embedding_backends.py before switching EMBEDDING_BACKEND")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX, optionally int8 quantized")
+    parser.add_argument("--model", default=settings.EMBEDDINGS_MODEL)
+    parser.add_argument("--output", default=settings.ONNX_MODEL_DIR)
+    parser.add_argument("--no-quantize", action="store_true", help="Only export the float32 model")
+    # bge models use the CLS token, normalized; most sentence-transformers models use mean pooling
+    parser.add_argument("--pooling", choices=["cls", "mean"], default="cls")
+    parser.add_argument("--no-normalize", action="store_true")
+    parser.add_argument("--max-length", type=int, default=512)
+    args = parser.parse_args()
+
+    export(
+        args.model,
+        Path(args.output),
+        quantize=not args.no_quantize,
+        pooling=args.pooling,
+        normalize=not args.no_normalize,
+        max_length=args.max_length
+    )
+
+if __name__ == "__main__":
+    main()
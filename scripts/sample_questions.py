@@ -0,0 +1,15 @@
+"""Questions the benchmark scripts send, suffixed per request so caches cannot answer them"""
+
+SAMPLE_QUESTIONS = [
+    "How do I install VaultMind on Windows?",
+    "What are the pricing plans?",
+    "Which file types can be uploaded?",
+    "How many users does the Team plan include?",
+    "Does VaultMind work offline?",
+    "Who leads AFNEXIS?",
+    "How do I reset an admin password?",
+    "How are documents indexed?",
+    "Can I delete an uploaded document?",
+    "How does the chat assistant use the knowledge base?",
+    "What hardware does the server need?"
+]
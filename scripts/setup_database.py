@@ -2,7 +2,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.database import engine, Base
+from app.database import engine, Base, apply_schema_updates
 
 def setup_database():
     """Create all database tables."""
@@ -15,6 +15,7 @@ def setup_database():
         from app.models.chat import ChatSession, ChatMessage
         
         Base.metadata.create_all(bind=engine)
+        apply_schema_updates()
         print("Database tables created successfully!")
         print("\nCreated tables:")
         print("- users")
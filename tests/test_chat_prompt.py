@@ -0,0 +1,24 @@
+from app.services import context_assembler
+from app.services.chat_prompt import build_messages
+from app.services.context_assembler import ContextAssembler
+
+def _chunk(chunk_id, text):
+    return {'chunk_id': chunk_id, 'document_id': 'doc', 'filename': 'guide.pdf', 'page': chunk_id,
+            'chunk_index': chunk_id, 'text': text}
+
+def test_assembled_context_and_history_reach_the_llm(monkeypatch):
+    # Estimate tokens from characters instead of loading the chat model's tokenizer
+    monkeypatch.setattr(context_assembler, '_tokenizer_loaded', True)
+    monkeypatch.setattr(context_assembler, '_tokenizer', None)
+    assembler = ContextAssembler(token_budget=2000, history_share=0.3, max_overlap=0)
+    chunks = [_chunk(1, "VaultMind runs fully offline."), _chunk(5, "Plans start at {0.50} per page.")]
+    history = [{'question': "Does it need the cloud?", 'answer': "No, it runs offline."}]
+
+    assembled = assembler.assemble(chunks, history)
+    messages = build_messages("How much does it cost?", assembled['context'], assembled['history'])
+
+    system_prompt = messages[0]['content']
+    assert assembled['context'] and assembled['context'] in system_prompt
+    assert assembled['history'] and assembled['history'] in system_prompt
+    assert "{context}" not in system_prompt and "{history}" not in system_prompt
+    assert messages[1] == {'role': 'user', 'content': "User's Question: How much does it cost?"}